@@ -1,12 +1,26 @@
 import os
 import re
 import json
+import time
 import pickle
+import queue
+import threading
 from collections import defaultdict
-import openai
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from datetime import datetime
 from flask_cors import CORS
+from query_log import query_logger
+from jobs import job_queue
+from single_flight import single_flight, flight_key
+from router import Router, SUMMARY_PHRASES, clean_query, normalize_topic
+from topic_resolver import get_topic_resolver
+from llm_pool import complete_chat, fan_out
+from llm_cache import completion_cache
+from map_reduce import records_from_markdown
+import metrics
+from metrics import span
+from warmup import WARMUP_ON_START, start_background_warmup, report_counts
+from stance_tables import stance_groups
 from chatbot_embeddings import (
     get_most_relevant_chunk,
     summarize_candidate_topic,
@@ -14,28 +28,79 @@ from chatbot_embeddings import (
     summarize_topic_with_gpt,
     summarize_topic_by_candidate,
     classify_policy_stance,
-    aliases,
-    df
+    embed_query,
+    aliases
+)
+from artefacts import (
+    load_times,
+    get_client,
+    get_corpus_store,
+    get_mention_matrix,
+    get_vector_index,
+    get_candidate_index,
+    get_subtopic_index,
+    get_topic_chunks,
+    get_stance_tables,
+    get_topic_response_cache,
 )
 
 app = Flask(__name__)
 CORS(app)
 
-# Load topic chunks
-with open("topic_chunks.json", "r") as f:
-    topic_chunks = json.load(f)
-
-# Load stance cache
-with open("stance_cache_gst.json", "r") as f:
-    gst_stance_cache = json.load(f)
-
-# General topic cache
-cache_file = "topic_response_cache.json"
-if os.path.exists(cache_file):
-    with open(cache_file, "r") as f:
-        topic_response_cache = json.load(f)
-else:
-    topic_response_cache = {}
+# --- Metrics ---
+# Streaming endpoints outlive their response object, so they time themselves
+UNTIMED_ENDPOINTS = {"metrics_endpoint", "chat_stream", "stream_job"}
+
+@app.before_request
+def start_timing():
+    metrics.begin_request()
+
+@app.after_request
+def finish_timing(response):
+    timings = metrics.current_request()
+    if timings is None or request.endpoint in UNTIMED_ENDPOINTS:
+        return response
+    metrics.finish_request(timings, request.endpoint or "unknown", response.status_code)
+    if metrics.SERVER_TIMING:
+        response.headers["Server-Timing"] = timings.server_timing()
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+metrics.register_gauge(
+    "ballotbot_intent_routed", "Queries routed to each intent by this worker.", "intent",
+    lambda: {name: stats["routed"] for name, stats in router.snapshot().items()},
+)
+metrics.register_gauge("ballotbot_llm_cache", "Completion cache counters for this worker.", "stat", completion_cache.snapshot)
+metrics.register_gauge("ballotbot_single_flight", "Single-flight leaders, coalesced and shared hits.", "stat", lambda: dict(single_flight.stats))
+metrics.register_gauge("ballotbot_artefact_load_seconds", "Time each artefact took to load.", "artefact", lambda: dict(load_times))
+metrics.register_gauge("ballotbot_warmup_prompts", "Prompts ready or failing after this worker's last warm-up.", "result", report_counts)
+
+# Topic chunks, stance cache, corpus and topic cache load lazily on first use (see artefacts.py)
+
+# Streaming: requests served by /chat/stream push per-candidate results here
+stream_state = threading.local()
+STREAM_HEARTBEAT_SECONDS = 15
+
+def emit_candidate(index, candidate):
+    sink = getattr(stream_state, "sink", None)
+    if sink is not None:
+        sink({"event": "candidate", "index": index, "candidate": candidate})
+
+def emit_topic_summary(index, chunk, summary):
+    emit_candidate(index, {
+        "name": chunk["name"],
+        "summary": summary,
+        "source_url": chunk.get("source_url", "")
+    })
+
+def format_stream_event(event, use_sse):
+    data = json.dumps(event, ensure_ascii=False)
+    if use_sse:
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
 
 # Log queries
 def log_query_console(query, response, matched_topic=None, response_type="info"):
@@ -47,27 +112,13 @@ def log_query_console(query, response, matched_topic=None, response_type="info")
         "type": response_type
     }
 
+    metrics.set_response_type(response_type)
+
     # Always show in Render logs
     print(json.dumps(log_entry))
 
-    # Attempt to store locally (may not persist on Render)
-    try:
-        logs = []
-        if os.path.exists("query_log.json"):
-            try:
-                with open("query_log.json", "r") as f:
-                    logs = json.load(f)
-            except json.JSONDecodeError:
-                print("⚠️ query_log.json is corrupt. Starting fresh.")
-                logs = []
-
-        logs.insert(0, log_entry)
-
-        with open("query_log.json", "w") as f:
-            json.dump(logs, f, indent=2)
-
-    except Exception as e:
-        print(f"⚠️ Logging to file failed: {e}")
+    # Queue for the background NDJSON writer (may not persist on Render)
+    query_logger.log(log_entry)
 
 # Keyword extractor
 def extract_keywords(query):
@@ -93,7 +144,8 @@ Content:
 Summary:"""
 
     try:
-        response = openai.chat.completions.create(
+        response = complete_chat(
+            get_client(),
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": prompt}],
             max_tokens=250,
@@ -111,8 +163,14 @@ def candidate_url(name):
     slug = name.strip().lower().replace(" ", "-")
     return f"https://election2025.gg/candidates/{slug}"
 
-# Last-resort keyword matcher using embeddings.csv
-def last_resort_keyword_summary(query, df, fallback_topic=None, top_n=3):
+# Last-resort matcher: vector search over embeddings, keyword scan if unavailable
+MAX_FALLBACK_ROWS = 30
+# Vector hits must also contain a query keyword and score above this; rows with
+# no embedding are zero vectors scoring exactly 0. Each surviving candidate
+# costs one GPT summary
+FALLBACK_MIN_SCORE = float(os.getenv("FALLBACK_MIN_SCORE", "0.0"))
+
+def last_resort_keyword_summary(query, corpus, fallback_topic=None, top_n=3):
     if fallback_topic is None:
         fallback_topic = detect_topic_from_query(query, aliases)
     if fallback_topic and fallback_topic in aliases:
@@ -123,12 +181,26 @@ def last_resort_keyword_summary(query, df, fallback_topic=None, top_n=3):
 
     matches = defaultdict(list)
 
-    for _, row in df.iterrows():
-        candidate = row.get("name", "").strip()
-        text = str(row.get("Text", "")).lower()
-
-        if any(keyword in text for keyword in query_keywords):
-            matches[candidate].append(row)
+    hits = None
+    vector_index = get_vector_index()
+    if vector_index is not None:
+        try:
+            with span("embed"):
+                query_vec = embed_query(query)
+            with span("vector_search"):
+                hits = vector_index.search(query_vec, k=MAX_FALLBACK_ROWS, topic=fallback_topic)
+        except Exception as e:
+            print(f"⚠️ Vector search failed, using keyword scan: {e}")
+
+    if hits is not None:
+        for hit in hits:
+            text = hit["text"].lower()
+            if hit["score"] > FALLBACK_MIN_SCORE and any(keyword in text for keyword in query_keywords):
+                matches[hit["name"]].append(hit["text"])
+    else:
+        with span("corpus_scan"):
+            for row in corpus.rows_with_any(query_keywords):
+                matches[corpus.name(row)].append(corpus.text(row))
 
     if not matches:
         return {
@@ -139,391 +211,610 @@ def last_resort_keyword_summary(query, df, fallback_topic=None, top_n=3):
             }]
         }
 
-    results = []
-    for candidate, entries in matches.items():
-        combined_text = " ".join(str(e["Text"]) for e in entries[:top_n])
-        summary = gpt_summarize_candidate(candidate, combined_text, query)
-        results.append({
+    def summarize_match(match):
+        candidate, entries = match
+        combined_text = " ".join(entries[:top_n])
+        return {
             "name": candidate,
-            "summary": summary,
+            "summary": gpt_summarize_candidate(candidate, combined_text, query),
             "source_url": candidate_url(candidate)
-        })
+        }
 
+    results = fan_out(summarize_match, matches.items(), on_result=emit_candidate)
     return {"candidates": results}
 
-def candidates_with_little_on_topic(df, topic, aliases, min_mentions=1):
-    topic_keywords = aliases.get(topic, [topic])
-    topic_keywords = [kw.lower() for kw in topic_keywords]
-
-    counts = defaultdict(int)
-    for _, row in df.iterrows():
-        name = row.get("name", "").strip()
-        text = str(row.get("Text", "")).lower()
-        if any(keyword in text for keyword in topic_keywords):
-            counts[name] += 1
-
-    all_candidates = set(df["name"].dropna().unique())
-    low_mention_candidates = [
-        {
-            "name": name,
-            "summary": f"No substantial mention of {topic}.",
-            "source_url": candidate_url(name)
-        }
-        for name in all_candidates if counts[name] < min_mentions
-    ]
+def mention_keywords(matrix, topic):
+    """None for topics the mention matrix already has a column for, else the words to scan for."""
+    return None if topic in matrix else [kw.lower() for kw in aliases.get(topic, [topic])]
 
-    return {"candidates": low_mention_candidates}
+def mention_entry(name, topic, count):
+    if count:
+        summary = f"Mentions {topic} in {count} passage{'' if count == 1 else 's'}."
+    else:
+        summary = f"No substantial mention of {topic}."
+    return {"name": name, "summary": summary, "mentions": count, "source_url": candidate_url(name)}
 
-# Save updated topic cache
-def save_topic_cache():
-    with open(cache_file, "w") as f:
-        json.dump(topic_response_cache, f, indent=2)
+def candidates_with_little_on_topic(matrix, topic, aliases, min_mentions=1):
+    with span("mention_matrix"):
+        below = matrix.below(topic, min_mentions, keywords=mention_keywords(matrix, topic))
+    return {"candidates": [mention_entry(name, topic, count) for name, count in below]}
 
+# Save one updated topic response
+def save_topic_cache(topic, response_data):
+    get_topic_response_cache()[topic] = response_data
 
 
-# Topic normalized
 
-def normalize_topic(topic):
-    topic = topic.lower().strip()
-    return topic[4:] if topic.startswith("the ") else topic
+# --- Background topic summaries ---
+# Topics with more chunks than this are summarised by a background job
+LARGE_TOPIC_CHUNKS = 40
+JOB_POLL_SECONDS = 1.0
 
-# Regex for stance-type queries
-stance_pattern = re.compile(
-    r"\b(who|which candidates)\b\s+("
-    r"supports?|opposes?|opposed\s+to|in\s+favour\s+of|backs?|rejects?|wants?|favours?|"
-    r"are\s+against|are\s+for|is\s+against|is\s+for|stands\s+(?:against|for)|"
-    r"don't\s+support|do\s+not\s+support|disagree\s+with|doesn't\s+agree\s+with"
-    r")\s+(.*)",
-    re.IGNORECASE
-)
+def run_topic_summary_job(params, progress):
+    topic = params["topic"]
+    chunks = get_topic_chunks().get(topic, [])
+    done = 0
+    progress(done, len(chunks))
 
-print("🚀 Server is starting and logging works.")
+    def on_result(index, chunk, summary):
+        nonlocal done
+        done += 1
+        progress(done, len(chunks))
 
-@app.route("/chat", methods=["POST"])
-def chat():
+    response_data = {
+        "candidates": summarize_topic_with_gpt(topic, chunks, on_result=on_result),
+        "topic": topic
+    }
+    save_topic_cache(topic, response_data)
+    return response_data
+
+job_queue.register("topic_summary", run_topic_summary_job)
+
+# Queries about part of a large topic go to its nearest sub-topic clusters
+SUBTOPIC_MAX_CHUNKS = 20
+SUMMARY_PHRASE_WORDS = {word for phrase in SUMMARY_PHRASES for word in re.findall(r"\w+", phrase)}
+
+def query_focus(cleaned_query, topic):
+    """Query words beyond the summary phrasing and the topic's own name and aliases."""
+    generic = SUMMARY_PHRASE_WORDS | set(re.findall(r"\w+", " ".join([topic] + aliases.get(topic, [])).lower()))
+    return [word for word in extract_keywords(cleaned_query) if word not in generic]
+
+def subtopic_chunks(topic, chunks, cleaned_query):
+    """(chunks, cluster labels) from the sub-topics nearest the query, or ([], [])."""
+    index = get_subtopic_index()
+    focus = query_focus(cleaned_query, topic)
+    if not focus or not index.covers(topic, len(chunks)):
+        return [], []
     try:
-        data = request.get_json()
-        query = data.get("query", "")
-        print(f"Received query: {query}")
-
-        # Normalize special characters and formatting issues
-        cleaned_query = query.lower()
-        cleaned_query = cleaned_query.replace("’", "'")  # curly apostrophe
-        cleaned_query = cleaned_query.replace("‘", "'")  # opening curly apostrophe
-        cleaned_query = cleaned_query.replace("“", '"').replace("”", '"')  # curly quotes
-        cleaned_query = cleaned_query.replace("–", "-").replace("—", "-")  # en and em dashes
-        cleaned_query = re.sub(r"[^\w\s'\-]", "", cleaned_query)  # remove other non-word characters, keep hyphens and apostrophes
-        cleaned_query = cleaned_query.replace(" the ", " ")  # normalize 'the'
-
-        print(f"🔧 Cleaned query: {cleaned_query}")
-
-        stance_match = stance_pattern.search(cleaned_query)
-
-        if stance_match:
-            topic = detect_topic_from_query(stance_match.group(3), aliases)
-            if topic.startswith("the "):  # 🆕 strip leading 'the' from topic
-                topic = topic[4:]
-            print(f"📚 Detected general topic: {topic}")
-
-            stance_keyword = stance_match.group(2).lower()
+        clusters = index.nearest(topic, embed_query(cleaned_query), SUBTOPIC_MAX_CHUNKS)
+    except Exception as e:
+        print(f"⚠️ Query embedding failed, matching sub-topic labels instead: {e}")
+        clusters = index.by_terms(topic, focus, SUBTOPIC_MAX_CHUNKS)
+    return [chunks[i] for cluster in clusters for i in cluster["chunks"]], [cluster["label"] for cluster in clusters]
+
+def submit_topic_job(topic):
+    """Queue a background summary of topic; identical in-flight jobs are shared."""
+    return job_queue.submit("topic_summary", f"topic_summary:{topic}", {"topic": topic})
+
+def job_view(job):
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "topic": job["params"].get("topic"),
+        "progress": job["progress"],
+        "total": job["total"],
+        "result": job["result"],
+        "error": job["error"],
+        "poll": f"/jobs/{job['id']}",
+        "stream": f"/jobs/{job['id']}/stream"
+    }
 
-            if topic == "gst":
-                primary_group = [c for c in gst_stance_cache if c["stance"] == "SUPPORT"] if "support" in stance_keyword else [c for c in gst_stance_cache if c["stance"] == "OPPOSE"]
-                alternate_group = [c for c in gst_stance_cache if c["stance"] == "OPPOSE"] if "support" in stance_keyword else [c for c in gst_stance_cache if c["stance"] == "SUPPORT"]
+def topic_job_response(query, topic, chunk_count):
+    job, created = submit_topic_job(topic)
+    response_data = {
+        "candidates": [{
+            "name": "Note",
+            "summary": f"The topic '{topic}' has {chunk_count} sources, so its summary is being prepared in the background. Ask again in a minute, or follow the job for progress.",
+            "source_url": ""
+        }],
+        "topic": topic,
+        "job": job_view(job)
+    }
+    log_query_console(query, response_data, matched_topic=topic, response_type="topic_summary_job" if created else "topic_summary_job_joined")
+    return jsonify({
+        "response": response_data,
+        "type": "topic_summary_job"
+    })
 
-                if not primary_group:
-                    return jsonify({"response": "No clear stances found on GST."})
 
-                def format_candidates(group):
-                    return [{
-                        "name": c["name"],
-                        "summary": f"{c['stance']} - {c['reason']}",
-                        "source_url": c.get("url", "")
-                    } for c in group]
+# Intents are declared in router.py and matched in one pass
+router = Router(
+    resolve_topic=lambda text: detect_topic_from_query(text, aliases),
+    fuzzy_topic=lambda text: get_topic_resolver(get_topic_chunks(), aliases).resolve(text)
+)
 
-                response = {
-                    "primary": format_candidates(primary_group),
-                    "alternate": format_candidates(alternate_group)
-                }
+print("🚀 Server is starting and logging works.")
 
-                log_query_console(query, response, matched_topic=topic, response_type="stance_gst")
-                return jsonify({
-                    "response": response,
-                    "type": "stance_gst"
-                })
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    """Summarise a whole topic in the background: {"query": ...} or {"topic": ...}."""
+    data = request.get_json(silent=True) or {}
+    topic = data.get("topic") or detect_topic_from_query(clean_query(data.get("query", "")), aliases)
+    if not topic:
+        return jsonify({"error": "No topic detected in query."}), 400
+    topic = normalize_topic(topic)
+    if not get_topic_chunks().get(topic):
+        return jsonify({"error": f"No candidate statements found on {topic}."}), 404
+
+    cached = get_topic_response_cache().get(topic)
+    if cached is not None:
+        return jsonify({"status": "done", "topic": topic, "result": cached})
+
+    job, created = submit_topic_job(topic)
+    return jsonify(dict(job_view(job), created=created)), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify(job_view(job))
+
+@app.route("/jobs/<job_id>/stream", methods=["GET"])
+def stream_job(job_id):
+    """NDJSON (or SSE) progress events until the job finishes."""
+    if job_queue.get(job_id) is None:
+        return jsonify({"error": "Unknown job."}), 404
+    use_sse = "text/event-stream" in request.headers.get("Accept", "")
+
+    def generate():
+        last = None
+        while True:
+            job = job_queue.get(job_id)
+            state = (job["status"], job["progress"], job["total"])
+            if job["status"] not in ("queued", "running"):
+                yield format_stream_event(dict(job_view(job), event="result"), use_sse)
+                return
+            if state != last:
+                yield format_stream_event({"event": "progress", "status": job["status"], "progress": job["progress"], "total": job["total"]}, use_sse)
+                last = state
+            time.sleep(JOB_POLL_SECONDS)
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Answer like /chat, but emit each candidate as soon as it is summarised.
+
+    Emits NDJSON by default, or Server-Sent Events when the client sends
+    Accept: text/event-stream. Events: start, candidate, ping, result, error.
+    """
+    data = request.get_json(silent=True) or {}
+    query = data.get("query", "")
+    use_sse = "text/event-stream" in request.headers.get("Accept", "")
+    events = queue.Queue()
+
+    def run():
+        stream_state.sink = events.put
+        timings = metrics.begin_request()
+        status = 500
+        try:
+            with app.app_context():
+                result = answer_query(query)
+            response, status = result if isinstance(result, tuple) else (result, result.status_code)
+            events.put({"event": "result", "status": status, **response.get_json()})
+        except Exception as e:
+            events.put({"event": "error", "response": f"An error occurred: {e}"})
+        finally:
+            metrics.finish_request(timings, "chat_stream", status)
+            stream_state.sink = None
+            events.put(None)
+
+    threading.Thread(target=run, name="chat-stream", daemon=True).start()
+
+    def generate():
+        yield format_stream_event({"event": "start", "query": query}, use_sse)
+        while True:
+            try:
+                event = events.get(timeout=STREAM_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield format_stream_event({"event": "ping"}, use_sse)
+                continue
+            if event is None:
+                return
+            yield format_stream_event(event, use_sse)
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-        # --- Detect "who talks little about..." questions ---
-        low_mention_match = re.search(
-            r"(which|who)\s+(candidates\s+)?(don'?t|do not|rarely|barely|seldom).*?(talk|mention|say).*?\b(about|on)?\b\s+(.+)",
-            cleaned_query
-        )
+@app.route("/chat", methods=["POST"])
+def chat():
+    data = request.get_json(silent=True) or {}
+    return answer_query(data.get("query", ""))
 
-        if low_mention_match:
-            raw_topic = low_mention_match.group(6).strip()
-            raw_topic = raw_topic.strip().lower()
-            topic = detect_topic_from_query(raw_topic, aliases)
+def answer_query(query):
+    try:
+        print(f"Received query: {query}")
+        intent = router.route(query)
+        print(f"🔧 Cleaned query: {intent.cleaned}")
+        print(f"🧭 Routed to '{intent.name}' {intent.slots} in {intent.elapsed * 1e6:.0f}µs")
+
+        start = time.perf_counter()
+        result = INTENT_HANDLERS[intent.name](query, intent)
+        if result is None:
+            # The matched intent had nothing to answer with (no stance table,
+            # unknown topic, small topic): fall through to the last resort
+            result = handle_fallback(query, intent)
+        handle_seconds = time.perf_counter() - start
+        router.record(intent.name, handle_seconds=handle_seconds)
+        metrics.record_stages((("route", intent.elapsed), (f"handle_{intent.name}", handle_seconds)))
+        return result
 
-            if topic:
-                topic = normalize_topic(topic)
-            else:
-                topic = raw_topic  # fallback to raw topic if detection fails
-            print(f"🔎 Detected low-mention topic: {topic}")
+    except Exception as e:
+        error_message = f"An error occurred: {e}"
+        log_query_console(query, error_message, response_type="exception")
+        return jsonify({
+            "response": error_message,
+            "type": "exception"
+        }), 500
 
-            response = candidates_with_little_on_topic(df, topic, aliases)
-            log_query_console(query, response, matched_topic=topic, response_type="low_mention_query")
-            return jsonify({
-                "response": response,
-                "type": "low_mention_query"
-            })
+# Display spelling of a topic: its capitalised alias where the table has one ("gst" -> "GST")
+TOPIC_LABELS = {
+    alias.lower(): alias
+    for alias_list in aliases.values() for alias in alias_list
+    if alias.lower() in aliases and alias != alias.lower()
+}
+
+def handle_stance(query, intent):
+    topic = intent.topic
+    print(f"📚 Detected general topic: {topic}")
+
+    stance_keyword = intent.stance.lower()
+    stance_table = get_stance_tables().get(topic) if topic else None
+    if not stance_table:
+        return None
+
+    primary_group, alternate_group = stance_groups(stance_table, stance_keyword)
+
+    if not primary_group:
+        return jsonify({"response": f"No clear stances found on {TOPIC_LABELS.get(topic, topic)}."})
+
+    def format_candidates(group):
+        return [{
+            "name": c["name"],
+            "summary": f"{c['stance']} - {c['reason']}",
+            "source_url": c.get("url", "")
+        } for c in group]
+
+    response = {
+        "primary": format_candidates(primary_group),
+        "alternate": format_candidates(alternate_group)
+    }
 
-        # --- General topic summary ---
-        summary_keywords = [
-            "what do candidates say", "how do candidates view",
-            "what are the candidates", "what is said about",
-            "what are the views on", "tell me about", "views on", "tell me candidates' thoughts",
-            "summary of", "what do they think", "what do they believe", "what are the candidates' plans",
-            "what is their position", "what do they say", "how do they feel about", "what are candidates' ideas"
+    response_type = f"stance_{topic.replace(' ', '_')}"
+    log_query_console(query, response, matched_topic=topic, response_type=response_type)
+    return jsonify({
+        "response": response,
+        "type": response_type
+    })
+
+# --- "Who talks little about..." questions ---
+def handle_low_mention(query, intent):
+    topic = intent.topic
+    threshold = int(intent.slots.get("threshold") or 1)
+    print(f"🔎 Detected low-mention topic: {topic} (fewer than {threshold})")
+
+    response = candidates_with_little_on_topic(get_mention_matrix(), topic, aliases, min_mentions=threshold)
+    log_query_console(query, response, matched_topic=topic, response_type="low_mention_query")
+    return jsonify({
+        "response": response,
+        "type": "low_mention_query"
+    })
+
+# --- Mention rankings, percentiles and coverage ---
+MENTION_RANK_LIMIT = 10
+
+def handle_mention_rank(query, intent):
+    topic = intent.topic
+    least = intent.slots.get("order") == "least"
+    matrix = get_mention_matrix()
+    with span("mention_matrix"):
+        ranked = matrix.ranked(topic, limit=MENTION_RANK_LIMIT, ascending=least, keywords=mention_keywords(matrix, topic))
+    if not least:
+        ranked = [(name, count) for name, count in ranked if count]
+        if not ranked:
+            # Nobody mentions it: let the fallback look for related wording
+            return None
+
+    response = {"candidates": [mention_entry(name, topic, count) for name, count in ranked]}
+    log_query_console(query, response, matched_topic=topic, response_type="mention_ranking")
+    return jsonify({
+        "response": response,
+        "type": "mention_ranking"
+    })
+
+def handle_mention_percentile(query, intent):
+    topic = intent.topic
+    top = intent.slots.get("end") == "top"
+    percent = min(100, max(1, int(intent.slots.get("percent") or 10)))
+    matrix = get_mention_matrix()
+    keywords = mention_keywords(matrix, topic)
+    with span("mention_matrix"):
+        selected = matrix.in_percentile(topic, percent, top=top, keywords=keywords)
+        median = matrix.percentile(topic, 50, keywords=keywords)
+    if not selected:
+        return None
+
+    response = {
+        "candidates": [mention_entry(name, topic, count) for name, count in selected],
+        # cutoff: the fewest (top) or most (bottom) mentions of anyone listed
+        "percentile": {"end": "top" if top else "bottom", "percent": percent, "cutoff": selected[-1][1], "median": median},
+    }
+    log_query_console(query, response, matched_topic=topic, response_type="mention_percentile")
+    return jsonify({
+        "response": response,
+        "type": "mention_percentile"
+    })
+
+def handle_coverage(query, intent):
+    matrix = get_mention_matrix()
+    with span("mention_matrix"):
+        response = matrix.coverage()
+        # One line per candidate so the chat UI has something to show besides the grid
+        response["candidates"] = [
+            {
+                "name": name,
+                "summary": ", ".join(f"{topic} ({count})" for topic, count in matrix.top_topics(i)) or "No topic mentions found.",
+                "source_url": candidate_url(name),
+            }
+            for i, name in enumerate(matrix.candidates)
         ]
+    log_query_console(query, f"{len(matrix.candidates)} candidates × {len(matrix.topics)} topics", response_type="coverage_heatmap")
+    return jsonify({
+        "response": response,
+        "type": "coverage_heatmap"
+    })
+
+# --- General topic summary ---
+def normalize_cached_response(response_data):
+    """A topic_response_cache entry in the {"candidates": [...]} shape every route returns."""
+    if isinstance(response_data, str):
+        try:
+            response_data = json.loads(response_data)
+        except json.JSONDecodeError:
+            print("⚠️ Could not parse cached response as JSON")
+            response_data = {"message": "⚠️ Corrupted cached response."}
+
+    if isinstance(response_data, list):
+        response_data = {"candidates": response_data}
+    elif isinstance(response_data, dict) and isinstance(response_data.get("candidates"), str):
+        # Background jobs used to cache the markdown list itself
+        response_data = dict(response_data, candidates=records_from_markdown(response_data["candidates"]))
+    return response_data
+
+def handle_topic_summary(query, intent):
+    topic = intent.topic
+    print(f"📚 Detected general topic: {topic}")
+
+    topic_response_cache = get_topic_response_cache()
+    if topic and topic in topic_response_cache:
+        print("⚡ Using cached response")
+        response_data = normalize_cached_response(topic_response_cache[topic])
+        log_query_console(query, response_data, matched_topic=topic, response_type="cached_topic_summary")
+        return jsonify({
+            "response": response_data,
+            "type": "cached_topic_summary"
+        })
 
-        if any(phrase in cleaned_query for phrase in summary_keywords):
-            topic = detect_topic_from_query(cleaned_query, aliases)
-            if topic:
-                topic = normalize_topic(topic)
-            print(f"📚 Detected general topic: {topic}")
-
-            if topic in topic_response_cache:
-                print("⚡ Using cached response")
-                response_data = topic_response_cache[topic]
-
-                if isinstance(response_data, str):
-                    try:
-                        response_data = json.loads(response_data)
-                    except json.JSONDecodeError:
-                        print("⚠️ Could not parse cached response as JSON")
-                        response_data = {"message": "⚠️ Corrupted cached response."}
-
-                if isinstance(response_data, list):
-                    response_data = {"candidates": response_data}                 
-
-                log_query_console(query, response_data, matched_topic=topic, response_type="cached_topic_summary")
-                return jsonify({
-                    "response": response_data,
-                    "type": "cached_topic_summary"
-                })
-
-            chunks = topic_chunks.get(topic, [])
-            if len(chunks) > 40:
-                # Attempt sub-filtering based on the user's original query
-                keywords = extract_keywords(cleaned_query)
-                filtered_chunks = [chunk for chunk in chunks if any(k in chunk["text"].lower() for k in keywords)]
-
-                if filtered_chunks:
-                    try:
-                        gpt_summary = summarize_topic_with_gpt(topic, filtered_chunks)
-                        response_data = {
-                            "candidates": gpt_summary,
-                            "topic": topic
-                        }
-                        log_query_console(query, response_data, matched_topic=topic, response_type="gpt_filtered_summary")
-                        return jsonify({
-                            "response": response_data,
-                            "type": "gpt_filtered_summary"
-                        })
-                    except Exception as e:
-                        log_query_console(query, f"⚠️ GPT filtered summary failed: {e}", matched_topic=fallback_topic, response_type="gpt_error")
-
-                # Fallback if no relevant chunks
-                warning = {
-                    "candidates": [{
-                        "name": "Note",
-                        "summary": f"The topic '{fallback_topic}' includes too many sources to summarize. Try a more specific question (e.g., 'active travel in transport').",
-                        "source_url": ""
-                    }]
-                }
-                log_query_console(query, warning, matched_topic=fallback_topic, response_type="fallback_topic_too_large")
-                return jsonify({"response": warning})
-
-
-        # --- Fallback: single candidate on topic ---
-        if "what does" in cleaned_query and "say about" in cleaned_query:
-            parts = cleaned_query.split("say about")
-            candidate_name = parts[0].replace("what does", "").strip()
-            topic = parts[1].strip()
-            if topic.startswith("the "):  # 🆕 normalize
-                topic = topic[4:]
-
-            print(f"🔁 Fallback to summarize_candidate_topic: '{candidate_name}' on '{topic}'")
-            summary_text = summarize_candidate_topic(candidate_name, topic, df)
-            if not isinstance(summary_text, str):
-                summary_text = "No relevant content found."
-
+    chunks = get_topic_chunks().get(topic, [])
+    if len(chunks) <= LARGE_TOPIC_CHUNKS:
+        return None
+
+    # Prefer the sub-topic clusters closest to what was asked
+    cluster_chunks, labels = subtopic_chunks(topic, chunks, intent.cleaned)
+    if cluster_chunks:
+        print(f"🧩 Sub-topics for '{topic}': {labels} ({len(cluster_chunks)} of {len(chunks)} chunks)")
+        try:
+            gpt_summary = single_flight.do(
+                flight_key("subtopic_summary", topic, detail=labels),
+                lambda: summarize_topic_with_gpt(topic, cluster_chunks, on_candidate=emit_topic_summary)
+            )
             response_data = {
-                "candidates": [{
-                    "name": candidate_name,
-                    "source_url": candidate_url(candidate_name),
-                    "summary": summary_text
-                }],
-                "topic": topic
+                "candidates": gpt_summary,
+                "topic": topic,
+                "subtopics": labels
             }
-
-            log_query_console(query, response_data, matched_topic=topic, response_type="generated_topic_summary")
+            log_query_console(query, response_data, matched_topic=topic, response_type="subtopic_summary")
             return jsonify({
                 "response": response_data,
-                "type": "generated_topic_summary"
+                "type": "subtopic_summary"
             })
-
-        # --- Fallback: "[Candidate] on [Topic]" style query ---
-        short_form_match = re.match(r"^([\w\s\-']+?)\s+on\s+([\w\s\-']+)$", cleaned_query)
-        if short_form_match:
-            candidate_name = short_form_match.group(1).strip()
-            topic = detect_topic_from_query(short_form_match.group(2).strip(), aliases)
-            if topic.startswith("the "):  # normalize
-                topic = topic[4:]
-
-            print(f"📌 Short form detected: {candidate_name} on {topic}")
-            chunks = topic_chunks.get(topic, [])
-            for chunk in chunks:
-                if chunk["name"].lower() == candidate_name.lower():
-                    response = {
-                        "candidates": [{
-                            "name": chunk['name'],
-                            "summary": chunk.get('summary') or chunk.get('text', ''),
-                            "source_url": candidate_url(chunk['name'])
-                        }]
-                    }
-                    log_query_console(query, response, matched_topic=topic, response_type="fallback_short_form_match")
-                    return jsonify({
-                        "response": response,
-                        "type": "fallback_short_form_match"
-                    })
-
-            log_query_console(query, f"No specific statement found for {candidate_name} on {topic}.", matched_topic=topic, response_type="no_short_match")
+        except Exception as e:
+            log_query_console(query, f"⚠️ GPT sub-topic summary failed: {e}", matched_topic=topic, response_type="gpt_error")
+
+    # Otherwise attempt sub-filtering based on the user's original query
+    keywords = extract_keywords(intent.cleaned)
+    filtered_chunks = [chunk for chunk in chunks if any(k in chunk["text"].lower() for k in keywords)]
+
+    if filtered_chunks and len(filtered_chunks) <= LARGE_TOPIC_CHUNKS:
+        try:
+            gpt_summary = single_flight.do(
+                flight_key("topic_summary", topic, detail=keywords),
+                lambda: summarize_topic_with_gpt(topic, filtered_chunks, on_candidate=emit_topic_summary)
+            )
+            response_data = {
+                "candidates": gpt_summary,
+                "topic": topic
+            }
+            log_query_console(query, response_data, matched_topic=topic, response_type="gpt_filtered_summary")
             return jsonify({
-                "response": {
-                    "candidates": [{
-                        "name": candidate_name,
-                        "summary": f"No specific statement found on {topic}.",
-                        "source_url": candidate_url(candidate_name)
-                    }]
-                },
-                "type": "no_short_match"
+                "response": response_data,
+                "type": "gpt_filtered_summary"
             })
+        except Exception as e:
+            log_query_console(query, f"⚠️ GPT filtered summary failed: {e}", matched_topic=topic, response_type="gpt_error")
+
+    # No small enough subset: summarise the whole topic in the background
+    return topic_job_response(query, topic, len(chunks))
+
+# --- Single candidate on topic: "what does X say about Y" ---
+def resolve_candidate(candidate_name):
+    """Canonical candidate name for a typed one (surname, alias, typo), else as typed."""
+    return get_candidate_index().resolve_name(candidate_name) or candidate_name
+
+def candidate_suggestions(candidate_name, limit=3):
+    return [m["name"] for m in get_candidate_index().name_index.match(candidate_name, limit=limit)]
+
+def handle_candidate_say_about(query, intent):
+    candidate_name = resolve_candidate(intent.candidate)
+    topic = intent.topic
+
+    print(f"🔁 Fallback to summarize_candidate_topic: '{candidate_name}' on '{topic}'")
+    summary_text = single_flight.do(
+        flight_key("candidate_topic", topic, candidate_name),
+        lambda: summarize_candidate_topic(candidate_name, topic)
+    )
+    if not isinstance(summary_text, str):
+        summary_text = "No relevant content found."
+
+    response_data = {
+        "candidates": [{
+            "name": candidate_name,
+            "source_url": candidate_url(candidate_name),
+            "summary": summary_text
+        }],
+        "topic": topic
+    }
 
-        # --- Fallback: more complex phrasing ---
-        candidate_topic_match = re.search(
-            r"(?:what does|where does|tell me what)\s+([\w\s\-']+?)\s+(?:say|think|stand).*?\b(on|about)?\b\s+([\w\s\-']+)",
-            cleaned_query
-        )
-
-        if candidate_topic_match:
-            candidate_name = candidate_topic_match.group(1).strip()
-            topic = detect_topic_from_query(candidate_topic_match.group(3).strip(), aliases)
-            if topic.startswith("the "):  # 🆕 normalize
-                topic = topic[4:]
-
-            print(f"🧑‍💼 Candidate detected: {candidate_name} | 🧠 Topic detected: {topic}")
-            chunks = topic_chunks.get(topic, [])
-            for chunk in chunks:
-                if chunk["name"].lower() == candidate_name.lower():
-                    response = {
-                        "candidates": [{
-                            "name": chunk['name'],
-                            "summary": chunk.get('summary') or chunk.get('text', ''),
-                            "source_url": candidate_url(chunk['name'])
-                        }]
-                    }
-                    log_query_console(query, response, matched_topic=topic, response_type="fallback_direct_match")
-                    return jsonify({
-                        "response": response,
-                        "type": "fallback_direct_match"
-                    })
-
-            log_query_console(query, f"No specific statement found for {candidate_name} on {topic}.", matched_topic=topic, response_type="no_candidate_match")
+    log_query_console(query, response_data, matched_topic=topic, response_type="generated_topic_summary")
+    return jsonify({
+        "response": response_data,
+        "type": "generated_topic_summary"
+    })
+
+# --- "[Candidate] on [Topic]" and other candidate + topic phrasings ---
+def candidate_chunk_response(query, intent, match_type, miss_type):
+    topic = intent.topic
+    if not topic:
+        return None
+    candidate_name = resolve_candidate(intent.candidate)
+
+    chunks = get_topic_chunks().get(topic, [])
+    for chunk in chunks:
+        if chunk["name"].lower() == candidate_name.lower():
+            response = {
+                "candidates": [{
+                    "name": chunk['name'],
+                    "summary": chunk.get('summary') or chunk.get('text', ''),
+                    "source_url": candidate_url(chunk['name'])
+                }]
+            }
+            log_query_console(query, response, matched_topic=topic, response_type=match_type)
             return jsonify({
-                "response": {
-                    "candidates": [{
-                        "name": candidate_name,
-                        "summary": f"No specific statement found on {topic}.",
-                        "source_url": candidate_url(candidate_name)
-                    }]
-                },
-                "type": "no_candidate_match"
+                "response": response,
+                "type": match_type
             })
 
-       
-        # --- Last-resort: keyword-based GPT summary ---
-        fallback_topic = detect_topic_from_query(cleaned_query, aliases)
-        if fallback_topic:
-            print(f"🆘 Last-resort GPT fallback: detected topic '{fallback_topic}'")
-
-            chunks = topic_chunks.get(fallback_topic, [])
-
-            if chunks:
-                if len(chunks) > 40:
-                    warning = {
-                        "candidates": [{
-                            "name": "Note",
-                            "summary": f"The topic '{fallback_topic}' includes too many sources to summarize directly. Please try a more specific question (e.g., 'special needs in schools').",
-                            "source_url": ""
-                        }]
-                    }
-                    log_query_console(query, warning, matched_topic=fallback_topic, response_type="fallback_topic_too_large")
-                    return jsonify({
-                        "response": warning,
-                        "type": "fallback_topic_too_large"
-                    })
+    summary = f"No specific statement found on {topic}."
+    suggestions = [name for name in candidate_suggestions(candidate_name) if name != candidate_name]
+    if suggestions:
+        summary += f" Did you mean {', '.join(suggestions)}?"
 
-                try:
-                    gpt_summary = summarize_topic_with_gpt(fallback_topic, chunks)
-                    response_data = {
-                        "candidates": gpt_summary,
-                        "topic": fallback_topic
-                    }
-                    log_query_console(query, response_data, matched_topic=fallback_topic, response_type="gpt_fallback_summary")
+    log_query_console(query, f"No specific statement found for {candidate_name} on {topic}.", matched_topic=topic, response_type=miss_type)
+    return jsonify({
+        "response": {
+            "candidates": [{
+                "name": candidate_name,
+                "summary": summary,
+                "source_url": candidate_url(candidate_name)
+            }]
+        },
+        "type": miss_type
+    })
+
+def handle_candidate_short_form(query, intent):
+    print(f"📌 Short form detected: {intent.candidate} on {intent.topic}")
+    return candidate_chunk_response(query, intent, "fallback_short_form_match", "no_short_match")
+
+def handle_candidate_topic(query, intent):
+    print(f"🧑‍💼 Candidate detected: {intent.candidate} | 🧠 Topic detected: {intent.topic}")
+    return candidate_chunk_response(query, intent, "fallback_direct_match", "no_candidate_match")
+
+# --- Last-resort: keyword-based GPT summary ---
+def handle_fallback(query, intent):
+    cleaned_query = intent.cleaned
+    fallback_topic = intent.topic if intent.name == "fallback" else detect_topic_from_query(cleaned_query, aliases)
+    if fallback_topic:
+        print(f"🆘 Last-resort GPT fallback: detected topic '{fallback_topic}'")
+
+        chunks = get_topic_chunks().get(fallback_topic, [])
+
+        if chunks:
+            if len(chunks) > LARGE_TOPIC_CHUNKS:
+                cached = get_topic_response_cache().get(fallback_topic)
+                if cached is not None:
+                    cached = normalize_cached_response(cached)
+                    log_query_console(query, cached, matched_topic=fallback_topic, response_type="cached_topic_summary")
                     return jsonify({
-                        "response": response_data,
-                        "type": "gpt_fallback_summary"
+                        "response": cached,
+                        "type": "cached_topic_summary"
                     })
-                except Exception as e:
-                    log_query_console(query, f"⚠️ GPT fallback failed: {e}", matched_topic=fallback_topic, response_type="gpt_error")
-            else:
-                # No topic chunks found, use keyword matcher with GPT summaries over df
-                keyword_summary = last_resort_keyword_summary(query, df, fallback_topic=fallback_topic)
-                log_query_console(query, keyword_summary, matched_topic=fallback_topic, response_type="keyword_gpt_summary")
-                return jsonify({"response": keyword_summary})
-        
-        # --- Final fallback: use keyword matcher across all embeddings if no topic matched ---
-        print("🧭 No alias-based topic detected. Using full-text fallback.")
-        keyword_summary = last_resort_keyword_summary(query, df)
-        log_query_console(query, keyword_summary, matched_topic="unknown", response_type="keyword_fulltext_summary")
-        return jsonify({"response": keyword_summary})
-
-    
-
-    except Exception as e:
-        error_message = f"An error occurred: {e}"
-        log_query_console(query, error_message, response_type="exception")
-        return jsonify({
-            "response": error_message,
-            "type": "exception"
-        }), 500
-       
-
-    
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+                return topic_job_response(query, fallback_topic, len(chunks))
 
+            try:
+                gpt_summary = single_flight.do(
+                    flight_key("topic_summary", fallback_topic),
+                    lambda: summarize_topic_with_gpt(fallback_topic, chunks, on_candidate=emit_topic_summary)
+                )
+                response_data = {
+                    "candidates": gpt_summary,
+                    "topic": fallback_topic
+                }
+                log_query_console(query, response_data, matched_topic=fallback_topic, response_type="gpt_fallback_summary")
+                return jsonify({
+                    "response": response_data,
+                    "type": "gpt_fallback_summary"
+                })
+            except Exception as e:
+                log_query_console(query, f"⚠️ GPT fallback failed: {e}", matched_topic=fallback_topic, response_type="gpt_error")
+        else:
+            # No topic chunks found, use keyword matcher with GPT summaries over the corpus
+            keyword_summary = single_flight.do(
+                flight_key("keyword_summary", fallback_topic, detail=cleaned_query),
+                lambda: last_resort_keyword_summary(query, get_corpus_store(), fallback_topic=fallback_topic)
+            )
+            log_query_console(query, keyword_summary, matched_topic=fallback_topic, response_type="keyword_gpt_summary")
+            return jsonify({"response": keyword_summary})
+
+    # --- Final fallback: use keyword matcher across all embeddings if no topic matched ---
+    print("🧭 No alias-based topic detected. Using full-text fallback.")
+    keyword_summary = single_flight.do(
+        flight_key("keyword_summary", detail=cleaned_query),
+        lambda: last_resort_keyword_summary(query, get_corpus_store())
+    )
+    log_query_console(query, keyword_summary, matched_topic="unknown", response_type="keyword_fulltext_summary")
+    return jsonify({"response": keyword_summary})
+
+INTENT_HANDLERS = {
+    "stance": handle_stance,
+    "low_mention": handle_low_mention,
+    "mention_rank": handle_mention_rank,
+    "mention_percentile": handle_mention_percentile,
+    "coverage": handle_coverage,
+    "topic_summary": handle_topic_summary,
+    "candidate_say_about": handle_candidate_say_about,
+    "candidate_short_form": handle_candidate_short_form,
+    "candidate_topic": handle_candidate_topic,
+    "fallback": handle_fallback,
+}
+
+# Precompute the suggested and most-asked prompts; see warmup.py
+if WARMUP_ON_START:
+    start_background_warmup(app)
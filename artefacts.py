@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import pickle
+import functools
+import threading
+import numpy as np
+import pandas as pd
+from topics import aliases
+
+# --- Artefact paths ---
+EMBEDDINGS_PKL = "embeddings.pkl"
+EMBEDDINGS_CSV = "embeddings.csv"
+EMBEDDINGS_NPY = "embeddings.npy"
+CORPUS_PKL = "corpus.pkl"
+EMBEDDINGS_META = "embeddings.meta.json"
+TOPIC_CHUNKS = "topic_chunks.json"
+STANCE_TABLES = "stance_tables.json"
+SUBTOPICS = "subtopics.json"
+TOPIC_RESPONSE_CACHE = "topic_response_cache.json"
+TOPIC_SUMMARY_CACHE = "topic_summary_cache.pkl"
+STANCE_CACHE = "stance_cache.pkl"
+
+EAGER_LOAD = os.getenv("BALLOTBOT_EAGER_LOAD", "").lower() in ("1", "true", "yes")
+
+_lock = threading.RLock()
+_loaded = {}
+load_times = {}
+
+
+def artefact(fn):
+    """Load an artefact on first use, once per process, under a lock."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def getter():
+        try:
+            return _loaded[name]
+        except KeyError:
+            pass
+        with _lock:
+            if name not in _loaded:
+                start = time.perf_counter()
+                _loaded[name] = fn()
+                load_times[name] = round(time.perf_counter() - start, 4)
+            return _loaded[name]
+
+    getter.is_loaded = lambda: name in _loaded
+    return getter
+
+
+def _read_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _read_pickle(path, default=None):
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return default
+
+
+# --- Corpus and embeddings ---
+def load_embeddings():
+    try:
+        with open(EMBEDDINGS_PKL, "rb") as f:
+            df = pickle.load(f)
+        print("✅ Loaded embeddings from pickle file.")
+    except Exception as e:
+        print(f"⚠️ Failed to load {EMBEDDINGS_PKL}: {e}")
+        print("📄 Attempting to load from embeddings.csv instead...")
+        df = pd.read_csv(EMBEDDINGS_CSV)
+
+    # Normalize any legacy columns
+    if "Candidate Name" in df.columns:
+        df.rename(columns={
+            "Candidate Name": "name",
+            "Text": "text",
+            "URL": "source_url"
+        }, inplace=True)
+
+    return df
+
+
+def _source_signature():
+    for path in (EMBEDDINGS_PKL, EMBEDDINGS_CSV):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            return {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return None
+
+
+def split_embeddings(df):
+    """Pull the embedding column out of df as a normalised float32 matrix.
+
+    Rows without a vector get a zero row so matrix rows line up with df rows.
+    """
+    from vector_index import EMBEDDING_COLUMNS, _as_vector, _normalize_rows
+
+    column = next((c for c in EMBEDDING_COLUMNS if c in df.columns), None)
+    if column is None:
+        return df, None
+
+    vectors = [None if v is None or (isinstance(v, float) and np.isnan(v)) else _as_vector(v) for v in df[column]]
+    dims = next((len(v) for v in vectors if v is not None), 0)
+    matrix = np.zeros((len(vectors), dims), dtype=np.float32)
+    for i, vector in enumerate(vectors):
+        if vector is not None:
+            matrix[i] = vector
+    return df.drop(columns=[column]).reset_index(drop=True), _normalize_rows(matrix)
+
+
+def save_corpus(df, matrix, signature=None):
+    """Write the slim corpus pickle, the .npy matrix and their metadata."""
+    df.to_pickle(f"{CORPUS_PKL}.tmp")
+    os.replace(f"{CORPUS_PKL}.tmp", CORPUS_PKL)
+    if matrix is not None:
+        with open(f"{EMBEDDINGS_NPY}.tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+        os.replace(f"{EMBEDDINGS_NPY}.tmp", EMBEDDINGS_NPY)
+    elif os.path.exists(EMBEDDINGS_NPY):
+        os.remove(EMBEDDINGS_NPY)
+    with open(f"{EMBEDDINGS_META}.tmp", "w") as f:
+        json.dump({"source": signature, "rows": len(df), "has_embeddings": matrix is not None}, f)
+    os.replace(f"{EMBEDDINGS_META}.tmp", EMBEDDINGS_META)
+
+
+def load_corpus():
+    """(slim DataFrame, memory-mapped embedding matrix or None), uncached.
+
+    The first load converts embeddings.pkl into corpus.pkl + embeddings.npy;
+    later loads (in any worker) unpickle only the text columns and map the
+    matrix read-only, so the pages are shared through the OS page cache.
+    """
+    signature = _source_signature()
+    meta = _read_json(EMBEDDINGS_META)
+    fresh = meta is not None and os.path.exists(CORPUS_PKL) and (signature is None or meta.get("source") == signature)
+
+    if fresh:
+        df = pd.read_pickle(CORPUS_PKL)
+        matrix = np.load(EMBEDDINGS_NPY, mmap_mode="r") if meta.get("has_embeddings") else None
+        print(f"✅ Loaded corpus ({len(df)} rows) with memory-mapped embeddings.")
+        return df, matrix
+
+    df, matrix = split_embeddings(load_embeddings())
+    try:
+        save_corpus(df, matrix, signature)
+        if matrix is not None:
+            matrix = np.load(EMBEDDINGS_NPY, mmap_mode="r")
+    except OSError as e:
+        print(f"⚠️ Could not write corpus artefacts: {e}")
+    return df, matrix
+
+
+@artefact
+def corpus():
+    """(CorpusStore, memory-mapped embedding matrix or None).
+
+    Only the store is kept: the DataFrame is dropped once its names and texts
+    are packed, and every reader goes through the store's buffer.
+    """
+    from corpus_store import CorpusStore
+
+    df, matrix = load_corpus()
+    store = CorpusStore.from_dataframe(df)
+    print(f"✅ Built corpus store over {len(store)} rows ({store.nbytes / 1e6:.1f} MB).")
+    return store, matrix
+
+
+def get_corpus_store():
+    return corpus()[0]
+
+
+def get_embedding_matrix():
+    return corpus()[1]
+
+
+@artefact
+def get_vector_index():
+    from vector_index import VectorIndex
+
+    matrix = get_embedding_matrix()
+    if matrix is None:
+        print("⚠️ No embedding column found; vector search disabled.")
+        return None
+    # Same rows as the corpus store, so the index reads its text and lowered buffer
+    index = VectorIndex(matrix, get_corpus_store(), aliases, normalized=True)
+    print(f"✅ Built vector index over {len(index)} rows.")
+    return index
+
+
+@artefact
+def get_mention_matrix():
+    from mention_matrix import MentionMatrix
+    matrix = MentionMatrix.from_store(get_corpus_store(), aliases)
+    print(f"✅ Built mention matrix: {len(matrix.candidates)} candidates × {len(matrix.topics)} topics.")
+    return matrix
+
+
+@artefact
+def get_candidate_index():
+    from candidate_index import load_candidate_index
+    return load_candidate_index(get_corpus_store())
+
+
+# --- JSON artefacts and caches ---
+@artefact
+def get_topic_chunks():
+    return _read_json(TOPIC_CHUNKS, {})
+
+
+@artefact
+def get_stance_tables():
+    from stance_tables import load_stance_tables
+    return load_stance_tables(STANCE_TABLES)
+
+
+@artefact
+def get_subtopic_index():
+    from subtopics import load_subtopics
+    return load_subtopics(SUBTOPICS)
+
+
+@artefact
+def get_topic_response_cache():
+    from cache_store import open_cache
+    return open_cache("topic_response", seed=_read_json(TOPIC_RESPONSE_CACHE, {}).items())
+
+
+@artefact
+def get_topic_summary_cache():
+    from cache_store import open_cache
+    return open_cache("topic_summary", seed=_read_pickle(TOPIC_SUMMARY_CACHE, {}).items())
+
+
+@artefact
+def get_stance_cache():
+    return _read_pickle(STANCE_CACHE, {})
+
+
+@artefact
+def get_stance_records():
+    """Validated {stance, reason} records per candidate statement, shared by every worker."""
+    from cache_store import open_cache
+    return open_cache("stance_records")
+
+
+@artefact
+def get_query_embeddings():
+    """Embeddings of asked queries, keyed by model and query text."""
+    from cache_store import open_cache
+    return open_cache("query_embeddings")
+
+
+@artefact
+def get_client():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+def preload():
+    """Load everything now, e.g. in a gunicorn --preload master before forking."""
+    for getter in (corpus, get_mention_matrix, get_vector_index, get_candidate_index, get_topic_chunks,
+                   get_stance_tables, get_subtopic_index, get_topic_response_cache, get_topic_summary_cache):
+        getter()
+    return dict(load_times)
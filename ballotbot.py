@@ -8,6 +8,7 @@ import tempfile
 import os
 import uuid
 import re
+from prompts import SUGGESTED_PROMPTS
 
 st.set_page_config(page_title="BallotBot - Guernsey Election 2025", layout="wide")
 st.sidebar.markdown("<style>.css-1vq4p4l {visibility: visible !important;}</style>", unsafe_allow_html=True)
@@ -109,20 +110,56 @@ BallotBot uses candidate manifestos, podcasts, hustings and more. They were buil
 st.title("BallotBot - Election 2025")
 
 API_URL = "https://ballotbot.onrender.com/chat"
+STREAM_URL = f"{API_URL}/stream"
+STREAM_READ_TIMEOUT = 60  # max seconds between events; the server pings every 15s
+
+
+def render_candidate(item):
+    name = item.get("name", "Unknown")
+    text = item.get("summary") or item.get("text", "No statement available")
+    url = item.get("source_url", "") or item.get("url", "")
+    name_md = f"[**{name}**]({url})" if url else f"**{name}**"
+    return f"{name_md}: {text}"
+
+
+def fetch_response_streaming(query, placeholder):
+    """POST to /chat/stream and render candidates as they arrive."""
+    streamed = {}
+    with requests.post(STREAM_URL, json={"query": query}, stream=True, timeout=(10, STREAM_READ_TIMEOUT)) as res:
+        if res.status_code == 404:
+            # Older backend without streaming
+            res = requests.post(API_URL, json={"query": query}, timeout=300)
+            if res.status_code == 200:
+                return res.json().get("response", "No response received.")
+            return f"❌ Server error: {res.status_code}"
+        if res.status_code != 200:
+            return f"❌ Server error: {res.status_code}"
+
+        for line in res.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["event"] == "candidate":
+                streamed[event["index"]] = event["candidate"]
+                with placeholder.container():
+                    st.markdown(f"### 👤 Candidate summaries ({len(streamed)} so far):")
+                    for item in streamed.values():
+                        st.markdown(render_candidate(item))
+            elif event["event"] == "result":
+                result = event.get("response", "No response received.")
+                # The result's own list is final; the streamed records only stand in when it has none
+                if isinstance(result, dict) and not isinstance(result.get("candidates"), list) and (streamed or "candidates" in result):
+                    result = dict(result, candidates=[streamed[i] for i in sorted(streamed)])
+                return result
+            elif event["event"] == "error":
+                return f"❌ {event.get('response', 'Request failed')}"
+    return "No response received."
 
 
 
 # --- Suggested prompts ---
-suggested_prompts = [
-    "What is said about housing?",
-    "How do candidates view the economy?",
-    "What are the views on education?",
-    "What do candidates say about health?",
-    "What are the views on taxation?",
-    "Who supports GST?",
-    "What do they think about government reform?",
-    "What is said about transport?"
-]
+# Shared with the backend warm-up, which keeps their answers cached
+suggested_prompts = SUGGESTED_PROMPTS
 
 st.markdown("**Suggested questions:**")
 cols = st.columns(3)
@@ -157,17 +194,15 @@ if (
 ):
     st.session_state.processing_query = True
     query = st.session_state.chat_history[-1][0]
+    stream_placeholder = st.empty()
     with st.spinner("Thinking..."):
         try:
-            res = requests.post(API_URL, json={"query": query}, timeout=300)
-            if res.status_code == 200:
-                result = res.json().get("response", "No response received.")
-            else:
-                result = f"❌ Server error: {res.status_code}"
+            result = fetch_response_streaming(query, stream_placeholder)
         except Exception as e:
             result = f"❌ Request failed: {e}"
 
         st.session_state.chat_history[-1] = (query, result)
+    stream_placeholder.empty()
     st.session_state.processing_query = False
 
 # --- Display chat history ---
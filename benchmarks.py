@@ -0,0 +1,801 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+from topics import aliases
+from topic_matcher import TopicMatcher
+from prompts import SUGGESTED_PROMPTS
+
+
+# --- Helpers ---
+def time_per_call(fn, inputs, repeat=3):
+    """Best-of-`repeat` mean seconds per call of fn over inputs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in inputs:
+            fn(item)
+        best = min(best, (time.perf_counter() - start) / max(len(inputs), 1))
+    return best
+
+
+def load_chunk_texts(limit=None):
+    with open("topic_chunks.json", "r") as f:
+        topic_chunks = json.load(f)
+    texts = [chunk["text"] for chunks in topic_chunks.values() for chunk in chunks]
+    return texts[:limit] if limit else texts
+
+
+# --- Topic detection ---
+def legacy_detect_topic(query, aliases):
+    query_lower = query.lower().strip()
+    for topic, alias_list in aliases.items():
+        for alias in alias_list:
+            if re.search(rf"\b{re.escape(alias.lower())}\b", query_lower):
+                return topic
+    for topic in aliases:
+        if topic.lower() in query_lower:
+            return topic
+    return None
+
+
+def topic_regression_corpus():
+    corpus = list(SUGGESTED_PROMPTS)
+    for topic, alias_list in aliases.items():
+        corpus.append(f"what do candidates say about {topic}?")
+        for alias in alias_list:
+            corpus.append(f"who supports {alias}")
+            corpus.append(f"{alias}!")
+            corpus.append(f"{alias}s and more")
+    corpus += [
+        "", "   ", "gst+", "gst + tax", "GST+ policy", "the economy", "economy",
+        "economic growth", "islandwide voting", "sportsmanship", "artist", "taxonomy",
+        "what does sue aldwell say about the health service",
+    ]
+    corpus += load_chunk_texts()
+    return corpus
+
+
+def synthetic_aliases(total):
+    rnd = random.Random(42)
+    table = {topic: list(alias_list) for topic, alias_list in aliases.items()}
+    words = sorted({w for t in load_chunk_texts(200) for w in re.findall(r"[a-z]{4,}", t.lower())})
+    topics = list(table)
+    count = sum(len(v) for v in table.values())
+    while count < total:
+        phrase = " ".join(rnd.sample(words, rnd.choice([1, 2, 3])))
+        table[rnd.choice(topics)].append(phrase)
+        count += 1
+    return table
+
+
+def bench_topics(args):
+    corpus = topic_regression_corpus()
+    matcher = TopicMatcher(aliases)
+    mismatches = [q for q in corpus if matcher.detect(q) != legacy_detect_topic(q, aliases)]
+    print(f"🧪 Regression corpus: {len(corpus)} queries, {len(mismatches)} mismatches")
+    for q in mismatches[:10]:
+        print(f"   ❌ {q[:80]!r}: {matcher.detect(q)} != {legacy_detect_topic(q, aliases)}")
+
+    queries = SUGGESTED_PROMPTS + load_chunk_texts(20)
+    results = []
+    for total in args.sizes:
+        table = synthetic_aliases(total)
+        table_matcher = TopicMatcher(table)
+        legacy = time_per_call(lambda q: legacy_detect_topic(q, table), queries, repeat=1)
+        detected = time_per_call(table_matcher.detect, queries)
+        matched = time_per_call(table_matcher.match, queries)
+        results.append({
+            "aliases": table_matcher.alias_count,
+            "legacy_us": round(legacy * 1e6, 1),
+            "detect_us": round(detected * 1e6, 1),
+            "match_us": round(matched * 1e6, 1),
+        })
+        print(f"⏱️ {table_matcher.alias_count:>6} aliases: legacy {legacy * 1e6:10.1f} µs/query, "
+              f"detect {detected * 1e6:8.1f} µs/query, match with spans {matched * 1e6:8.1f} µs/query")
+
+    if args.json:
+        print(json.dumps({"mismatches": len(mismatches), "scaling": results}))
+    return 1 if mismatches else 0
+
+
+# --- Topic resolution ---
+def difflib_most_relevant(topic, topic_chunks):
+    """The SequenceMatcher scan get_most_relevant_chunk used to do; returns the key."""
+    import difflib
+
+    topic = topic.lower()
+    best_match = None
+    best_score = 0
+    for t in topic_chunks:
+        score = difflib.SequenceMatcher(None, topic, t.lower()).ratio()
+        if score > best_score:
+            best_match = t
+            best_score = score
+    return best_match
+
+
+def topic_resolution_cases(topic_chunks, rnd):
+    """(text, expected topic): exact keys, typos, aliases and sub-topic phrases."""
+    cases = []
+    for topic in topic_chunks:
+        typo_at = rnd.randrange(len(topic))
+        cases += [
+            (topic, topic),
+            (topic.upper(), topic),
+            (topic[:typo_at] + topic[typo_at + 1:], topic),
+            (f"{topic} policy", topic),
+        ]
+        for alias in aliases.get(topic, [])[:6]:
+            if alias.lower() != topic:
+                cases.append((alias, topic))
+    cases += [
+        ("active travel", "transport"), ("special needs in schools", "education"),
+        ("bus services", "transport"), ("affordable homes", "housing"),
+        ("mental health support", "health"), ("goods and services tax", "gst"),
+    ]
+    return [(text, expected) for text, expected in cases if expected in topic_chunks]
+
+
+def bench_resolve(args):
+    from topic_resolver import TopicResolver
+
+    with open("topic_chunks.json", "r") as f:
+        topic_chunks = json.load(f)
+    rnd = random.Random(11)
+
+    results = []
+    for total in args.sizes:
+        keys = dict(topic_chunks)
+        words = sorted({w for t in load_chunk_texts(200) for w in re.findall(r"[a-z]{4,}", t.lower())})
+        while len(keys) < total:
+            keys[" ".join(rnd.sample(words, rnd.choice([1, 2, 3])))] = []
+        cases = topic_resolution_cases(topic_chunks, rnd)
+        resolver = TopicResolver(keys, aliases)
+        texts = [text for text, _ in cases]
+
+        difflib_hits = sum(difflib_most_relevant(text, keys) == expected for text, expected in cases)
+        resolver_hits = sum((resolver.top_k(text, k=1) or [(None,)])[0][0] == expected for text, expected in cases)
+        legacy = time_per_call(lambda text: difflib_most_relevant(text, keys), texts, repeat=1)
+        indexed = time_per_call(lambda text: resolver.top_k(text, k=5), texts, repeat=args.repeat)
+        results.append({
+            "topics": len(keys),
+            "cases": len(cases),
+            "difflib_hits": difflib_hits,
+            "resolver_hits": resolver_hits,
+            "difflib_us": round(legacy * 1e6, 1),
+            "resolver_us": round(indexed * 1e6, 1),
+        })
+        print(f"⏱️ {len(keys):>5} topics: difflib {difflib_hits}/{len(cases)} correct, {legacy * 1e6:9.1f} µs/query; "
+              f"trigram {resolver_hits}/{len(cases)} correct, {indexed * 1e6:7.1f} µs/query")
+
+    if args.json:
+        print(json.dumps(results))
+    return 0
+
+
+# --- Routing ---
+LEGACY_STANCE = re.compile(
+    r"\b(who|which candidates)\b\s+("
+    r"supports?|opposes?|opposed\s+to|in\s+favour\s+of|backs?|rejects?|wants?|favours?|"
+    r"are\s+against|are\s+for|is\s+against|is\s+for|stands\s+(?:against|for)|"
+    r"don't\s+support|do\s+not\s+support|disagree\s+with|doesn't\s+agree\s+with"
+    r")\s+(.*)",
+    re.IGNORECASE
+)
+
+
+def legacy_route(query):
+    """The intent the pre-router if-chain in app.chat() would have tried first."""
+    from router import SUMMARY_PHRASES
+
+    cleaned_query = query.lower()
+    cleaned_query = cleaned_query.replace("’", "'")
+    cleaned_query = cleaned_query.replace("‘", "'")
+    cleaned_query = cleaned_query.replace("“", '"').replace("”", '"')
+    cleaned_query = cleaned_query.replace("–", "-").replace("—", "-")
+    cleaned_query = re.sub(r"[^\w\s'\-]", "", cleaned_query)
+    cleaned_query = cleaned_query.replace(" the ", " ")
+
+    if LEGACY_STANCE.search(cleaned_query):
+        return "stance"
+    if re.search(r"(which|who)\s+(candidates\s+)?(don'?t|do not|rarely|barely|seldom).*?(talk|mention|say).*?\b(about|on)?\b\s+(.+)", cleaned_query):
+        return "low_mention"
+    if any(phrase in cleaned_query for phrase in SUMMARY_PHRASES):
+        return "topic_summary"
+    if "what does" in cleaned_query and "say about" in cleaned_query:
+        return "candidate_say_about"
+    if re.match(r"^([\w\s\-']+?)\s+on\s+([\w\s\-']+)$", cleaned_query):
+        return "candidate_short_form"
+    if re.search(r"(?:what does|where does|tell me what)\s+([\w\s\-']+?)\s+(?:say|think|stand).*?\b(on|about)?\b\s+([\w\s\-']+)", cleaned_query):
+        return "candidate_topic"
+    return "fallback"
+
+
+# (router intent, legacy intent) pairs where the old chain's order was wrong,
+# or where a later intent picks up queries the chain left to another handler
+ROUTING_FIXES = {("candidate_topic", "candidate_short_form")}
+ROUTING_FIXES |= {(intent, "fallback") for intent in ("low_mention", "mention_rank", "mention_percentile", "coverage")}
+ROUTING_FIXES.add(("mention_percentile", "candidate_short_form"))  # "bottom 10% on housing" is not a candidate
+
+
+def routing_corpus():
+    from query_log import iter_log_entries
+
+    corpus = list(SUGGESTED_PROMPTS)
+    corpus += [entry.get("query", "") for entry in iter_log_entries() if entry.get("query")]
+    names = ["Sue Aldwell", "Art Allen-O'Leary", "aldwell", "Heidi Almonte"]
+    for topic in list(aliases)[:12]:
+        corpus += [
+            f"Who opposes {topic}?", f"Which candidates don’t talk about {topic}?",
+            f"What are the views on {topic}?", f"{topic} policy",
+        ]
+        for name in names:
+            corpus += [f"What does {name} say about {topic}?", f"{name} on {topic}", f"Where does {name} stand on {topic}"]
+    return corpus
+
+
+def bench_routing(args):
+    from router import Router
+
+    corpus = routing_corpus()
+    router = Router()  # no topic resolver: times pattern matching only
+    routed_pairs = [(q, router.route(q).name, legacy_route(q)) for q in corpus]
+    reordered = [r for r in routed_pairs if (r[1], r[2]) in ROUTING_FIXES]
+    mismatches = [r for r in routed_pairs if r[1] != r[2] and (r[1], r[2]) not in ROUTING_FIXES]
+    print(f"🧪 Routing corpus: {len(corpus)} queries, {len(reordered)} deliberately re-routed, {len(mismatches)} unexpected mismatches")
+    for q, new, old in mismatches[:10]:
+        print(f"   ❌ {q[:80]!r}: {new} != {old}")
+
+    legacy = time_per_call(legacy_route, corpus, repeat=args.repeat)
+    routed = time_per_call(router.route, corpus, repeat=args.repeat)
+    print(f"⏱️ legacy chain {legacy * 1e6:8.1f} µs/query, router {routed * 1e6:8.1f} µs/query "
+          f"({len(router.runs)} searches at most, per-intent timing on)")
+
+    per_intent = router.snapshot()
+    for name, stats in sorted(per_intent.items()):
+        print(f"   {name:>22}: {stats['routed']:>6} routed, {stats['route_us']:6.1f} µs")
+
+    if args.json:
+        print(json.dumps({
+            "queries": len(corpus),
+            "reordered": len(reordered),
+            "mismatches": len(mismatches),
+            "legacy_us": round(legacy * 1e6, 1),
+            "router_us": round(routed * 1e6, 1),
+            "per_intent": per_intent,
+        }))
+    return 1 if mismatches else 0
+
+
+# --- Candidate names ---
+def name_variants(name, rnd):
+    """(query, expected) pairs: full name, surname, lower case and one-typo forms."""
+    tokens = name.split()
+    surname = " ".join(tokens[1:]) or name
+    typo_at = rnd.randrange(len(surname))
+    typo = surname[:typo_at] + surname[typo_at + 1:]
+    return [(name, name), (name.lower(), name), (surname, name), (typo, name)]
+
+
+def bench_names(args):
+    from artefacts import get_corpus_store
+    from name_index import NameIndex
+
+    names = sorted(n for n in set(get_corpus_store().names) if n)
+    index = NameIndex(names)
+    rnd = random.Random(7)
+    cases = [pair for name in names for pair in name_variants(name, rnd)]
+    cases += [("xyz", None), ("what", None), ("tax", None)]
+
+    lookup = {name.lower(): name for name in names}
+    legacy_hits = sum(lookup.get(q.strip().lower()) == expected for q, expected in cases)
+    resolved = [(q, index.resolve(q), expected) for q, expected in cases]
+    hits = sum(got == expected for _, got, expected in resolved)
+    print(f"🧪 {len(cases)} name queries over {len(names)} candidates: exact match {legacy_hits}, name index {hits}")
+    for q, got, expected in [r for r in resolved if r[1] != r[2]][:10]:
+        print(f"   ❌ {q!r}: {got} != {expected}")
+
+    per_query = time_per_call(index.match, [q for q, _ in cases], repeat=args.repeat)
+    print(f"⏱️ name index {per_query * 1e6:.1f} µs/query")
+
+    if args.json:
+        print(json.dumps({"queries": len(cases), "exact_hits": legacy_hits, "index_hits": hits, "index_us": round(per_query * 1e6, 1)}))
+    return 0
+
+
+# --- Batch packing ---
+def bench_packing(args):
+    from artefacts import get_candidate_index
+    from chatbot_embeddings import STANCE_SYSTEM_PROMPT, STANCE_MAX_TOKENS, STANCE_REPLY_TOKENS, stance_prompt, stance_block
+    from token_budget import get_token_counter, heuristic_tokens, plan_batches, packing_report
+
+    count = heuristic_tokens if args.heuristic else get_token_counter("gpt-4")
+    index = get_candidate_index()
+    totals = {"fixed_calls": 0, "packed_calls": 0, "candidates": 0}
+    rows = []
+    for topic in sorted(aliases):
+        candidates = [(name, " ".join(relevant)) for name, relevant in index.candidates_on_topic(topic)]
+        if not candidates:
+            continue
+        prompt = [{"role": "system", "content": STANCE_SYSTEM_PROMPT}, {"role": "user", "content": stance_prompt(topic, "")}]
+        batches, report = plan_batches(
+            candidates, stance_block, prompt, max_output_tokens=STANCE_MAX_TOKENS,
+            output_tokens_per_item=STANCE_REPLY_TOKENS, count=count,
+        )
+        fixed = [candidates[i:i + args.batch_size] for i in range(0, len(candidates), args.batch_size)]
+        fixed_report = packing_report(fixed, [[count(stance_block(c)) for c in batch] for batch in fixed], report["capacity"])
+        totals["fixed_calls"] += fixed_report["calls"]
+        totals["packed_calls"] += report["calls"]
+        totals["candidates"] += len(candidates)
+        rows.append({"topic": topic, "candidates": len(candidates), "fixed": fixed_report, "packed": report})
+        print(
+            f"📦 {topic:<20} {len(candidates):>4} candidates: fixed {fixed_report['calls']:>3} calls "
+            f"({fixed_report['token_fill']:.0%} full), packed {report['calls']:>3} calls ({report['token_fill']:.0%} full)"
+        )
+    print(f"🧮 {totals['candidates']} classifications: {totals['fixed_calls']} calls at batch_size={args.batch_size} -> {totals['packed_calls']} packed")
+
+    if args.json:
+        print(json.dumps({"totals": totals, "topics": rows}))
+    return 0
+
+
+# --- Replay ---
+def load_replay_queries(paths):
+    """Queries from NDJSON/JSONL or JSON-list logs (entries with a "query"), or the live query log."""
+    if not paths:
+        from query_log import iter_log_entries
+        entries = list(iter_log_entries())
+    else:
+        entries = []
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            try:
+                data = json.loads(text)
+                entries += data if isinstance(data, list) else [data]
+            except json.JSONDecodeError:
+                entries += [json.loads(line) for line in text.splitlines() if line.strip().startswith("{")]
+    return [e["query"] for e in entries if isinstance(e, dict) and isinstance(e.get("query"), str) and e["query"].strip()]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def latency_summary(latencies):
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1e3, 2),
+        "p95_ms": round(percentile(values, 95) * 1e3, 2),
+        "p99_ms": round(percentile(values, 99) * 1e3, 2),
+        "mean_ms": round(sum(values) / len(values) * 1e3, 2) if values else 0.0,
+    }
+
+
+class RouteRecorder:
+    """Stands in for app.query_logger: remembers the route type logged by the current thread."""
+
+    def __init__(self):
+        import threading
+        self.local = threading.local()
+
+    def log(self, entry):
+        self.local.route = entry.get("type", "unknown")
+
+    def take(self):
+        route = getattr(self.local, "route", None)
+        self.local.route = None
+        return route
+
+
+def replay_pass(app_module, queries, clients, recorder, state):
+    """(wall seconds, [(route, seconds, llm calls or None)]) for one pass over queries."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run(query):
+        client = app_module.app.test_client()
+        before = state.calls["chat"] + state.calls["embeddings"]
+        start = time.perf_counter()
+        response = client.post("/chat", json={"query": query})
+        elapsed = time.perf_counter() - start
+        calls = state.calls["chat"] + state.calls["embeddings"] - before
+        route = recorder.take() or (response.get_json(silent=True) or {}).get("type") or f"http_{response.status_code}"
+        # Call counts can only be pinned to a request when nothing else is in flight
+        return route, elapsed, calls if clients == 1 else None
+
+    start = time.perf_counter()
+    if clients == 1:
+        results = [run(query) for query in queries]
+    else:
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(run, queries))
+    return time.perf_counter() - start, results
+
+
+def replay_caches(args):
+    """How warm each level's caches are when its timed pass starts."""
+    if args.warmup:
+        return f"warm: fresh process and scratch stores, then {args.warmup} untimed pass(es)"
+    return "cold: fresh process and scratch stores"
+
+
+def replay_levels(args):
+    """Run each concurrency level in its own process, so no level inherits
+    another's LLM cache, cache store or in-process caches."""
+    forwarded = ["--latency", str(args.latency), "--jitter", str(args.jitter), "--seed", str(args.seed),
+                 "--warmup", str(args.warmup)]
+    if args.log:
+        forwarded += ["--log", *args.log]
+    if args.limit:
+        forwarded += ["--limit", str(args.limit)]
+    if args.no_llm_cache:
+        forwarded.append("--no-llm-cache")
+
+    report = None
+    for clients in args.clients:
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "replay", "--clients", str(clients), "--json", *forwarded],
+            capture_output=True, text=True,
+        )
+        lines = child.stdout.rstrip("\n").splitlines()
+        if child.returncode != 0 or not lines:
+            sys.stderr.write(child.stderr)
+            print(f"❌ Replay at {clients} clients failed (exit {child.returncode})")
+            return 1
+        print("\n".join(lines[:-1] if report is None else lines[1:-1]))
+        level_report = json.loads(lines[-1])
+        if report is None:
+            report = level_report
+        else:
+            report["levels"] += level_report["levels"]
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Wrote {args.out}")
+    if args.json:
+        print(json.dumps(report))
+    return 0
+
+
+def bench_replay(args):
+    import io
+    import tempfile
+    import contextlib
+    from fake_openai import start_fake_openai
+
+    if len(args.clients) > 1:
+        return replay_levels(args)
+
+    queries = load_replay_queries(args.log)
+    source = ", ".join(args.log) if args.log else "query log"
+    if not queries:
+        queries = list(SUGGESTED_PROMPTS)
+        source = "suggested prompts"
+    if args.limit:
+        queries = queries[:args.limit]
+
+    server, state, base_url = start_fake_openai(latency=args.latency, jitter=args.jitter, seed=args.seed)
+    # Settings are read at import, so point everything at the fake backend and
+    # throwaway stores before the app is imported
+    scratch = tempfile.mkdtemp(prefix="ballotbot-replay-")
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "fake",
+        "LLM_CACHE_PATH": os.path.join(scratch, "llm_cache.sqlite3"),
+        "CACHE_STORE_PATH": os.path.join(scratch, "cache_store.sqlite3"),
+        "JOBS_PATH": os.path.join(scratch, "jobs.sqlite3"),
+    })
+    if args.no_llm_cache:
+        os.environ["LLM_CACHE_DISABLED"] = "1"
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+        recorder = RouteRecorder()
+        app_module.query_logger = recorder
+        for _ in range(args.warmup):
+            replay_pass(app_module, queries, 1, recorder, state)
+
+    print(
+        f"🔁 Replaying {len(queries)} queries from {source} against a fake backend ({args.latency * 1e3:.0f} ms/call); "
+        f"caches per level {replay_caches(args)}"
+    )
+    levels = []
+    for clients in args.clients:
+        calls_before = state.calls["chat"] + state.calls["embeddings"]
+        with contextlib.redirect_stdout(io.StringIO()):
+            wall, results = replay_pass(app_module, queries, clients, recorder, state)
+        calls = state.calls["chat"] + state.calls["embeddings"] - calls_before
+
+        by_route = {}
+        for route, elapsed, route_calls in results:
+            by_route.setdefault(route, {"latencies": [], "calls": []})
+            by_route[route]["latencies"].append(elapsed)
+            if route_calls is not None:
+                by_route[route]["calls"].append(route_calls)
+        routes = {}
+        for route, data in sorted(by_route.items(), key=lambda item: -len(item[1]["latencies"])):
+            routes[route] = latency_summary(data["latencies"])
+            if data["calls"]:
+                routes[route]["llm_calls_per_request"] = round(sum(data["calls"]) / len(data["calls"]), 2)
+
+        level = {
+            "clients": clients,
+            "requests": len(results),
+            "wall_s": round(wall, 3),
+            "throughput_rps": round(len(results) / wall, 2) if wall else 0.0,
+            "llm_calls": calls,
+            "llm_calls_per_request": round(calls / len(results), 2) if results else 0.0,
+            "overall": latency_summary([elapsed for _, elapsed, _ in results]),
+            "routes": routes,
+        }
+        levels.append(level)
+
+        print(
+            f"👥 {clients:>3} clients: {level['throughput_rps']:>7.1f} req/s, p50 {level['overall']['p50_ms']:.1f} ms, "
+            f"p95 {level['overall']['p95_ms']:.1f} ms, p99 {level['overall']['p99_ms']:.1f} ms, "
+            f"{level['llm_calls_per_request']:.2f} LLM calls/request"
+        )
+        for route, summary in routes.items():
+            calls_note = f", {summary['llm_calls_per_request']:.2f} calls" if "llm_calls_per_request" in summary else ""
+            print(
+                f"   {route:<28} {summary['count']:>5}  p50 {summary['p50_ms']:>8.1f}  p95 {summary['p95_ms']:>8.1f}  "
+                f"p99 {summary['p99_ms']:>8.1f} ms{calls_note}"
+            )
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "source": source,
+        "queries": len(queries),
+        "settings": {
+            "latency_s": args.latency, "jitter_s": args.jitter, "seed": args.seed,
+            "warmup": args.warmup, "llm_cache": not args.no_llm_cache,
+        },
+        "caches": replay_caches(args),
+        "levels": levels,
+    }
+    server.shutdown()
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Wrote {args.out}")
+    if args.json:
+        print(json.dumps(report))
+    return 0
+
+
+# --- Corpus scans ---
+def iterrows_keyword_rows(df, keywords):
+    """The row walk app.py used, reading the normalised text column."""
+    text_column = "text" if "text" in df.columns else "Text"
+    rows = []
+    for i, (_, row) in enumerate(df.iterrows()):
+        text = str(row.get(text_column, "")).lower()
+        if any(keyword in text for keyword in keywords):
+            rows.append(i)
+    return rows
+
+
+def bench_corpus(args):
+    import numpy as np
+    from artefacts import load_corpus
+    from corpus_store import CorpusStore
+
+    df = load_corpus()[0].reset_index(drop=True)
+    start = time.perf_counter()
+    store = CorpusStore.from_dataframe(df)
+    build = time.perf_counter() - start
+
+    keyword_sets = [[k.lower() for k in aliases[topic]] for topic in sorted(aliases)]
+    mismatches = sum(
+        iterrows_keyword_rows(df, keywords) != store.rows_with_any(keywords).tolist()
+        for keywords in keyword_sets
+    )
+    legacy_text_hits = sum(
+        any(any(k in str(row.get("Text", "")).lower() for k in keywords) for _, row in df.iterrows())
+        for keywords in keyword_sets[:3]
+    )
+    iterrows_s = time_per_call(lambda keywords: iterrows_keyword_rows(df, keywords), keyword_sets, repeat=args.repeat)
+    store_s = time_per_call(store.rows_with_any, keyword_sets, repeat=args.repeat)
+
+    names = [name for name in store.names if name][:50]
+    mask_s = time_per_call(lambda name: np.flatnonzero(df["name"].str.strip().str.lower() == name.lower()), names, repeat=args.repeat)
+    rows_for_s = time_per_call(store.rows_for, names, repeat=args.repeat)
+
+    frame_bytes = int(df.memory_usage(deep=True).sum())
+    # The candidate index used to keep its own copy of every paragraph next to the DataFrame
+    paragraph_bytes = sum(sys.getsizeof(p) for row in range(len(store)) for p in map(store.paragraph, store.paragraph_ids(row)))
+    print(f"🗃️ {len(store)} rows, {len(store.names)} candidates; store built in {build * 1e3:.1f} ms")
+    print(f"💾 DataFrame {frame_bytes / 1e6:.2f} MB vs store {store.nbytes / 1e6:.2f} MB (text plus a lower-cased copy)")
+    print(f"💾 kept per process: DataFrame + store + paragraph list {(frame_bytes + store.nbytes + paragraph_bytes) / 1e6:.2f} MB before, store only {store.nbytes / 1e6:.2f} MB now")
+    print(f"⏱️ keyword scan: iterrows {iterrows_s * 1e3:.2f} ms, store {store_s * 1e3:.3f} ms ({iterrows_s / store_s:.0f}x)")
+    print(f"⏱️ candidate rows: DataFrame mask {mask_s * 1e6:.1f} µs, store {rows_for_s * 1e6:.1f} µs")
+    print(f"🧪 {len(keyword_sets)} keyword sets, {mismatches} mismatches; old \"Text\" lookups matched {legacy_text_hits} rows")
+
+    if args.json:
+        print(json.dumps({
+            "rows": len(store), "frame_bytes": frame_bytes, "store_bytes": store.nbytes, "paragraph_bytes": paragraph_bytes,
+            "iterrows_ms": round(iterrows_s * 1e3, 3), "store_ms": round(store_s * 1e3, 4),
+            "mask_us": round(mask_s * 1e6, 1), "rows_for_us": round(rows_for_s * 1e6, 1),
+            "mismatches": mismatches,
+        }))
+    return 1 if mismatches else 0
+
+
+# --- Mention matrix ---
+def iterrows_mention_counts(df, keywords):
+    """{name: rows mentioning any keyword}, the way candidates_with_little_on_topic used to count."""
+    counts = {}
+    for _, row in df.iterrows():
+        name = str(row.get("name", "")).strip()
+        text = str(row.get("text", "")).lower()
+        if name and any(keyword in text for keyword in keywords):
+            counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def bench_mentions(args):
+    from artefacts import load_corpus
+    from corpus_store import CorpusStore
+    from mention_matrix import MentionMatrix
+
+    df = load_corpus()[0].reset_index(drop=True)
+    store = CorpusStore.from_dataframe(df)
+    start = time.perf_counter()
+    matrix = MentionMatrix.from_store(store, aliases)
+    build = time.perf_counter() - start
+
+    topics = sorted(aliases)
+    mismatches = 0
+    for topic in topics:
+        expected = iterrows_mention_counts(df, [k.lower() for k in aliases[topic]])
+        got = {name: count for name, count in matrix.mentions(topic).items() if count}
+        mismatches += expected != got
+
+    scan_s = time_per_call(lambda topic: iterrows_mention_counts(df, [k.lower() for k in aliases[topic]]), topics, repeat=args.repeat)
+    below_s = time_per_call(matrix.below, topics, repeat=args.repeat * 100)
+    ranked_s = time_per_call(lambda topic: matrix.ranked(topic, limit=10), topics, repeat=args.repeat * 100)
+    percentile_s = time_per_call(lambda topic: matrix.in_percentile(topic, 25), topics, repeat=args.repeat * 100)
+    coverage_s = time_per_call(lambda _: matrix.coverage(), [None], repeat=args.repeat * 10)
+
+    print(f"🗃️ {len(matrix.candidates)} candidates × {len(matrix.topics)} topics ({matrix.nbytes} bytes); built in {build * 1e3:.1f} ms")
+    print(f"⏱️ low-mention: iterrows scan {scan_s * 1e3:.2f} ms, matrix {below_s * 1e6:.1f} µs ({scan_s / below_s:.0f}x)")
+    print(f"⏱️ top-10 ranking {ranked_s * 1e6:.1f} µs, bottom-25% {percentile_s * 1e6:.1f} µs, coverage heatmap {coverage_s * 1e6:.1f} µs")
+    print(f"🧪 {len(topics)} topics, {mismatches} count mismatches against the row scan")
+
+    if args.json:
+        print(json.dumps({
+            "candidates": len(matrix.candidates), "topics": len(matrix.topics), "build_ms": round(build * 1e3, 2),
+            "scan_ms": round(scan_s * 1e3, 3), "below_us": round(below_s * 1e6, 2), "ranked_us": round(ranked_s * 1e6, 2),
+            "percentile_us": round(percentile_s * 1e6, 2), "coverage_us": round(coverage_s * 1e6, 2), "mismatches": mismatches,
+        }))
+    return 1 if mismatches else 0
+
+
+# --- Startup ---
+STARTUP_SNIPPET = """
+import json, resource, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+import artefacts
+start = time.perf_counter()
+artefacts.preload()
+first_use = time.perf_counter() - start
+print(json.dumps({
+    "import_s": round(imported, 4),
+    "first_use_s": round(first_use, 4),
+    "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    "load_times": artefacts.load_times,
+}))
+"""
+
+DERIVED_ARTEFACTS = ["corpus.pkl", "embeddings.npy", "embeddings.meta.json", "candidate_index.pkl"]
+
+
+def bench_startup(args):
+    results = {}
+    for mode, eager in (("lazy", "0"), ("eager", "1")):
+        runs = []
+        for _ in range(args.runs):
+            if args.cold:
+                for path in DERIVED_ARTEFACTS:
+                    if os.path.exists(path):
+                        os.remove(path)
+            env = dict(os.environ, BALLOTBOT_EAGER_LOAD=eager)
+            env.setdefault("OPENAI_API_KEY", "benchmark")
+            out = subprocess.run(
+                [sys.executable, "-c", STARTUP_SNIPPET], env=env,
+                capture_output=True, text=True, check=True,
+            ).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        best = min(runs, key=lambda r: r["import_s"])
+        results[mode] = best
+        print(f"⏱️ {mode:>5}: import {best['import_s']:.3f}s, first use {best['first_use_s']:.3f}s, max RSS {best['max_rss_mb']} MB")
+
+    if args.json:
+        print(json.dumps(results))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BallotBot microbenchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    topics_parser = sub.add_parser("topics", help="Topic detection regression + alias scaling")
+    topics_parser.add_argument("--sizes", type=int, nargs="+", default=[0, 500, 1000, 2000, 5000])
+    topics_parser.add_argument("--json", action="store_true")
+    topics_parser.set_defaults(func=bench_topics)
+
+    resolve_parser = sub.add_parser("resolve", help="Trigram topic resolver vs the difflib scan")
+    resolve_parser.add_argument("--sizes", type=int, nargs="+", default=[13, 100, 1000])
+    resolve_parser.add_argument("--repeat", type=int, default=3)
+    resolve_parser.add_argument("--json", action="store_true")
+    resolve_parser.set_defaults(func=bench_resolve)
+
+    routing_parser = sub.add_parser("routing", help="Intent router vs the legacy if-chain")
+    routing_parser.add_argument("--repeat", type=int, default=5)
+    routing_parser.add_argument("--json", action="store_true")
+    routing_parser.set_defaults(func=bench_routing)
+
+    names_parser = sub.add_parser("names", help="Fuzzy candidate-name resolution accuracy and speed")
+    names_parser.add_argument("--repeat", type=int, default=5)
+    names_parser.add_argument("--json", action="store_true")
+    names_parser.set_defaults(func=bench_names)
+
+    packing_parser = sub.add_parser("packing", help="Stance classification calls, fixed batches vs token-budget packing")
+    packing_parser.add_argument("--batch-size", type=int, default=5)
+    packing_parser.add_argument("--heuristic", action="store_true", help="Count with the local heuristic even if tiktoken is installed")
+    packing_parser.add_argument("--json", action="store_true")
+    packing_parser.set_defaults(func=bench_packing)
+
+    corpus_parser = sub.add_parser("corpus", help="Columnar corpus store vs DataFrame row walks")
+    corpus_parser.add_argument("--repeat", type=int, default=3)
+    corpus_parser.add_argument("--json", action="store_true")
+    corpus_parser.set_defaults(func=bench_corpus)
+
+    mentions_parser = sub.add_parser("mentions", help="Candidate × topic mention matrix vs per-query row scans")
+    mentions_parser.add_argument("--repeat", type=int, default=3)
+    mentions_parser.add_argument("--json", action="store_true")
+    mentions_parser.set_defaults(func=bench_mentions)
+
+    replay_parser = sub.add_parser("replay", help="Replay logged /chat queries in-process against a fake LLM backend")
+    replay_parser.add_argument("--log", nargs="+", help="NDJSON/JSONL or JSON-list logs with a \"query\" per entry (default: the query log)")
+    replay_parser.add_argument("--limit", type=int)
+    replay_parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16], help="Concurrency levels to run, each in its own process")
+    replay_parser.add_argument("--latency", type=float, default=0.2, help="Fake backend seconds per call")
+    replay_parser.add_argument("--jitter", type=float, default=0.05)
+    replay_parser.add_argument("--seed", type=int, default=0)
+    replay_parser.add_argument("--warmup", type=int, default=0, help="Untimed passes before each level, to measure warm caches")
+    replay_parser.add_argument("--no-llm-cache", action="store_true", help="Disable the completion cache")
+    replay_parser.add_argument("--out", help="Write the JSON report here")
+    replay_parser.add_argument("--json", action="store_true")
+    replay_parser.set_defaults(func=bench_replay)
+
+    startup_parser = sub.add_parser("startup", help="Import time and memory, lazy vs eager loading")
+    startup_parser.add_argument("--runs", type=int, default=3)
+    startup_parser.add_argument("--cold", action="store_true", help="Delete derived artefacts before each run")
+    startup_parser.add_argument("--json", action="store_true")
+    startup_parser.set_defaults(func=bench_startup)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
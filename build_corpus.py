@@ -0,0 +1,405 @@
+"""Offline build of every serving artefact from the candidate corpus.
+
+    python build_corpus.py --source candidates.csv
+
+Each candidate's content is hashed; per-stage results are stored in a build
+state database keyed by those hashes, so a rebuild only re-processes (and
+re-sends to the LLM) candidates whose material actually changed. Outputs
+are written atomically at the end of the run.
+"""
+import os
+import re
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import pandas as pd
+from topics import aliases
+from cache_store import SQLiteCacheStore
+from candidate_index import CandidateIndex, split_paragraphs
+from topic_matcher import get_topic_matcher
+from llm_pool import complete_chat, fan_out
+from stance_tables import STANCE_TABLES_PATH, index_stances
+from subtopics import SUBTOPICS_PATH, MIN_TOPIC_CHUNKS, build_subtopics
+
+STATE_PATH = "build_state.sqlite3"
+STAGES = ["chunks", "stances", "summaries", "embeddings", "subtopics"]
+EMBEDDING_BATCH = 100
+EMBEDDING_ROW_CHARS = 2000
+BUILD_MODEL = os.getenv("BUILD_MODEL", "gpt-4")
+
+
+def content_hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def candidate_slug_url(name):
+    slug = re.sub(r"[^a-z0-9]+", "-", name.strip().lower()).strip("-")
+    return f"https://election2025.gg/candidates/browse/{slug}/"
+
+
+def write_json(path, data):
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+# --- Ingest ---
+def load_candidates(source):
+    """Candidates as dicts with name, text, source_url and hash.
+
+    Accepts a CSV or pickled DataFrame (legacy "Candidate Name"/"Text"/"URL"
+    columns or name/text/source_url), a JSON list, JSONL, or a directory of
+    .txt/.md files named after the candidate.
+    """
+    if os.path.isdir(source):
+        rows = []
+        for path in sorted(glob.glob(os.path.join(source, "*.txt")) + glob.glob(os.path.join(source, "*.md"))):
+            name = os.path.splitext(os.path.basename(path))[0].replace("-", " ").replace("_", " ").title()
+            with open(path, "r", encoding="utf-8") as f:
+                rows.append({"name": name, "text": f.read()})
+    elif source.endswith(".pkl"):
+        rows = pd.read_pickle(source).to_dict("records")
+    elif source.endswith(".csv"):
+        rows = pd.read_csv(source).to_dict("records")
+    elif source.endswith(".jsonl"):
+        with open(source, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+
+    merged = {}
+    for row in rows:
+        name = str(row.get("name") or row.get("Candidate Name") or "").strip()
+        text = row.get("text") or row.get("Text") or ""
+        if not name or not isinstance(text, str):
+            continue
+        url = row.get("source_url") or row.get("URL") or candidate_slug_url(name)
+        entry = merged.setdefault(name.lower(), {"name": name, "texts": [], "source_url": url})
+        entry["texts"].append(text.strip())
+
+    candidates = []
+    for entry in merged.values():
+        text = "\n".join(entry["texts"])
+        candidate = {
+            "name": entry["name"],
+            "text": text,
+            "source_url": entry["source_url"],
+            "hash": content_hash(entry["name"], text, entry["source_url"]),
+        }
+        candidate["topics"] = topic_paragraphs(candidate)
+        candidates.append(candidate)
+    return candidates
+
+
+def topic_paragraphs(candidate):
+    """topic -> paragraphs of this candidate that mention it."""
+    matcher = get_topic_matcher(aliases)
+    by_topic = {}
+    for paragraph in split_paragraphs(candidate["text"]):
+        for topic in matcher.alias_topics(paragraph):
+            by_topic.setdefault(topic, []).append(paragraph)
+    return by_topic
+
+
+# --- Stage: topic chunks ---
+def extract_topic_chunk(name, topic, paragraphs):
+    prompt = f"""
+The following paragraphs are from the campaign material of {name}, a candidate in the Guernsey general election.
+
+Write a factual account of everything they say about '{topic}', referring to them as "the candidate". Keep specific policies, figures and commitments; use bullet points for lists of proposals. Do not add anything that is not in the text.
+
+{chr(10).join(paragraphs)}
+"""
+    response = complete_chat(
+        get_build_client(),
+        model=BUILD_MODEL,
+        messages=[
+            {"role": "system", "content": "You extract candidate positions on a topic from campaign material."},
+            {"role": "user", "content": prompt.strip()}
+        ],
+        temperature=0,
+    )
+    return response.choices[0].message.content.strip()
+
+
+def stage_chunks(candidates, state, raw=False):
+    store = SQLiteCacheStore("chunks", state)
+    jobs = []
+    for candidate in candidates:
+        for topic, paragraphs in candidate["topics"].items():
+            key = f"{candidate['hash']}:{topic}:{'raw' if raw else 'llm'}"
+            if key not in store:
+                jobs.append((key, candidate, topic, paragraphs))
+
+    def run(job):
+        key, candidate, topic, paragraphs = job
+        try:
+            text = "\n".join(paragraphs) if raw else extract_topic_chunk(candidate["name"], topic, paragraphs)
+            store[key] = text
+            return True
+        except Exception as e:
+            print(f"⚠️ Chunk failed for {candidate['name']} on {topic}: {e}")
+            return False
+
+    done = sum(fan_out(run, jobs))
+    print(f"🧩 chunks: {done}/{len(jobs)} (candidate, topic) pairs processed")
+
+    topic_chunks = {topic: [] for topic in aliases}
+    for candidate in candidates:
+        for topic in candidate["topics"]:
+            text = store.get(f"{candidate['hash']}:{topic}:{'raw' if raw else 'llm'}")
+            if text:
+                topic_chunks[topic].append({
+                    "name": candidate["name"],
+                    "text": text,
+                    "source_url": candidate["source_url"],
+                })
+    return {topic: chunks for topic, chunks in topic_chunks.items() if chunks}
+
+
+# --- Stage: stance tables ---
+def stage_stances(candidates, state, topics):
+    from chatbot_embeddings import classify_stances
+
+    store = SQLiteCacheStore("stances", state)
+    tables = {}
+    for topic in topics:
+        relevant = [c for c in candidates if topic in c["topics"]]
+        pending = [c for c in relevant if f"{c['hash']}:{topic}" not in store]
+        classified = {}
+        if pending:
+            hashes = {c["name"]: c["hash"] for c in pending}
+            frame = pd.DataFrame([{"name": c["name"], "text": c["text"]} for c in pending])
+            statements = [
+                (name, " ".join(paragraphs))
+                for name, paragraphs in CandidateIndex.from_dataframe(frame).candidates_on_topic(topic)
+            ]
+            # Each validated record is written to the store as it arrives
+            classified = classify_stances(topic, statements, store=store, key_for=lambda name, _: f"{hashes[name]}:{topic}")
+            missing = len(pending) - len(classified)
+            if missing:
+                print(f"⚠️ {topic}: no stance for {missing} candidates; they will be retried next build")
+        # Stored earlier plus valid this build; the missing ones are left out
+        done = len(relevant) - len(pending) + len(classified)
+        print(f"🧭 stances[{topic}]: {done} of {len(relevant)} candidates classified")
+
+        table = []
+        for candidate in relevant:
+            entry = store.get(f"{candidate['hash']}:{topic}")
+            if entry:
+                table.append({
+                    "name": candidate["name"],
+                    "stance": entry["stance"],
+                    "reason": entry["reason"],
+                    "url": candidate["source_url"],
+                })
+        tables[topic] = table
+    return tables
+
+
+# --- Stage: topic summaries ---
+def summarize_chunk_for_topic(name, topic, text):
+    prompt = f"""
+Summarise {name}'s position on '{topic}' in 2-3 sentences for a voter, referring to them by surname. Be factual and only use the text below.
+
+{text}
+"""
+    response = complete_chat(
+        get_build_client(),
+        model=BUILD_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a political assistant summarising candidate views."},
+            {"role": "user", "content": prompt.strip()}
+        ],
+        temperature=0,
+        max_tokens=250,
+    )
+    return response.choices[0].message.content.strip()
+
+
+def stage_summaries(topic_chunks, state):
+    store = SQLiteCacheStore("summaries", state)
+    jobs = []
+    for topic, chunks in topic_chunks.items():
+        for chunk in chunks:
+            key = content_hash(topic, chunk["name"], chunk["text"])
+            if key not in store:
+                jobs.append((key, topic, chunk))
+
+    def run(job):
+        key, topic, chunk = job
+        try:
+            store[key] = summarize_chunk_for_topic(chunk["name"], topic, chunk["text"])
+            return True
+        except Exception as e:
+            print(f"⚠️ Summary failed for {chunk['name']} on {topic}: {e}")
+            return False
+
+    done = sum(fan_out(run, jobs))
+    print(f"📝 summaries: {done}/{len(jobs)} chunks summarised")
+
+    responses = {}
+    for topic, chunks in topic_chunks.items():
+        entries = []
+        for chunk in chunks:
+            summary = store.get(content_hash(topic, chunk["name"], chunk["text"]))
+            if summary:
+                entries.append({"name": chunk["name"], "summary": summary, "source_url": chunk["source_url"]})
+        if entries:
+            responses[topic] = {"candidates": entries}
+    return responses
+
+
+# --- Stage: embeddings ---
+def embedding_rows(candidate):
+    """Split a candidate's text into paragraph blocks of a bounded size."""
+    rows, block = [], []
+    for paragraph in split_paragraphs(candidate["text"]):
+        if block and sum(len(p) for p in block) + len(paragraph) > EMBEDDING_ROW_CHARS:
+            rows.append("\n".join(block))
+            block = []
+        block.append(paragraph)
+    if block:
+        rows.append("\n".join(block))
+    return rows
+
+
+def embed_missing(store, texts_by_key):
+    """Embed every text whose key isn't in store yet; returns how many were sent."""
+    from vector_index import embed_texts
+
+    pending = [(key, text) for key, text in texts_by_key.items() if key not in store]
+    for i in range(0, len(pending), EMBEDDING_BATCH):
+        batch = pending[i:i + EMBEDDING_BATCH]
+        vectors = embed_texts(get_build_client(), [text for _, text in batch])
+        for (key, _), vector in zip(batch, vectors):
+            store[key] = vector.tolist()
+    return len(pending)
+
+
+def stage_embeddings(candidates, state):
+    from vector_index import EMBEDDING_MODEL
+
+    store = SQLiteCacheStore("embeddings", state)
+    rows = [
+        {"name": c["name"], "text": text, "source_url": c["source_url"], "key": content_hash(EMBEDDING_MODEL, text)}
+        for c in candidates for text in embedding_rows(c)
+    ]
+    sent = embed_missing(store, {row["key"]: row["text"] for row in rows})
+    print(f"🧮 embeddings: {sent} of {len(rows)} rows embedded")
+
+    for row in rows:
+        row["embedding"] = store.get(row.pop("key"))
+    return pd.DataFrame(rows)
+
+
+# --- Stage: sub-topics ---
+def stage_subtopics(topic_chunks, state, min_chunks=MIN_TOPIC_CHUNKS):
+    """Cluster each large topic's chunks; chunk embeddings share the embeddings store."""
+    from vector_index import EMBEDDING_MODEL
+
+    store = SQLiteCacheStore("embeddings", state)
+    large = {topic: chunks for topic, chunks in topic_chunks.items() if len(chunks) > min_chunks}
+    keys = {topic: [content_hash(EMBEDDING_MODEL, chunk["text"]) for chunk in chunks] for topic, chunks in large.items()}
+    texts_by_key = {key: chunk["text"] for topic, chunks in large.items() for key, chunk in zip(keys[topic], chunks)}
+    sent = embed_missing(store, texts_by_key)
+    print(f"🧮 sub-topics: {sent} of {len(texts_by_key)} chunks embedded")
+
+    topic_vectors = {topic: [store.get(key) for key in topic_keys] for topic, topic_keys in keys.items()}
+    return build_subtopics(large, topic_vectors, min_chunks)
+
+
+def write_embeddings(frame):
+    import artefacts
+
+    frame.to_pickle(f"{artefacts.EMBEDDINGS_PKL}.tmp")
+    os.replace(f"{artefacts.EMBEDDINGS_PKL}.tmp", artefacts.EMBEDDINGS_PKL)
+    slim, matrix = artefacts.split_embeddings(frame)
+    artefacts.save_corpus(slim, matrix, artefacts._source_signature())
+
+
+def get_build_client():
+    from artefacts import get_client
+    return get_client()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build BallotBot serving artefacts from the candidate corpus")
+    parser.add_argument("--source", required=True, help="CSV, JSON, JSONL or directory of candidate texts")
+    parser.add_argument("--out-dir", default=".", help="Directory the app serves from")
+    parser.add_argument("--state", default=STATE_PATH, help="Build state database (relative to --out-dir)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--stance-topics", nargs="+", help="Topics to classify (default: every topic in topics.aliases)")
+    parser.add_argument("--raw-chunks", action="store_true", help="Use matching paragraphs as chunks without the LLM")
+    args = parser.parse_args(argv)
+
+    source = os.path.abspath(args.source)
+    os.chdir(args.out_dir)
+    started = time.perf_counter()
+
+    candidates = load_candidates(source)
+    manifest_store = SQLiteCacheStore("manifest", args.state)
+    previous = manifest_store.get("candidates", {})
+    changed = [c["name"] for c in candidates if previous.get(c["name"]) != c["hash"]]
+    removed = sorted(set(previous) - {c["name"] for c in candidates})
+    print(f"📚 {len(candidates)} candidates: {len(changed)} new or changed, {len(removed)} removed")
+
+    outputs = {}
+    topic_chunks = None
+    if {"chunks", "summaries", "subtopics"} & set(args.stages):
+        topic_chunks = stage_chunks(candidates, args.state, raw=args.raw_chunks)
+    if "chunks" in args.stages:
+        write_json("topic_chunks.json", topic_chunks)
+        outputs["topic_chunks.json"] = content_hash(json.dumps(topic_chunks, sort_keys=True))
+
+    if "stances" in args.stages:
+        tables = {
+            topic: index_stances(table)
+            for topic, table in stage_stances(candidates, args.state, args.stance_topics or list(aliases)).items()
+        }
+        write_json(STANCE_TABLES_PATH, tables)
+        outputs[STANCE_TABLES_PATH] = content_hash(json.dumps(tables, sort_keys=True))
+
+    if "summaries" in args.stages:
+        responses = stage_summaries(topic_chunks, args.state)
+        write_json("topic_response_cache.json", responses)
+        outputs["topic_response_cache.json"] = content_hash(json.dumps(responses, sort_keys=True))
+        # Publish to the shared store so running workers pick the new versions up
+        live_cache = SQLiteCacheStore("topic_response")
+        for topic, response in responses.items():
+            live_cache[topic] = response
+
+    if "embeddings" in args.stages:
+        write_embeddings(stage_embeddings(candidates, args.state))
+        outputs["embeddings.pkl"] = os.path.getsize("embeddings.pkl")
+
+    if "subtopics" in args.stages:
+        subtopics = stage_subtopics(topic_chunks, args.state)
+        write_json(SUBTOPICS_PATH, subtopics)
+        outputs[SUBTOPICS_PATH] = content_hash(json.dumps(subtopics, sort_keys=True))
+
+    manifest_store["candidates"] = {c["name"]: c["hash"] for c in candidates}
+    manifest = {
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "source": source,
+        "candidates": len(candidates),
+        "changed": changed,
+        "removed": removed,
+        "stages": args.stages,
+        "outputs": outputs,
+    }
+    write_json("build_manifest.json", manifest)
+    print(f"✅ Build finished in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from metrics import cache_lookups, record_stage
+
+STORE_PATH = os.getenv("CACHE_STORE_PATH", "cache_store.sqlite3")
+READ_THROUGH_TTL = float(os.getenv("CACHE_READ_THROUGH_TTL", "30"))
+READ_THROUGH_ITEMS = int(os.getenv("CACHE_READ_THROUGH_ITEMS", "256"))
+
+
+class CacheStore:
+    """Key/value store interface for shared caches.
+
+    Every entry carries a version that is bumped on each write. Passing
+    expected_version to set() makes the write conditional, so two workers
+    can't silently overwrite each other.
+    """
+
+    def get_entry(self, key):
+        """Return (value, version), or None if the key is missing."""
+        raise NotImplementedError
+
+    def set(self, key, value, expected_version=None):
+        """Upsert one key; returns the new version, or None on a version conflict."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def keys(self):
+        raise NotImplementedError
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def __contains__(self, key):
+        return self.get_entry(key) is not None
+
+    def __getitem__(self, key):
+        entry = self.get_entry(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry[0]
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def seed(self, items):
+        """Insert entries only where the key doesn't exist yet."""
+        for key, value in items:
+            if key not in self:
+                self.set(key, value, expected_version=0)
+
+
+class MemoryCacheStore(CacheStore):
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get_entry(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def set(self, key, value, expected_version=None):
+        with self.lock:
+            version = self.entries.get(key, (None, 0))[1]
+            if expected_version is not None and version != expected_version:
+                return None
+            self.entries[key] = (value, version + 1)
+            return version + 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def keys(self):
+        with self.lock:
+            return list(self.entries)
+
+
+class SQLiteCacheStore(CacheStore):
+    """CacheStore on a shared SQLite file in WAL mode.
+
+    WAL lets any number of worker processes read while one writes; each
+    set() is a single-row upsert rather than a rewrite of the whole cache.
+    """
+
+    def __init__(self, namespace, path=STORE_PATH):
+        self.namespace = namespace
+        self.path = path
+        self.local = threading.local()
+
+    def _db(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "version INTEGER NOT NULL, updated REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self.local.conn = conn
+        return conn
+
+    def get_entry(self, key):
+        row = self._db().execute(
+            "SELECT value, version FROM entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expected_version=None):
+        conn = self._db()
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with conn:
+            if expected_version is None:
+                row = conn.execute(
+                    "INSERT INTO entries (namespace, key, value, version, updated) VALUES (?, ?, ?, 1, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET "
+                    "value = excluded.value, version = entries.version + 1, updated = excluded.updated "
+                    "RETURNING version",
+                    (self.namespace, key, data, now),
+                ).fetchone()
+                return row[0]
+            if expected_version == 0:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO entries (namespace, key, value, version, updated) VALUES (?, ?, ?, 1, ?)",
+                    (self.namespace, key, data, now),
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE entries SET value = ?, version = version + 1, updated = ? "
+                    "WHERE namespace = ? AND key = ? AND version = ?",
+                    (data, now, self.namespace, key, expected_version),
+                )
+            return expected_version + 1 if cursor.rowcount else None
+
+    def delete(self, key):
+        conn = self._db()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def keys(self):
+        rows = self._db().execute("SELECT key FROM entries WHERE namespace = ?", (self.namespace,)).fetchall()
+        return [row[0] for row in rows]
+
+
+_MISSING = object()
+
+class ReadThroughCache:
+    """In-process LRU in front of a CacheStore.
+
+    Hot keys (including misses) are served from memory for `ttl` seconds, so
+    repeated lookups don't touch disk; after that they are re-read, which is
+    how writes from other workers become visible.
+    """
+
+    def __init__(self, store, ttl=READ_THROUGH_TTL, max_items=READ_THROUGH_ITEMS):
+        self.store = store
+        self.ttl = ttl
+        self.max_items = max_items
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _lookup(self, key):
+        start = time.perf_counter()
+        now = time.monotonic()
+        with self.lock:
+            cached = self.memory.get(key)
+            fresh = cached is not None and now - cached[1] < self.ttl
+            if fresh:
+                self.memory.move_to_end(key)
+        if fresh:
+            self._count(start, "memory_miss" if cached[0] is _MISSING else "memory_hit")
+            return cached[0]
+
+        entry = self.store.get_entry(key)
+        value = _MISSING if entry is None else entry[0]
+        self._remember(key, value)
+        self._count(start, "miss" if entry is None else "hit")
+        return value
+
+    def _count(self, start, result):
+        cache_lookups.inc(namespace=getattr(self.store, "namespace", "memory"), result=result)
+        record_stage("cache", time.perf_counter() - start)
+
+    def _remember(self, key, value):
+        with self.lock:
+            self.memory[key] = (value, time.monotonic())
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_items:
+                self.memory.popitem(last=False)
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _MISSING
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def set(self, key, value, expected_version=None):
+        version = self.store.set(key, value, expected_version)
+        if version is not None:
+            self._remember(key, value)
+        else:
+            self.invalidate(key)
+        return version
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.memory.clear()
+            else:
+                self.memory.pop(key, None)
+
+    def keys(self):
+        return self.store.keys()
+
+
+def open_cache(namespace, seed=None):
+    """Read-through cache over the shared SQLite store, seeded once from `seed` items."""
+    store = SQLiteCacheStore(namespace)
+    if seed:
+        store.seed(seed)
+    return ReadThroughCache(store)
@@ -0,0 +1,165 @@
+import os
+import re
+import sys
+import pickle
+from collections import defaultdict
+from topics import aliases
+from topic_matcher import get_topic_matcher
+from corpus_store import CorpusStore
+from name_index import NameIndex, load_candidate_aliases
+
+INDEX_PATH = os.getenv("CANDIDATE_INDEX_PATH", "candidate_index.pkl")
+INDEX_VERSION = 2
+
+
+def split_paragraphs(text):
+    return [p.strip() for p in text.split("\n") if p.strip()]
+
+
+class CandidateIndex:
+    """Candidate name -> rows, and (candidate, topic) -> paragraph ids.
+
+    Paragraphs are tagged with their topics once, so per-candidate lookups are
+    dictionary hits rather than DataFrame scans. Paragraph ids are the
+    CorpusStore's, so the text itself is read from the store's buffer.
+    """
+
+    def __init__(self, data, store):
+        self.store = store
+        self.fingerprint = data["fingerprint"]
+        self.names = data["names"]
+        self.rows = data["rows"]
+        self.has_text = data["has_text"]
+        self.candidate_paragraphs = data["candidate_paragraphs"]
+        self.topic_paragraphs = data["topic_paragraphs"]
+        self.lookup = {name.lower(): i for i, name in enumerate(self.names)}
+        self.name_index = NameIndex(self.names, load_candidate_aliases())
+
+    @classmethod
+    def build(cls, store, topic_aliases=aliases):
+        matcher = get_topic_matcher(topic_aliases)
+
+        candidate_ids = {}
+        names = []
+        rows = []
+        has_text = []
+        candidate_paragraphs = []
+        topic_paragraphs = defaultdict(list)
+
+        for row in range(len(store)):
+            name = store.name(row)
+            if name.lower() not in candidate_ids:
+                candidate_ids[name.lower()] = len(rows)
+                names.append(name)
+                rows.append([])
+                has_text.append(False)
+                candidate_paragraphs.append([])
+            cid = candidate_ids[name.lower()]
+            rows[cid].append(row)
+            if not store.has_text[row]:
+                continue
+            has_text[cid] = True
+            for pid in store.paragraph_ids(row):
+                candidate_paragraphs[cid].append(pid)
+                for topic in matcher.alias_topics(store.paragraph(pid)):
+                    topic_paragraphs[(cid, topic)].append(pid)
+
+        return cls({
+            "fingerprint": store.fingerprint(),
+            "names": names,
+            "rows": rows,
+            "has_text": has_text,
+            "candidate_paragraphs": candidate_paragraphs,
+            "topic_paragraphs": dict(topic_paragraphs),
+        }, store)
+
+    @classmethod
+    def from_dataframe(cls, df, topic_aliases=aliases):
+        return cls.build(CorpusStore.from_dataframe(df), topic_aliases)
+
+    def save(self, path=INDEX_PATH):
+        data = {
+            "version": INDEX_VERSION,
+            "fingerprint": self.fingerprint,
+            "names": self.names,
+            "rows": self.rows,
+            "has_text": self.has_text,
+            "candidate_paragraphs": self.candidate_paragraphs,
+            "topic_paragraphs": self.topic_paragraphs,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, store, path=INDEX_PATH):
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"unsupported candidate index version {data.get('version')}")
+        return cls(data, store)
+
+    def candidate_id(self, name):
+        """Exact (case-insensitive) name first, then surname, alias and typo matching."""
+        cid = self.lookup.get(name.strip().lower())
+        if cid is None:
+            resolved = self.name_index.resolve(name)
+            if resolved is not None:
+                cid = self.lookup[resolved.lower()]
+        return cid
+
+    def resolve_name(self, name):
+        """Canonical display name for name, or None if it can't be resolved."""
+        cid = self.candidate_id(name)
+        return None if cid is None else self.names[cid]
+
+    def relevant_paragraphs(self, cid, topic):
+        """Paragraphs of one candidate that mention the topic."""
+        paragraph = self.store.paragraph
+        if topic in aliases:
+            return [paragraph(pid) for pid in self.topic_paragraphs.get((cid, topic), [])]
+        # Topics outside the alias table: scan this candidate's paragraphs only
+        pattern = re.compile(rf"\b{re.escape(topic)}\b", re.IGNORECASE)
+        return [text for text in map(paragraph, self.candidate_paragraphs[cid]) if pattern.search(text)]
+
+    def candidates_on_topic(self, topic):
+        """(name, relevant paragraphs) for every candidate mentioning the topic."""
+        results = []
+        for cid, name in enumerate(self.names):
+            relevant = self.relevant_paragraphs(cid, topic)
+            if relevant:
+                results.append((name, relevant))
+        return results
+
+
+def load_candidate_index(store, path=INDEX_PATH):
+    """Load the on-disk index if it matches the store, otherwise rebuild and save it."""
+    try:
+        index = CandidateIndex.load(store, path)
+        if index.fingerprint == store.fingerprint():
+            return index
+        print("♻️ Candidate index is stale, rebuilding.")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️ Failed to load {path}: {e}")
+
+    index = CandidateIndex.build(store)
+    try:
+        index.save(path)
+    except OSError as e:
+        print(f"⚠️ Could not save candidate index: {e}")
+    return index
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    source = sys.argv[1] if len(sys.argv) > 1 else "embeddings.pkl"
+    frame = pd.read_pickle(source)
+    if "Candidate Name" in frame.columns:
+        frame = frame.rename(columns={"Candidate Name": "name", "Text": "text", "URL": "source_url"})
+    built = CandidateIndex.from_dataframe(frame)
+    built.save()
+    print(f"✅ Indexed {len(built.names)} candidates, {len(built.store.paragraph_starts)} paragraphs -> {INDEX_PATH}")
@@ -1,63 +1,63 @@
-import re
 import os
-import json
-import pickle
-import difflib
-import nltk
-import pandas as pd
-from nltk.tokenize import sent_tokenize
+import hashlib
+import numpy as np
 from topics import aliases
-from openai import OpenAI
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from vector_index import EMBEDDING_MODEL, embed_texts
+from topic_matcher import get_topic_matcher
+from topic_resolver import get_topic_resolver
+from llm_pool import complete_chat, fan_out
+from map_reduce import summarize_chunks, reduce_partials
+from token_budget import plan_batches, truncate_to_tokens
+from structured import items_tool, complete_items
+from name_index import normalize_name
+from candidate_index import CandidateIndex
+from artefacts import (
+    EAGER_LOAD,
+    preload,
+    get_client,
+    get_corpus_store,
+    get_vector_index,
+    get_candidate_index,
+    get_topic_chunks,
+    get_topic_summary_cache,
+    get_stance_cache,
+    get_stance_records,
+    get_query_embeddings,
+)
 
 # --- Utility to ensure NLTK punkt tokenizer is available ---
 def ensure_nltk():
+    # nltk pulls in scipy, so only import it when actually needed
+    import nltk
     try:
         nltk.data.find('tokenizers/punkt')
     except LookupError:
         nltk.download('punkt')
 
-# --- Load embeddings data ---
-
-def load_embeddings():
-    try:
-        with open("embeddings.pkl", "rb") as f:
-            df = pickle.load(f)
-        print("✅ Loaded embeddings from pickle file.")
-    except Exception as e:
-        print(f"⚠️ Failed to load embeddings.pkl: {e}")
-        print("📄 Attempting to load from embeddings.csv instead...")
-        df = pd.read_csv("embeddings.csv")
-
-    # Normalize any legacy columns
-    if "Candidate Name" in df.columns:
-        df.rename(columns={
-            "Candidate Name": "name",
-            "Text": "text",
-            "URL": "source_url"
-        }, inplace=True)
-
-    return df
-
-df = load_embeddings()
-
-# --- Load topic chunks ---
-with open("topic_chunks.json", "r") as f:
-    topic_chunks = json.load(f)
-
-# --- Load caches ---
-try:
-    with open("topic_summary_cache.pkl", "rb") as f:
-        topic_summary_cache = pickle.load(f)
-except FileNotFoundError:
-    topic_summary_cache = {}
-
-try:
-    with open("stance_cache.pkl", "rb") as f:
-        stance_cache = pickle.load(f)
-except FileNotFoundError:
-    stance_cache = {}
+# --- Data and clients are loaded lazily, once per process (see artefacts.py) ---
+_LAZY_ATTRIBUTES = {
+    "client": get_client,
+    "store": get_corpus_store,
+    "vector_index": get_vector_index,
+    "candidate_index": get_candidate_index,
+    "topic_chunks": get_topic_chunks,
+    "topic_summary_cache": get_topic_summary_cache,
+    "stance_cache": get_stance_cache,
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def candidate_index_for(frame=None):
+    """The shared index over the loaded corpus, or a throwaway one over frame."""
+    if frame is None:
+        return get_candidate_index()
+    return CandidateIndex.from_dataframe(frame)
+
+if EAGER_LOAD:
+    preload()
 
 # --- Constants ---
 MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
@@ -69,20 +69,21 @@ def normalize_topic(topic):
 
 
 def detect_topic_from_query(query, aliases):
-    query_lower = query.lower().strip()
-
-    # First check aliases
-    for topic, alias_list in aliases.items():
-        for alias in alias_list:
-            if re.search(rf"\b{re.escape(alias.lower())}\b", query_lower):
-                return topic
-
-    # Then check topic names directly
-    for topic in aliases:
-        if topic.lower() in query_lower:
-            return topic
-
-    return None
+    return get_topic_matcher(aliases).detect(query)
+
+def match_topics_from_query(query, aliases):
+    return get_topic_matcher(aliases).match(query)
+
+def embed_query(query):
+    # Shared across workers, so a repeated (or warmed) query skips the API call
+    cache = get_query_embeddings()
+    key = f"{EMBEDDING_MODEL}:{query}"
+    cached = cache.get(key)
+    if cached is not None:
+        return np.asarray(cached, dtype=np.float32)
+    vector = embed_texts(get_client(), [query])[0]
+    cache[key] = vector.tolist()
+    return vector
 
 def get_model():
     try:
@@ -91,182 +92,226 @@ def get_model():
     except:
         return "gpt-3.5-turbo"
 
-def classify_policy_stance(topic, df, position_keywords, batch_size=5):
-    results = []
-    candidates = []
-    for _, row in df.iterrows():
-        name = row.get("name", "")
-        text = row.get("text", "")
-        if not isinstance(text, str):
-            continue
-        keywords = aliases.get(topic.lower(), [topic.lower()])
-        paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
-        relevant = [p for p in paragraphs if any(re.search(rf"\b{re.escape(kw)}\b", p, re.IGNORECASE) for kw in keywords)]
-        if not relevant:
-            continue
-        combined = " ".join(relevant)
-        candidates.append((name, combined))
-
-    if not candidates:
-        return "No relevant candidate positions found on this topic."
-
-    for i in range(0, len(candidates), batch_size):
-        batch = candidates[i:i + batch_size]
-        batch_text = "\n\n".join(f"{name}:\n{statement}" for name, statement in batch)
-        prompt = f"""
+STANCE_SYSTEM_PROMPT = "You analyze political candidate positions and determine their stance on a given topic."
+STANCE_MAX_TOKENS = 800
+# Rough length of one {name, stance, reason} record in the reply
+STANCE_REPLY_TOKENS = int(os.getenv("STANCE_REPLY_TOKENS", "60"))
+# How many times a candidate missing from a batch reply is re-asked on its own
+STANCE_RETRIES = int(os.getenv("STANCE_RETRIES", "2"))
+STANCE_TOOL = items_tool(
+    "record_stances",
+    "Record each candidate's stance on the topic.",
+    {
+        "type": "object",
+        "properties": {
+            "name": {"type": "string", "description": "The candidate's name exactly as given"},
+            "stance": {"type": "string", "enum": ["SUPPORT", "OPPOSE", "NO CLEAR STANCE"]},
+            "reason": {"type": "string", "description": "A brief explanation"},
+        },
+        "required": ["name", "stance", "reason"],
+        "additionalProperties": False,
+    },
+)
+
+def stance_prompt(topic, batch_text):
+    return f"""
 Below are statements from political candidates about '{topic}'.
 
-For each candidate, determine if they SUPPORT, OPPOSE, or express NO CLEAR STANCE on the topic. For each, reply in this format:
-
-Candidate Name: [Stance] - [Brief explanation]
+For each candidate, determine if they SUPPORT, OPPOSE, or express NO CLEAR STANCE on the topic, with a brief explanation. Record one item per candidate with record_stances, using the name exactly as written above their statement.
 
 Statements:
 {batch_text}
-"""
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You analyze political candidate positions and determine their stance on a given topic."},
-                    {"role": "user", "content": prompt.strip()}
-                ],
-                temperature=0,
-                max_tokens=800,
-            )
-            result_text = response.choices[0].message.content.strip()
-            results.append(result_text)
-        except Exception as e:
-            results.append(f"❌ Error processing batch: {str(e)}")
-
-    return "\n\n".join(results)
-
-def summarize_topic_by_candidate(topic, chunks, batch_size=5):
+""".strip()
+
+def stance_block(candidate):
+    name, statement = candidate
+    return f"{name}:\n{statement}\n\n"
+
+def shrink_statement(candidate, max_tokens, count):
+    name, statement = candidate
+    return name, truncate_to_tokens(statement, max_tokens - count(f"{name}:\n\n\n"), count)
+
+def stance_key(topic, name, statement):
+    return hashlib.sha256(f"{topic}\0{name}\0{statement}".encode("utf-8")).hexdigest()
+
+def request_stances(topic, batch, retry=False):
+    """({name: {stance, reason}}, errors) for one batch of (name, statement) pairs.
+
+    Records are matched back to the batch by normalised name; anything
+    malformed, unknown or missing is left out for the caller to retry.
+    """
+    batch_text = "".join(stance_block(candidate) for candidate in batch).strip()
+    expected = {normalize_name(name): name for name, _ in batch}
+    try:
+        records, errors = complete_items(
+            get_client(),
+            STANCE_TOOL,
+            [
+                {"role": "system", "content": STANCE_SYSTEM_PROMPT},
+                {"role": "user", "content": stance_prompt(topic, batch_text)}
+            ],
+            model="gpt-4",
+            temperature=0,
+            max_tokens=STANCE_MAX_TOKENS,
+            # Only a reply covering the whole batch is worth caching
+            accept=lambda records: {normalize_name(record["name"]) for record in records} >= set(expected),
+            # A reply that needed a retry shouldn't be replayed from the cache
+            **({"cache": False} if retry else {}),
+        )
+    except Exception as e:
+        return {}, [str(e)]
+
+    found = {}
+    for record in records:
+        name = expected.get(normalize_name(record["name"]))
+        if name is None:
+            errors.append(f"unknown candidate {record['name']!r}")
+        elif name not in found:
+            stance = "NEUTRAL" if record["stance"] == "NO CLEAR STANCE" else record["stance"]
+            found[name] = {"stance": stance, "reason": record["reason"]}
+    return found, errors
+
+def classify_stances(topic, candidates, store=None, key_for=None, batch_size=None):
+    """{name: {stance, reason}} for (name, statement) pairs.
+
+    Statements already in store are reused. The rest are packed into calls
+    by token budget, and each validated record goes into store as it
+    arrives. Candidates a batch reply missed or mangled are re-asked one at
+    a time, up to STANCE_RETRIES times, rather than re-running the batch.
+    """
+    key_for = key_for or (lambda name, statement: stance_key(topic, name, statement))
+    results, pending = {}, []
+    for name, statement in candidates:
+        cached = store.get(key_for(name, statement)) if store is not None else None
+        if cached:
+            results[name] = cached
+        else:
+            pending.append((name, statement))
+    if not pending:
+        return results
+
+    statements = dict(pending)
+
+    def run(batch, retry=False):
+        found, errors = request_stances(topic, batch, retry=retry)
+        for name, record in found.items():
+            results[name] = record
+            if store is not None:
+                store[key_for(name, statements[name])] = record
+        return [candidate for candidate in batch if candidate[0] not in found], errors
+
+    batches, report = plan_batches(
+        pending,
+        stance_block,
+        [{"role": "system", "content": STANCE_SYSTEM_PROMPT}, {"role": "user", "content": stance_prompt(topic, "")}],
+        model="gpt-4",
+        max_output_tokens=STANCE_MAX_TOKENS,
+        output_tokens_per_item=STANCE_REPLY_TOKENS,
+        max_items=batch_size,
+        shrink=shrink_statement,
+    )
+    print(
+        f"📦 stances[{topic}]: {report['items']} candidates in {report['calls']} calls "
+        f"({report['token_fill']:.0%} of input budget, {report.get('slot_fill', 0):.0%} of reply slots"
+        + (f", {report['oversized']} truncated" if report["oversized"] else "") + ")"
+    )
+
+    outcomes = fan_out(run, batches)
+    for attempt in range(STANCE_RETRIES + 1):
+        leftovers = [candidate for missing, _ in outcomes for candidate in missing]
+        errors = [error for _, batch_errors in outcomes for error in batch_errors]
+        if errors:
+            print(f"⚠️ stances[{topic}]: {len(errors)} malformed or failed items, e.g. {errors[0]}")
+        if not leftovers or attempt == STANCE_RETRIES:
+            break
+        print(f"🔁 stances[{topic}]: retrying {len(leftovers)} candidates individually")
+        outcomes = fan_out(lambda candidate: run([candidate], retry=True), leftovers)
+
+    if leftovers:
+        print(f"⚠️ stances[{topic}]: no valid stance for {len(leftovers)} candidates")
+    return results
+
+def classify_policy_stance(topic, df=None, position_keywords=None, batch_size=None):
+    """[{name, stance, reason}] for every candidate on topic, in corpus order.
+    batch_size, if given, caps candidates per call."""
+    index = candidate_index_for(df)
+    candidates = [(name, " ".join(relevant)) for name, relevant in index.candidates_on_topic(topic.lower())]
+    stances = classify_stances(topic, candidates, store=get_stance_records(), batch_size=batch_size)
+    return [{"name": name, **stances[name]} for name, _ in candidates if name in stances]
+
+def summarize_topic_by_candidate(topic, chunks):
+    """[{name, summary}] per candidate, built from cached map partials."""
     if not chunks:
         return [{"message": f"No candidate statements found on {topic}."}]
 
     topic = normalize_topic(topic)
-
-    batch_summaries = []
-    for i in range(0, len(chunks), batch_size):
-        batch = chunks[i:i + batch_size]
-        combined_text = "\n\n".join([f"{chunk['name']}: {chunk['text']}" for chunk in batch if chunk.get("text")])
-        prompt = f"""
-Please summarize each of the following political candidate's positions on '{topic}' individually and clearly:
-
-{combined_text}
-"""
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You summarize candidate views by individual."},
-                    {"role": "user", "content": prompt.strip()}
-                ],
-                temperature=0.5,
-            )
-            batch_summary_text = response.choices[0].message.content.strip()
-            for summary in batch_summary_text.split("\n\n"):
-                if ":" in summary:
-                    name, text = summary.split(":", 1)
-                    batch_summaries.append({"name": name.strip(), "summary": text.strip()})
-        except Exception as e:
-            batch_summaries.append({"name": f"Batch {i // batch_size + 1}", "summary": f"❌ GPT error: {str(e)}"})
-    return batch_summaries
-
-def summarize_topic_with_gpt(topic, chunks):
+    return [
+        {"name": name, "summary": summary}
+        for name, _, (ok, summary) in summarize_chunks(topic, [c for c in chunks if c.get("text")])
+    ]
+
+def summarize_topic_with_gpt(topic, chunks, on_result=None, on_candidate=None):
+    """One {name, summary, source_url} record per candidate. Per-chunk partials
+    are cached by content hash; on_result(index, chunk, summary) fires per chunk
+    and on_candidate(index, chunk, summary) once per candidate's final summary."""
     if not chunks:
-        return f"No candidate statements found on {topic}."
-
-    summaries = []
-    for chunk in chunks:
-        candidate_name = chunk["name"]
-        candidate_text = chunk["text"]
-        source_url = chunk.get("source_url", "No link")
-        user_prompt = (
-            f"This is a candidate's statement on the topic of {topic}:\n\n"
-            f"{candidate_text}\n\n"
-            "Summarise their stance clearly in 1-2 sentences. Be factual. Avoid repetition. Mention the candidate's name at the start."
-        )
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a political assistant summarising candidate views."},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.5,
-            )
-            summary = response.choices[0].message.content.strip()
-            summaries.append(f"- [{candidate_name}]({source_url}): {summary}")
-        except Exception as e:
-            summaries.append(f"- {candidate_name}: ❌ Error summarising statement. ({e})")
-    return "\n\n".join(summaries)
+        return [{"name": "Info", "summary": f"No candidate statements found on {topic}.", "source_url": ""}]
+    return reduce_partials(summarize_chunks(topic, chunks, on_result=on_result, on_candidate=on_candidate))
 
 def get_most_relevant_chunk(topic, topic_chunks):
-    topic = topic.lower()
-    best_match = None
-    best_score = 0
-    for t, chunks in topic_chunks.items():
-        score = difflib.SequenceMatcher(None, topic, t.lower()).ratio()
-        if score > best_score:
-            best_match = chunks
-            best_score = score
-    return best_match
-
-def summarize_candidate_topic(candidate_name, topic, df):
+    """Chunks of the topic key (or alias) closest to `topic`, by trigram overlap."""
+    ranked = get_topic_resolver(topic_chunks, aliases).top_k(topic, k=1)
+    return topic_chunks[ranked[0][0]] if ranked else None
+
+def summarize_candidate_topic(candidate_name, topic, df=None):
     # Normalize topic for better keyword matching
     topic = normalize_topic(topic)
         
-    for _, row in df.iterrows():
-        if row.get("name", "").lower() == candidate_name.lower():
-            text = row.get("text", "")
-            if not isinstance(text, str):
-                return f"No available text for {candidate_name}."
-            paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
-            keywords = aliases.get(topic.lower(), [topic.lower()])
-            relevant_paragraphs = [
-                p for p in paragraphs
-                if any(re.search(rf"\b{re.escape(kw)}\b", p, re.IGNORECASE) for kw in keywords)
-            ]
-            if not relevant_paragraphs:
-                return f"No relevant content found for {candidate_name} on {topic}."
-            summary_input = "\n".join(relevant_paragraphs)
-            prompt = f"""
-            Please summarize {candidate_name}'s views on '{topic}' based on the following text:
-
-            {summary_input}
-            """
-            messages = [
-                {"role": "system", "content": "You summarize political candidate views on a topic."},
-                {"role": "user", "content": prompt.strip()}
-            ]
-            try:
-                response = client.chat.completions.create(
-                    model="gpt-4",
-                    messages=messages,
-                    temperature=0.5,
-                    max_tokens=300
-                )
-                return response.choices[0].message.content.strip()
-            except Exception as e:
-                return f"❌ GPT error: {str(e)}"
-    return f"No relevant response found for {candidate_name} on {topic}."
+    index = candidate_index_for(df)
+    cid = index.candidate_id(candidate_name)
+    if cid is None:
+        return f"No relevant response found for {candidate_name} on {topic}."
+    if not index.has_text[cid]:
+        return f"No available text for {candidate_name}."
+    relevant_paragraphs = index.relevant_paragraphs(cid, topic.lower())
+    if not relevant_paragraphs:
+        return f"No relevant content found for {candidate_name} on {topic}."
+    summary_input = "\n".join(relevant_paragraphs)
+    prompt = f"""
+    Please summarize {candidate_name}'s views on '{topic}' based on the following text:
+
+    {summary_input}
+    """
+    messages = [
+        {"role": "system", "content": "You summarize political candidate views on a topic."},
+        {"role": "user", "content": prompt.strip()}
+    ]
+    try:
+        response = complete_chat(
+            get_client(),
+            model="gpt-4",
+            messages=messages,
+            temperature=0.5,
+            max_tokens=300
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        return f"❌ GPT error: {str(e)}"
 
 def summarize_topic(topic):
     topic = normalize_topic(topic)
 
+    topic_summary_cache = get_topic_summary_cache()
     if topic in topic_summary_cache:
         return topic_summary_cache[topic]
     matched_chunks = []
-    for t_key, t_chunks in topic_chunks.items():
+    for t_key, t_chunks in get_topic_chunks().items():
         if t_key == topic or topic in aliases.get(t_key, []):
             matched_chunks.extend(t_chunks)
     if not matched_chunks:
         return f"No information available for topic '{topic}'."
     summary = summarize_topic_with_gpt(topic, matched_chunks)
     topic_summary_cache[topic] = summary
-    with open("topic_summary_cache.pkl", "wb") as f:
-        pickle.dump(topic_summary_cache, f)
     return summary
 
 
@@ -0,0 +1,121 @@
+import sys
+import hashlib
+from array import array
+from bisect import bisect_right
+import numpy as np
+
+
+class CorpusStore:
+    """Columnar, read-only view of the corpus for keyword and candidate scans.
+
+    Candidate names are interned once and rows refer to them by id. All row
+    texts live in one UTF-8 buffer with an offsets array (and paragraphs as
+    offsets into that same buffer), and a lower-cased copy is kept alongside,
+    so a keyword scan is a handful of bytes.find calls over one buffer instead
+    of a Series allocation per row. The vector and candidate indexes read
+    their texts from here rather than keeping their own, so once the store is
+    built the DataFrame can go.
+    """
+
+    def __init__(self, names, texts):
+        self.names = []
+        lookup = {}
+        name_ids = []
+        for name in names:
+            name = sys.intern(name.strip()) if isinstance(name, str) else ""
+            cid = lookup.get(name)
+            if cid is None:
+                cid = lookup[name] = len(self.names)
+                self.names.append(name)
+            name_ids.append(cid)
+        self.name_lookup = {name.lower(): cid for cid, name in reversed(list(enumerate(self.names)))}
+        self.name_ids = np.asarray(name_ids, dtype=np.int32)
+
+        texts = [text if isinstance(text, str) else "" for text in texts]
+        self.has_text = np.fromiter((bool(text) for text in texts), dtype=bool, count=len(texts))
+        self.buffer, self.offsets = self._pack([text.encode("utf-8") for text in texts])
+        # Lower-casing can change a text's length, so the lower buffer has its own offsets
+        self.lower, self.lower_offsets = self._pack([text.lower().encode("utf-8") for text in texts])
+        self.lower_ends = array("q", self.lower_offsets[1:].tolist())
+
+        # Paragraphs are the stripped non-empty lines; row r owns paragraph ids
+        # row_paragraphs[r]:row_paragraphs[r + 1]
+        starts, ends, row_paragraphs = [], [], [0]
+        for row, text in enumerate(texts):
+            position = int(self.offsets[row])
+            for line in text.split("\n"):
+                stripped = line.strip()
+                if stripped:
+                    start = position + len(line[:len(line) - len(line.lstrip())].encode("utf-8"))
+                    starts.append(start)
+                    ends.append(start + len(stripped.encode("utf-8")))
+                position += len(line.encode("utf-8")) + 1
+            row_paragraphs.append(len(starts))
+        self.paragraph_starts = np.asarray(starts, dtype=np.int64)
+        self.paragraph_ends = np.asarray(ends, dtype=np.int64)
+        self.row_paragraphs = np.asarray(row_paragraphs, dtype=np.int64)
+
+    @staticmethod
+    def _pack(chunks):
+        # A newline between rows keeps a keyword from matching across two of them
+        offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        np.cumsum([len(chunk) + 1 for chunk in chunks], out=offsets[1:])
+        return b"\n".join(chunks) + b"\n", offsets
+
+    @classmethod
+    def from_dataframe(cls, df):
+        text_column = "text" if "text" in df.columns else "Text"
+        return cls(df["name"].tolist(), df[text_column].tolist())
+
+    def __len__(self):
+        return len(self.name_ids)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the store."""
+        arrays = (self.name_ids, self.has_text, self.offsets, self.lower_offsets,
+                  self.paragraph_starts, self.paragraph_ends, self.row_paragraphs)
+        return (len(self.buffer) + len(self.lower) + sum(a.nbytes for a in arrays)
+                + self.lower_ends.itemsize * len(self.lower_ends) + sum(sys.getsizeof(name) for name in self.names))
+
+    # --- Row access ---
+    def text(self, row):
+        return self.buffer[self.offsets[row]:self.offsets[row + 1] - 1].decode("utf-8")
+
+    def name(self, row):
+        return self.names[self.name_ids[row]]
+
+    def paragraph(self, pid):
+        return self.buffer[self.paragraph_starts[pid]:self.paragraph_ends[pid]].decode("utf-8")
+
+    def paragraph_ids(self, row):
+        return range(int(self.row_paragraphs[row]), int(self.row_paragraphs[row + 1]))
+
+    def fingerprint(self):
+        """Hash of every row's name and text, to tell whether a saved index still fits."""
+        digest = hashlib.sha1()
+        digest.update("\0".join(self.names).encode("utf-8"))
+        digest.update(self.name_ids.tobytes())
+        digest.update(self.buffer)
+        return digest.hexdigest()
+
+    # --- Filters ---
+    def rows_with_any(self, keywords):
+        """Sorted row ids whose text contains any keyword (case-insensitive substring)."""
+        hit = np.zeros(len(self), dtype=bool)
+        ends = self.lower_ends
+        for keyword in {k.lower().encode("utf-8") for k in keywords if k}:
+            position = self.lower.find(keyword)
+            while position != -1:
+                row = bisect_right(ends, position)
+                hit[row] = True
+                # Skip the rest of this row: one hit is enough
+                position = self.lower.find(keyword, ends[row])
+        return np.flatnonzero(hit)
+
+    def rows_for(self, name):
+        """Row ids for a candidate, by case-insensitive exact name."""
+        cid = self.name_lookup.get(str(name).strip().lower())
+        if cid is None:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.name_ids == cid)
@@ -0,0 +1,223 @@
+"""Local stand-in for the OpenAI API, for exercising the LLM paths offline.
+
+Run it and point the app at it:
+
+    python fake_openai.py --port 8099 --latency 0.5 --rate-limit 0.1
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=fake python app.py
+
+Responses are deterministic for a given request body.
+"""
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FakeOpenAIState:
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit=0.0, malformed=0.0, dimensions=64, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.malformed = malformed
+        self.dimensions = dimensions
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {"chat": 0, "embeddings": 0, "rate_limited": 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def count(self, key):
+        with self.lock:
+            self.calls[key] += 1
+
+    def should_rate_limit(self):
+        with self.lock:
+            return self.random.random() < self.rate_limit
+
+    def should_malform(self):
+        with self.lock:
+            return self.random.random() < self.malformed
+
+    def delay(self):
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+
+def _digest(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+FAKE_STANCES = ["SUPPORT", "OPPOSE", "NO CLEAR STANCE"]
+
+
+def stance_names(prompt):
+    statements = prompt.split("Statements:", 1)[1]
+    return re.findall(r"^([^:\n]{2,60}):$", statements, re.MULTILINE)
+
+
+def fake_stance(name):
+    return FAKE_STANCES[int(_digest(name)[:4], 16) % 3]
+
+
+def fake_tool_arguments(body, state):
+    """JSON arguments for a forced tool call; with state.malformed, items go missing or bad."""
+    messages = body.get("messages", [])
+    prompt = messages[-1]["content"] if messages else ""
+    items = []
+    if "SUPPORT, OPPOSE" in prompt and "Statements:" in prompt:
+        for name in stance_names(prompt):
+            if state.should_malform():
+                if state.should_malform():
+                    continue
+                items.append({"name": name, "stance": "MAYBE"})
+            else:
+                items.append({"name": name, "stance": fake_stance(name), "reason": f"Fake reason for {name}."})
+    return json.dumps({"items": items})
+
+
+def fake_completion_text(body):
+    messages = body.get("messages", [])
+    prompt = messages[-1]["content"] if messages else ""
+    if "SUPPORT, OPPOSE" in prompt and "Statements:" in prompt:
+        # Stance classification: one "Name: STANCE - reason" line per candidate
+        names = stance_names(prompt)
+        return "\n".join(
+            f"{name}: {fake_stance(name)} - Fake reason for {name}."
+            for name in names
+        )
+    return f"Fake summary {_digest(body)[:8]} of a {len(prompt)}-character prompt."
+
+
+def fake_embedding(text, dimensions):
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+    rnd = random.Random(seed)
+    return [rnd.gauss(0, 1) for _ in range(dimensions)]
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                with state.lock:
+                    payload = dict(state.calls, max_in_flight=state.max_in_flight)
+                return self._send_json(200, payload)
+            self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+            if state.should_rate_limit():
+                state.count("rate_limited")
+                return self._send_json(
+                    429,
+                    {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                    headers={"retry-after": "0"},
+                )
+
+            with state.lock:
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            try:
+                time.sleep(state.delay())
+                if self.path.endswith("/chat/completions"):
+                    state.count("chat")
+                    message = {"role": "assistant", "content": fake_completion_text(body)}
+                    finish_reason = "stop"
+                    if body.get("tools"):
+                        choice = body.get("tool_choice")
+                        tool = choice["function"]["name"] if isinstance(choice, dict) else body["tools"][0]["function"]["name"]
+                        message = {"role": "assistant", "content": None, "tool_calls": [{
+                            "id": f"call_{_digest(body)[:12]}",
+                            "type": "function",
+                            "function": {"name": tool, "arguments": fake_tool_arguments(body, state)},
+                        }]}
+                        finish_reason = "tool_calls"
+                    return self._send_json(200, {
+                        "id": f"chatcmpl-{_digest(body)[:12]}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "gpt-4"),
+                        "choices": [{
+                            "index": 0,
+                            "message": message,
+                            "finish_reason": finish_reason,
+                        }],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    })
+                if self.path.endswith("/embeddings"):
+                    state.count("embeddings")
+                    inputs = body.get("input", [])
+                    if isinstance(inputs, str):
+                        inputs = [inputs]
+                    return self._send_json(200, {
+                        "object": "list",
+                        "model": body.get("model", ""),
+                        "data": [
+                            {"object": "embedding", "index": i, "embedding": fake_embedding(text, state.dimensions)}
+                            for i, text in enumerate(inputs)
+                        ],
+                        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                    })
+                self._send_json(404, {"error": {"message": "not found"}})
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+    return Handler
+
+
+def start_fake_openai(port=0, **settings):
+    """Start the fake server on a background thread; returns (server, state, base_url)."""
+    state = FakeOpenAIState(**settings)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    return server, state, base_url
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake OpenAI API server")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of calls answered with 429")
+    parser.add_argument("--malformed", type=float, default=0.0, help="Fraction of structured items returned broken or dropped")
+    parser.add_argument("--dimensions", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    server, _, base_url = start_fake_openai(
+        port=args.port, latency=args.latency, jitter=args.jitter,
+        rate_limit=args.rate_limit, malformed=args.malformed, dimensions=args.dimensions,
+    )
+    print(f"🤖 Fake OpenAI listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Settings ---
+JOBS_PATH = os.getenv("JOBS_PATH", "jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(24 * 60 * 60)))
+JOB_PRUNE_INTERVAL = float(os.getenv("JOB_PRUNE_INTERVAL", str(60 * 60)))
+
+ACTIVE = ("queued", "running")
+
+
+class JobQueue:
+    """Background jobs on a local thread pool, tracked in a SQLite job table.
+
+    Jobs are keyed (e.g. "topic_summary:transport"): submitting a key that
+    already has a queued or running job returns that job instead of starting
+    another one. The table lives on disk so every web worker can poll any
+    job. The process that accepted a job heartbeats it while it waits and
+    runs; a queued or running job whose heartbeat is older than
+    JOB_STALE_SECONDS is treated as dead (its worker went away) and can be
+    resubmitted.
+    """
+
+    def __init__(self, path=JOBS_PATH, workers=JOB_WORKERS, stale_after=JOB_STALE_SECONDS):
+        self.path = path
+        self.workers = workers
+        self.stale_after = stale_after
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.handlers = {}
+        self.executor = None
+        self.owned = set()  # queued or running job ids this process heartbeats
+        self.heartbeat = None
+        self.last_prune = 0.0
+
+    def _db(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, key TEXT NOT NULL, status TEXT NOT NULL, "
+                "params TEXT NOT NULL, progress INTEGER NOT NULL DEFAULT 0, total INTEGER NOT NULL DEFAULT 0, "
+                "result TEXT, error TEXT, pid INTEGER, created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+            self.local.conn = conn
+        return conn
+
+    def _pool(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            return self.executor
+
+    def _beat(self):
+        # Well inside stale_after, so a live job never looks dead
+        interval = max(0.1, self.stale_after / 4)
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                owned = list(self.owned)
+            if owned:
+                self._db().execute(
+                    f"UPDATE jobs SET updated = ? WHERE id IN ({', '.join('?' * len(owned))}) AND status IN ('queued', 'running')",
+                    (time.time(), *owned),
+                )
+
+    def _own(self, job_id):
+        with self.lock:
+            self.owned.add(job_id)
+            if self.heartbeat is None:
+                self.heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+                self.heartbeat.start()
+
+    def register(self, kind, handler):
+        """handler(params, progress) -> JSON-serialisable result.
+
+        progress(done, total) records how far the job has got.
+        """
+        self.handlers[kind] = handler
+
+    def _row(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        if job["status"] in ACTIVE and time.time() - job["updated"] > self.stale_after:
+            job["status"] = "stale"
+        return job
+
+    def get(self, job_id):
+        row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def active_job(self, key):
+        rows = self._db().execute(
+            "SELECT * FROM jobs WHERE key = ? AND status IN ('queued', 'running') ORDER BY created DESC", (key,)
+        ).fetchall()
+        for row in rows:
+            job = self._row(row)
+            if job["status"] != "stale":
+                return job
+        return None
+
+    def submit(self, kind, key, params):
+        """Start a job, or return the queued/running job already holding `key`.
+
+        Returns (job, created).
+        """
+        if kind not in self.handlers:
+            raise KeyError(f"No job handler registered for '{kind}'")
+        db = self._db()
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        # BEGIN IMMEDIATE takes the write lock, so two workers can't both
+        # see "no active job" and each insert one.
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # An active job is shared whatever its age; only one whose owner
+            # stopped heartbeating is retired, so its key can run again
+            db.execute(
+                "UPDATE jobs SET status = 'stale' WHERE key = ? AND status IN ('queued', 'running') AND updated <= ?",
+                (key, now - self.stale_after),
+            )
+            existing = db.execute(
+                "SELECT * FROM jobs WHERE key = ? AND status IN ('queued', 'running') ORDER BY created DESC LIMIT 1",
+                (key,),
+            ).fetchone()
+            if existing is not None:
+                db.execute("COMMIT")
+                return self._row(existing), False
+            db.execute(
+                "INSERT INTO jobs (id, kind, key, status, params, pid, created, updated) VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, key, json.dumps(params), os.getpid(), now, now),
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+        self._own(job_id)
+        self._pool().submit(self._run, job_id, kind, params)
+        if now - self.last_prune > JOB_PRUNE_INTERVAL:
+            self.last_prune = now
+            pruned = self.prune()
+            if pruned:
+                print(f"🧹 Pruned {pruned} finished jobs")
+        return self.get(job_id), True
+
+    def _update(self, job_id, **fields):
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._db().execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def _run(self, job_id, kind, params):
+        self._update(job_id, status="running")
+        print(f"🛠️ Job {job_id[:8]} ({kind}) started")
+
+        def progress(done, total):
+            self._update(job_id, progress=done, total=total)
+
+        try:
+            result = self.handlers[kind](params, progress)
+            self._update(job_id, status="done", result=json.dumps(result, ensure_ascii=False))
+            print(f"✅ Job {job_id[:8]} ({kind}) finished")
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e))
+            print(f"⚠️ Job {job_id[:8]} ({kind}) failed: {e}")
+        finally:
+            with self.lock:
+                self.owned.discard(job_id)
+
+    def prune(self, older_than=JOB_RETENTION_SECONDS):
+        """Delete finished, failed and stale jobs last touched more than older_than seconds ago."""
+        cursor = self._db().execute(
+            "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND updated < ?",
+            (time.time() - older_than,),
+        )
+        return cursor.rowcount
+
+
+job_queue = JobQueue()
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# --- Settings ---
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 60 * 60)))
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "1024"))
+CACHE_ENABLED = os.getenv("LLM_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+EVICT_EVERY = 100
+
+
+def completion_key(model, messages, temperature=None, max_tokens=None, **options):
+    """Key over everything that shapes the reply; options (tools, response_format, ...)
+    only join the key when set, so plain text calls keep their old keys."""
+    request = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+    request.update({name: value for name, value in options.items() if value is not None})
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """Two-tier completion cache: in-memory LRU over an on-disk SQLite table.
+
+    Disk entries expire after `ttl` seconds; once the table grows past
+    `max_bytes` the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, memory_items=MEMORY_ITEMS):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.writes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _db(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, "
+                "accessed REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)")
+            self.local.conn = conn
+        return conn
+
+    def _remember(self, key, value, created):
+        with self.lock:
+            self.memory[key] = (value, created)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_items:
+                self.memory.popitem(last=False)
+
+    def _count(self, stat, n=1):
+        with self.lock:
+            self.stats[stat] += n
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            cached = self.memory.get(key)
+            if cached is not None and now - cached[1] < self.ttl:
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return cached[0]
+            self.memory.pop(key, None)
+
+        try:
+            conn = self._db()
+            row = conn.execute("SELECT value, created FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] < self.ttl:
+                with conn:
+                    conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+                self._remember(key, row[0], row[1])
+                self._count("disk_hits")
+                return row[0]
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache read failed: {e}")
+
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        now = time.time()
+        self._remember(key, value, now)
+        try:
+            conn = self._db()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO completions (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, now, now, len(value.encode("utf-8"))),
+                )
+            self._count("stores")
+            with self.lock:
+                self.writes += 1
+                due = self.writes % EVICT_EVERY == 0
+            if due:
+                self.evict()
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache write failed: {e}")
+
+    def evict(self):
+        conn = self._db()
+        with conn:
+            expired = conn.execute("DELETE FROM completions WHERE created < ?", (time.time() - self.ttl,)).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            evicted = 0
+            if total > self.max_bytes:
+                # Drop least recently used rows until back under budget
+                for key, size in conn.execute("SELECT key, size FROM completions ORDER BY accessed").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    total -= size
+                    evicted += 1
+        self._count("evictions", expired + evicted)
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["memory_items"] = len(self.memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+completion_cache = CompletionCache()
@@ -0,0 +1,124 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_cache import CACHE_ENABLED, completion_cache, completion_key
+from metrics import llm_calls, llm_tokens, record_stage
+
+# --- Fan-out settings ---
+MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "60"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+BACKOFF_CAP = float(os.getenv("LLM_BACKOFF_CAP", "30"))
+
+# Process-wide: concurrent requests share these slots, however many fan_outs are running
+_in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+
+
+def backoff_delay(attempt, retry_after=None):
+    # Full jitter, but never earlier than the server asked for
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def _retry_after(error):
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def complete_chat(client, timeout=None, max_retries=None, cache=CACHE_ENABLED, accept=None, **kwargs):
+    """chat.completions.create with a per-call timeout, jittered retry on 429,
+    a shared completion cache and at most LLM_MAX_IN_FLIGHT calls in flight
+    across the process. accept(response), if given, must return True for a
+    fresh reply to be cached."""
+    # Deferred so importing the app doesn't pay for the openai package
+    import openai
+    from openai.types.chat import ChatCompletion
+
+    key = None
+    if cache:
+        key = completion_key(
+            kwargs.get("model"), kwargs.get("messages"), kwargs.get("temperature"), kwargs.get("max_tokens"),
+            tools=kwargs.get("tools"), tool_choice=kwargs.get("tool_choice"), response_format=kwargs.get("response_format"),
+        )
+        cached = completion_cache.get(key)
+        if cached is not None:
+            llm_calls.inc(model=kwargs.get("model"), outcome="cached")
+            return ChatCompletion.model_validate_json(cached)
+
+    timeout = CALL_TIMEOUT if timeout is None else timeout
+    max_retries = MAX_RETRIES if max_retries is None else max_retries
+    call_client = client.with_options(timeout=timeout, max_retries=0)
+
+    model = kwargs.get("model")
+    start = time.perf_counter()
+    for attempt in range(max_retries + 1):
+        try:
+            waited = time.perf_counter()
+            with _in_flight:
+                record_stage("llm_queue", time.perf_counter() - waited)
+                response = call_client.chat.completions.create(**kwargs)
+            break
+        except openai.RateLimitError as e:
+            if attempt == max_retries:
+                llm_calls.inc(model=model, outcome="error")
+                raise
+            delay = backoff_delay(attempt, _retry_after(e))
+            print(f"⏳ Rate limited, retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+            time.sleep(delay)
+        except Exception:
+            llm_calls.inc(model=model, outcome="error")
+            raise
+
+    # Includes any rate-limit backoff: that's latency the request really paid
+    record_stage("llm", time.perf_counter() - start)
+    llm_calls.inc(model=model, outcome="ok")
+    if response.usage is not None:
+        llm_tokens.inc(response.usage.prompt_tokens or 0, model=model, kind="prompt")
+        llm_tokens.inc(response.usage.completion_tokens or 0, model=model, kind="completion")
+
+    if key is not None and (accept is None or accept(response)):
+        completion_cache.set(key, response.model_dump_json())
+    return response
+
+
+def fan_out(fn, items, max_in_flight=None, on_result=None):
+    """Run fn over items on a bounded thread pool; results keep input order.
+
+    The pool bounds one caller's threads; the API calls themselves are also
+    capped process-wide at LLM_MAX_IN_FLIGHT by complete_chat.
+
+    fn is expected to handle its own errors, as the sequential loops did.
+    on_result(index, result), if given, is called as each item finishes, in
+    completion order, so callers can stream partial results.
+    """
+    items = list(items)
+    limit = MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+    if limit <= 1 or len(items) <= 1:
+        results = []
+        for i, item in enumerate(items):
+            results.append(fn(item))
+            if on_result is not None:
+                on_result(i, results[-1])
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(limit, len(items)), thread_name_prefix="llm") as pool:
+        # Each task runs in a copy of the caller's context, so per-request
+        # timings follow the work into the pool
+        futures = {pool.submit(contextvars.copy_context().run, fn, item): i for i, item in enumerate(items)}
+        if on_result is None:
+            return [future.result() for future in futures]
+
+        results = [None] * len(items)
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            on_result(i, results[i])
+        return results
@@ -0,0 +1,219 @@
+import re
+import hashlib
+import threading
+from llm_pool import complete_chat, fan_out
+from artefacts import get_client
+
+# Bump when a prompt below changes so old partials stop matching
+MAP_VERSION = 1
+
+_partials = None
+_partials_lock = threading.Lock()
+
+
+def get_partials():
+    """Map summaries shared by every worker, keyed by content hash."""
+    global _partials
+    with _partials_lock:
+        if _partials is None:
+            from cache_store import open_cache
+            _partials = open_cache("partials")
+        return _partials
+
+
+def content_key(*parts):
+    digest = hashlib.sha256()
+    for part in (MAP_VERSION,) + parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def chunk_key(topic, chunk):
+    return content_key("chunk", topic, chunk["name"], chunk["text"])
+
+
+# --- Map ---
+def summarize_chunk(topic, chunk):
+    user_prompt = (
+        f"This is a candidate's statement on the topic of {topic}:\n\n"
+        f"{chunk['text']}\n\n"
+        "Summarise their stance clearly in 1-2 sentences. Be factual. Avoid repetition. Mention the candidate's name at the start."
+    )
+    response = complete_chat(
+        get_client(),
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "You are a political assistant summarising candidate views."},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=0.5,
+    )
+    return response.choices[0].message.content.strip()
+
+
+def merge_candidate(topic, name, summaries):
+    bullet_list = "\n".join(f"- {summary}" for summary in summaries)
+    user_prompt = (
+        f"These are summaries of {name}'s statements on the topic of {topic}:\n\n"
+        f"{bullet_list}\n\n"
+        "Combine them into one factual summary of 1-3 sentences. Avoid repetition. Mention the candidate's name at the start."
+    )
+    response = complete_chat(
+        get_client(),
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "You are a political assistant summarising candidate views."},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=0.3,
+    )
+    return response.choices[0].message.content.strip()
+
+
+def map_chunks(topic, chunks, on_result=None, stats=None):
+    """[(ok, summary)] per chunk; cached partials are reused, the rest computed in parallel.
+
+    on_result(index, chunk, summary) fires for cached chunks first, then for
+    computed ones in completion order.
+    """
+    partials = get_partials()
+    keys = [chunk_key(topic, chunk) for chunk in chunks]
+    results = [None] * len(chunks)
+    missing = []
+    for i, key in enumerate(keys):
+        cached = partials.get(key)
+        if cached is None:
+            missing.append(i)
+            continue
+        results[i] = (True, cached)
+        if on_result is not None:
+            on_result(i, chunks[i], cached)
+
+    def run(i):
+        try:
+            return True, summarize_chunk(topic, chunks[i])
+        except Exception as e:
+            return False, f"❌ Error summarising statement. ({e})"
+
+    def finished(j, result):
+        i = missing[j]
+        results[i] = result
+        if result[0]:
+            partials[keys[i]] = result[1]
+        if on_result is not None:
+            on_result(i, chunks[i], result[1])
+
+    fan_out(run, missing, on_result=finished)
+    if stats is not None:
+        stats["chunk_hits"] = len(chunks) - len(missing)
+        stats["chunk_calls"] = len(missing)
+    return results
+
+
+def map_candidates(topic, chunks, chunk_results, on_candidate=None, stats=None):
+    """One (ok, summary) per candidate, in first-appearance order.
+
+    A candidate with a single chunk reuses that chunk's partial; several
+    chunks are merged once and cached under the hash of their chunk keys,
+    so the same selection of chunks never costs a second call.
+    on_candidate(index, chunk, summary) fires once per candidate with
+    several chunks, as its merged summary becomes available.
+    """
+    partials = get_partials()
+    grouped = {}
+    for chunk, result in zip(chunks, chunk_results):
+        grouped.setdefault(chunk["name"], []).append((chunk, result))
+
+    order = {name: i for i, name in enumerate(grouped)}
+    merged = {}
+    pending = []
+
+    def resolved(name, result):
+        merged[name] = result
+        if on_candidate is not None and len(grouped[name]) > 1:
+            on_candidate(order[name], grouped[name][0][0], result[1])
+
+    for name, members in grouped.items():
+        ok_summaries = [summary for _, (ok, summary) in members if ok]
+        if not ok_summaries:
+            resolved(name, members[0][1])
+        elif len(ok_summaries) == 1:
+            resolved(name, (True, ok_summaries[0]))
+        else:
+            key = content_key("candidate", topic, name, *sorted(chunk_key(topic, chunk) for chunk, _ in members))
+            cached = partials.get(key)
+            if cached is not None:
+                resolved(name, (True, cached))
+            else:
+                pending.append((name, key, ok_summaries))
+
+    def run(job):
+        name, key, summaries = job
+        try:
+            summary = merge_candidate(topic, name, summaries)
+            partials[key] = summary
+            return True, summary
+        except Exception:
+            # The individual partials are still a fine answer
+            return True, " ".join(summaries)
+
+    fan_out(run, pending, on_result=lambda j, result: resolved(pending[j][0], result))
+    if stats is not None:
+        stats["candidate_calls"] = len(pending)
+    return [(name, grouped[name][0][0], merged[name]) for name in grouped]
+
+
+# --- Reduce ---
+MARKDOWN_LINE = re.compile(r"^- (?:\[(?P<linked>[^\]]*)\]\((?P<url>[^)]*)\)|(?P<plain>[^:]+)): (?P<summary>.*)$", re.S)
+
+
+def reduce_partials(candidate_results):
+    """One {name, summary, source_url} record per candidate, the shape every route returns; no LLM call."""
+    return [
+        {"name": name, "summary": summary, "source_url": chunk.get("source_url", "")}
+        for name, chunk, (ok, summary) in candidate_results
+    ]
+
+
+def records_from_markdown(text):
+    """Records back from the "- [name](url): summary" list older builds returned and cached."""
+    records = []
+    for line in text.split("\n\n"):
+        match = MARKDOWN_LINE.match(line.strip())
+        if match:
+            name, url, summary = match.group("linked", "url", "summary")
+            records.append({"name": name or match.group("plain"), "summary": summary, "source_url": url if url and url != "No link" else ""})
+        elif records:
+            # A blank line inside a summary
+            records[-1]["summary"] += "\n\n" + line
+    return records
+
+
+def summarize_chunks(topic, chunks, on_result=None, on_candidate=None):
+    """Map (cached per chunk and per candidate), then reduce to one line per candidate.
+
+    on_result(index, chunk, summary) fires per chunk; on_candidate(index,
+    chunk, summary) fires once per candidate with its final summary, as soon
+    as it is known: single-chunk candidates during the map, the rest as they
+    are merged. Streaming clients should listen to on_candidate.
+    """
+    order, sizes = {}, {}
+    for chunk in chunks:
+        order.setdefault(chunk["name"], len(order))
+        sizes[chunk["name"]] = sizes.get(chunk["name"], 0) + 1
+
+    def chunk_done(index, chunk, summary):
+        if on_result is not None:
+            on_result(index, chunk, summary)
+        if on_candidate is not None and sizes[chunk["name"]] == 1:
+            on_candidate(order[chunk["name"]], chunk, summary)
+
+    stats = {}
+    chunk_results = map_chunks(topic, chunks, on_result=chunk_done, stats=stats)
+    candidate_results = map_candidates(topic, chunks, chunk_results, on_candidate=on_candidate, stats=stats)
+    print(
+        f"🗺️ {topic}: {len(chunks)} chunks, {stats['chunk_hits']} cached / {stats['chunk_calls']} summarised, "
+        f"{stats['candidate_calls']} candidate merges"
+    )
+    return candidate_results
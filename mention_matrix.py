@@ -0,0 +1,115 @@
+import math
+import numpy as np
+
+
+class MentionMatrix:
+    """Candidate × topic counts of corpus rows mentioning each topic.
+
+    One keyword scan per alias topic at build time fills an int32 array, so
+    "who doesn't talk about X", rankings, thresholds and percentiles are
+    column lookups. Topics outside the alias table are scanned on demand
+    through the corpus store.
+    """
+
+    def __init__(self, candidates, topics, counts, totals, store=None):
+        self.candidates = list(candidates)
+        self.topics = list(topics)
+        self.counts = np.asarray(counts, dtype=np.int32).reshape(len(self.candidates), len(self.topics))
+        self.totals = np.asarray(totals, dtype=np.int32)  # rows with text, per candidate
+        self.topic_lookup = {topic: i for i, topic in enumerate(self.topics)}
+        self.store = store
+        self.store_ids = None  # store name id of each candidate, set by from_store
+
+    @classmethod
+    def from_store(cls, store, topic_aliases):
+        # Rows without a candidate name are counted nowhere
+        keep = np.asarray([cid for cid, name in enumerate(store.names) if name], dtype=np.int64)
+        topics = sorted(topic_aliases)
+        counts = np.zeros((len(keep), len(topics)), dtype=np.int32)
+        for j, topic in enumerate(topics):
+            counts[:, j] = cls._scan(store, topic_aliases[topic])[keep]
+        totals = np.bincount(store.name_ids[store.has_text], minlength=len(store.names))[keep]
+        matrix = cls([store.names[cid] for cid in keep], topics, counts, totals, store=store)
+        matrix.store_ids = keep
+        return matrix
+
+    @staticmethod
+    def _scan(store, keywords):
+        """Per-name-id counts of rows containing any keyword."""
+        return np.bincount(store.name_ids[store.rows_with_any(keywords)], minlength=len(store.names))
+
+    def __contains__(self, topic):
+        return topic in self.topic_lookup
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + self.totals.nbytes
+
+    # --- Columns ---
+    def column(self, topic, keywords=None):
+        """Counts per candidate (in self.candidates order) for a topic.
+
+        Alias topics come straight from the matrix; anything else is scanned
+        for keywords (or the topic itself) when the matrix has a store.
+        """
+        j = self.topic_lookup.get(topic)
+        if j is not None:
+            return self.counts[:, j]
+        if self.store is None:
+            raise KeyError(topic)
+        return self._scan(self.store, keywords or [topic])[self.store_ids].astype(np.int32)
+
+    def mentions(self, topic, keywords=None):
+        """{candidate: rows mentioning the topic}."""
+        return dict(zip(self.candidates, self.column(topic, keywords).tolist()))
+
+    # --- Queries ---
+    def below(self, topic, threshold=1, keywords=None):
+        """(candidate, count) for everyone with fewer than threshold mentions, in corpus order."""
+        counts = self.column(topic, keywords)
+        return [(self.candidates[i], int(counts[i])) for i in np.flatnonzero(counts < threshold)]
+
+    def ranked(self, topic, limit=None, ascending=False, keywords=None):
+        """(candidate, count) by mentions; ties keep corpus order."""
+        counts = self.column(topic, keywords)
+        order = np.argsort(counts if ascending else -counts, kind="stable")
+        if limit is not None:
+            order = order[:limit]
+        return [(self.candidates[i], int(counts[i])) for i in order]
+
+    def percentile(self, topic, q, keywords=None):
+        """The q-th percentile of mention counts across candidates."""
+        counts = self.column(topic, keywords)
+        return float(np.percentile(counts, q)) if len(counts) else 0.0
+
+    def in_percentile(self, topic, percent, top=False, keywords=None):
+        """(candidate, count) for the top or bottom percent of candidates by mentions.
+
+        The cut is by rank, ceil(percent% of candidates), and widened to take
+        in everyone tied with the last candidate inside it. Candidates who
+        never mention the topic are never in the top.
+        """
+        ranked = self.ranked(topic, ascending=not top, keywords=keywords)
+        if not ranked:
+            return []
+        take = min(len(ranked), max(1, math.ceil(len(ranked) * percent / 100)))
+        cutoff = ranked[take - 1][1]
+        if top:
+            return [(name, count) for name, count in ranked if count >= max(cutoff, 1)]
+        return [(name, count) for name, count in ranked if count <= cutoff]
+
+    def coverage(self):
+        """The whole matrix as a JSON-ready heatmap: row-normalised shares alongside raw counts."""
+        totals = np.maximum(self.totals, 1)[:, None]
+        return {
+            "topics": self.topics,
+            "candidates": self.candidates,
+            "counts": self.counts.tolist(),
+            "share": np.round(self.counts / totals, 3).tolist(),
+        }
+
+    def top_topics(self, candidate_index, limit=3):
+        """(topic, count) a candidate mentions most, skipping topics they never mention."""
+        row = self.counts[candidate_index]
+        order = np.argsort(-row, kind="stable")[:limit]
+        return [(self.topics[j], int(row[j])) for j in order if row[j]]
@@ -0,0 +1,196 @@
+import os
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# --- Settings ---
+SERVER_TIMING = os.getenv("SERVER_TIMING", "").lower() in ("1", "true", "yes")
+# METRICS_DISABLED=1 skips the stage histograms and Server-Timing spans
+ENABLED = os.getenv("METRICS_DISABLED", "").lower() not in ("1", "true", "yes")
+# Upper bounds in seconds; wide enough for a 4 µs regex and a 60 s LLM call
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., overflow, sum]; made cumulative when rendered
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        self.observe_key(tuple(str(labels.get(name, "")) for name in self.labels), value)
+
+    def observe_key(self, key, value):
+        """observe() with the label values already as a tuple, for hot paths."""
+        self.observe_many(((key, value),))
+
+    def observe_many(self, observations):
+        """Several (label tuple, value) observations under one lock."""
+        with self.lock:
+            for key, value in observations:
+                entry = self.values.get(key)
+                if entry is None:
+                    entry = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+                entry[bisect_left(self.buckets, value)] += 1
+                entry[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, entry in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels + ('le',), key + (repr(bound),))} {cumulative}")
+                total = cumulative + entry[-2]
+                lines.append(f"{self.name}_bucket{_label_text(self.labels + ('le',), key + ('+Inf',))} {total}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {round(entry[-1], 6)}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {total}")
+        return lines
+
+
+# --- Registry ---
+stage_seconds = Histogram("ballotbot_stage_seconds", "Time spent in each pipeline stage.", ["stage"])
+request_seconds = Histogram("ballotbot_request_seconds", "End-to-end request time by endpoint and response type.", ["endpoint", "type"])
+requests_total = Counter("ballotbot_requests_total", "Requests by endpoint, response type and status.", ["endpoint", "type", "status"])
+cache_lookups = Counter("ballotbot_cache_lookups_total", "Cache-store lookups by namespace and result.", ["namespace", "result"])
+llm_calls = Counter("ballotbot_llm_calls_total", "LLM calls by model and outcome (ok, cached, error).", ["model", "outcome"])
+llm_tokens = Counter("ballotbot_llm_tokens_total", "Tokens reported by the LLM API.", ["model", "kind"])
+
+METRICS = [request_seconds, requests_total, stage_seconds, cache_lookups, llm_calls, llm_tokens]
+# name -> fn() returning {label value: number}, rendered as gauges at scrape time
+_gauges = {}
+
+
+def register_gauge(name, help_text, label, collect):
+    _gauges[name] = (help_text, label, collect)
+
+
+def render():
+    """Everything in Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    for name, (help_text, label, collect) in _gauges.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        try:
+            values = collect()
+        except Exception as e:
+            print(f"⚠️ Metrics gauge {name} failed: {e}")
+            continue
+        for key, value in sorted(values.items()):
+            lines.append(f"{name}{_label_text((label,), (key,))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Per-request spans ---
+# The current request's timings; fan_out copies the context into its
+# worker threads, so LLM calls made there still land on the request.
+_request = contextvars.ContextVar("ballotbot_request", default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.type = None
+
+    def add(self, stages):
+        with self.lock:
+            for stage, seconds in stages:
+                total, count = self.stages.get(stage, (0.0, 0))
+                self.stages[stage] = (total + seconds, count + 1)
+
+    def server_timing(self):
+        """Server-Timing header value: total per stage (parallel LLM calls add up), then the whole request."""
+        with self.lock:
+            parts = [
+                f'{stage.replace(":", "-")};dur={total * 1e3:.2f};desc="{count}x"'
+                for stage, (total, count) in self.stages.items()
+            ]
+        parts.append(f"total;dur={(time.perf_counter() - self.start) * 1e3:.2f}")
+        return ", ".join(parts)
+
+
+def begin_request():
+    timings = RequestTimings()
+    _request.set(timings)
+    return timings
+
+
+def finish_request(timings, endpoint, status):
+    response_type = timings.type or "none"
+    request_seconds.observe(time.perf_counter() - timings.start, endpoint=endpoint, type=response_type)
+    requests_total.inc(endpoint=endpoint, type=response_type, status=status)
+
+
+def current_request():
+    return _request.get()
+
+
+def set_response_type(response_type):
+    timings = _request.get()
+    if timings is not None:
+        timings.type = response_type
+
+
+def record_stage(stage, seconds):
+    record_stages(((stage, seconds),))
+
+
+def record_stages(stages):
+    """Record several (stage, seconds) pairs at once; cheaper on hot paths."""
+    if not ENABLED:
+        return
+    stage_seconds.observe_many(((stage,), seconds) for stage, seconds in stages)
+    timings = _request.get()
+    if timings is not None:
+        timings.add(stages)
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
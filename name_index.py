@@ -0,0 +1,178 @@
+import os
+import re
+import json
+import unicodedata
+from collections import defaultdict
+
+CANDIDATE_ALIASES_PATH = os.getenv("CANDIDATE_ALIASES_PATH", "candidate_aliases.json")
+MIN_SCORE = 0.7
+MAX_SPAN = 4
+
+# Lower-case surname particles: "le tissier" is a surname, "le" on its own is not
+PARTICLES = {"le", "la", "de", "du", "st", "van", "von", "der", "del", "di", "da", "mc", "mac"}
+
+# How much a hit on each kind of key is worth
+KEY_WEIGHTS = {"name": 1.0, "alias": 1.0, "surname": 0.95, "token": 0.8}
+
+
+def normalize_name(text):
+    """Lower-case, strip accents and apostrophes, hyphens and other punctuation to spaces."""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii").lower()
+    text = re.sub(r"['’`]", "", text)
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def edit_distance(a, b, max_dist=None):
+    """Levenshtein distance; gives up early once every path exceeds max_dist."""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if max_dist is not None and len(a) - len(b) > max_dist:
+        return max_dist + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if max_dist is not None and min(current) > max_dist:
+            return max_dist + 1
+        previous = current
+    return previous[-1]
+
+
+def max_typos(word):
+    return 0 if len(word) < 3 else 1 if len(word) < 7 else 2
+
+
+def bigrams(word):
+    padded = f"#{word}#"
+    return [padded[i:i + 2] for i in range(len(padded) - 1)]
+
+
+class NgramIndex:
+    """Bigram postings for edit-distance search over single-word keys.
+
+    A key within k edits of a word shares at least len(word) + 1 - 2k of its
+    padded bigrams (each edit breaks at most two), so only keys that clear
+    that count are checked with the real edit distance.
+    """
+
+    def __init__(self, words=()):
+        self.postings = defaultdict(list)
+        for word in set(words):
+            for gram in set(bigrams(word)):
+                self.postings[gram].append(word)
+
+    def search(self, word, max_dist):
+        """[(distance, key)] for every key within max_dist of word."""
+        grams = set(bigrams(word))
+        shared = defaultdict(int)
+        for gram in grams:
+            for key in self.postings.get(gram, ()):
+                shared[key] += 1
+        needed = len(grams) - 2 * max_dist
+        found = []
+        for key, count in shared.items():
+            if count >= needed and abs(len(key) - len(word)) <= max_dist:
+                distance = edit_distance(word, key, max_dist)
+                if distance <= max_dist:
+                    found.append((distance, key))
+        return found
+
+
+def load_candidate_aliases(path=CANDIDATE_ALIASES_PATH):
+    """{alias: candidate name} from an optional JSON file."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class NameIndex:
+    """Resolve free-text candidate names: full names, surnames, aliases and typos.
+
+    Every name is broken into keys (the full name, its surname with or
+    without particles, and its other words) that map to candidate ids.
+    Spans of the query are looked up exactly first; only words with no exact
+    hit go to the bigram index for edit-distance matches.
+    """
+
+    def __init__(self, names, aliases=None):
+        self.names = list(names)
+        self.keys = defaultdict(dict)  # key -> {cid: kind}
+
+        for cid, name in enumerate(self.names):
+            tokens = normalize_name(name).split()
+            if not tokens:
+                continue
+            self._add(" ".join(tokens), cid, "name")
+            self._add("".join(tokens), cid, "name")
+            surname = tokens[1:] if len(tokens) > 1 else tokens
+            self._add(" ".join(surname), cid, "surname")
+            self._add("".join(surname), cid, "surname")
+            self._add(tokens[-1], cid, "surname")
+            for token in tokens:
+                if len(token) >= 3 and token not in PARTICLES:
+                    self._add(token, cid, "token")
+
+        lookup = {normalize_name(name): cid for cid, name in enumerate(self.names)}
+        for alias, name in (aliases or {}).items():
+            cid = lookup.get(normalize_name(name))
+            if cid is not None:
+                self._add(normalize_name(alias), cid, "alias")
+
+        self.fuzzy = NgramIndex(key for key in self.keys if " " not in key)
+
+    def _add(self, key, cid, kind):
+        if not key:
+            return
+        current = self.keys[key].get(cid)
+        if current is None or KEY_WEIGHTS[kind] > KEY_WEIGHTS[current]:
+            self.keys[key][cid] = kind
+
+    def __len__(self):
+        return len(self.names)
+
+    def match(self, text, limit=5):
+        """Ranked [{name, score, via}] for the candidates text could refer to."""
+        tokens = normalize_name(text).split()
+        scores = {}
+
+        def hit(cid, score, via):
+            if score > scores.get(cid, (0.0, None))[0]:
+                scores[cid] = (score, via)
+
+        covered = set()
+        for size in range(min(MAX_SPAN, len(tokens)), 0, -1):
+            for start in range(len(tokens) - size + 1):
+                key = " ".join(tokens[start:start + size])
+                for cid, kind in self.keys.get(key, {}).items():
+                    hit(cid, KEY_WEIGHTS[kind], kind)
+                    covered.update(range(start, start + size))
+
+        for i, token in enumerate(tokens):
+            if i in covered or token in PARTICLES:
+                continue
+            limit_dist = max_typos(token)
+            if not limit_dist:
+                continue
+            for distance, key in self.fuzzy.search(token, limit_dist):
+                closeness = 1 - distance / max(len(token), len(key))
+                for cid, kind in self.keys[key].items():
+                    hit(cid, KEY_WEIGHTS[kind] * closeness, f"fuzzy_{kind}")
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1][0], self.names[item[0]]))
+        return [
+            {"name": self.names[cid], "score": round(score, 3), "via": via}
+            for cid, (score, via) in ranked[:limit]
+        ]
+
+    def resolve(self, text, min_score=MIN_SCORE):
+        """The one candidate text refers to, or None if nothing fits or it's ambiguous."""
+        matches = self.match(text, limit=2)
+        if not matches or matches[0]["score"] < min_score:
+            return None
+        if len(matches) > 1 and matches[1]["score"] == matches[0]["score"]:
+            return None
+        return matches[0]["name"]
@@ -0,0 +1,13 @@
+# prompts.py
+
+# The one-click buttons in ballotbot.py; also what the server warms up
+SUGGESTED_PROMPTS = [
+    "What is said about housing?",
+    "How do candidates view the economy?",
+    "What are the views on education?",
+    "What do candidates say about health?",
+    "What are the views on taxation?",
+    "Who supports GST?",
+    "What do they think about government reform?",
+    "What is said about transport?"
+]
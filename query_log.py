@@ -0,0 +1,185 @@
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import atexit
+import argparse
+import threading
+from collections import Counter, deque
+from datetime import datetime
+
+# --- Settings ---
+LOG_PATH = os.getenv("QUERY_LOG_PATH", "query_log.ndjson")
+LEGACY_LOG_PATH = "query_log.json"
+MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+ROTATE_SECONDS = int(os.getenv("QUERY_LOG_ROTATE_SECONDS", str(24 * 60 * 60)))
+BACKUPS = int(os.getenv("QUERY_LOG_BACKUPS", "7"))
+BUFFER_SIZE = int(os.getenv("QUERY_LOG_BUFFER", "10000"))
+
+
+class QueryLogger:
+    """Appends log entries as NDJSON lines from a background thread.
+
+    log() never touches the disk: it drops the entry on a bounded queue and
+    returns. Each batch is written with a single O_APPEND write, so lines from
+    several workers don't interleave.
+    """
+
+    def __init__(self, path=LOG_PATH, max_bytes=MAX_BYTES, rotate_seconds=ROTATE_SECONDS,
+                 backups=BACKUPS, buffer_size=BUFFER_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        self.thread = None
+        self.lock = threading.Lock()
+        self.opened_at = time.time()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="query-log", daemon=True)
+                self.thread.start()
+                atexit.register(self.close)
+
+    def log(self, entry):
+        self.start()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=5):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            entries = [e for e in batch if e is not None]
+            if entries:
+                try:
+                    self._write(entries)
+                except Exception as e:
+                    print(f"⚠️ Logging to file failed: {e}")
+            if stop:
+                return
+
+    def _write(self, entries):
+        self._maybe_rotate()
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries).encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def _maybe_rotate(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        too_big = self.max_bytes and size >= self.max_bytes
+        too_old = self.rotate_seconds and time.time() - self.opened_at >= self.rotate_seconds
+        if not (too_big or too_old):
+            return
+
+        self.opened_at = time.time()
+        root, ext = os.path.splitext(self.path)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        try:
+            os.rename(self.path, f"{root}.{stamp}{ext}")
+        except OSError:
+            return  # another worker rotated first
+        for old in rotated_files(self.path)[:-self.backups or None]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+query_logger = QueryLogger()
+
+
+# --- Reading ---
+def rotated_files(path=LOG_PATH):
+    root, ext = os.path.splitext(path)
+    return sorted(glob.glob(f"{root}.*{ext}"))
+
+
+def iter_log_entries(path=LOG_PATH, include_rotated=True):
+    """Yield entries oldest first, including the legacy query_log.json."""
+    if os.path.exists(LEGACY_LOG_PATH):
+        try:
+            with open(LEGACY_LOG_PATH, "r") as f:
+                yield from reversed(json.load(f))
+        except json.JSONDecodeError:
+            print("⚠️ query_log.json is corrupt. Skipping it.")
+
+    files = (rotated_files(path) if include_rotated else []) + [path]
+    for file_path in files:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def tail(n=20, path=LOG_PATH):
+    return list(deque(iter_log_entries(path), maxlen=n))
+
+
+def aggregate(entries, top=10):
+    by_type, by_topic, by_query = Counter(), Counter(), Counter()
+    total = 0
+    for entry in entries:
+        total += 1
+        by_type[entry.get("type", "unknown")] += 1
+        by_topic[entry.get("topic", "unknown")] += 1
+        by_query[entry.get("query", "").strip().lower()] += 1
+    return {
+        "total": total,
+        "by_type": dict(by_type.most_common()),
+        "by_topic": dict(by_topic.most_common()),
+        "top_queries": by_query.most_common(top),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the BallotBot query log")
+    parser.add_argument("--path", default=LOG_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    tail_parser = sub.add_parser("tail", help="Show the most recent entries")
+    tail_parser.add_argument("-n", type=int, default=20)
+    stats_parser = sub.add_parser("stats", help="Aggregate counts by type, topic and query")
+    stats_parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "tail":
+        for entry in tail(args.n, args.path):
+            print(json.dumps(entry, ensure_ascii=False))
+    else:
+        print(json.dumps(aggregate(iter_log_entries(args.path), args.top), indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
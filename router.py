@@ -0,0 +1,334 @@
+import re
+import time
+import threading
+
+# --- Query cleaning ---
+QUERY_TRANSLATION = str.maketrans({
+    "’": "'",  # curly apostrophe
+    "‘": "'",  # opening curly apostrophe
+    "“": '"',  # curly quotes
+    "”": '"',
+    "–": "-",  # en and em dashes
+    "—": "-",
+})
+NON_WORD = re.compile(r"[^\w\s'\-]")  # keep hyphens and apostrophes
+
+
+def clean_query(query):
+    cleaned_query = query.lower()
+    if not cleaned_query.isascii():
+        cleaned_query = cleaned_query.translate(QUERY_TRANSLATION)
+    cleaned_query = NON_WORD.sub("", cleaned_query)
+    return cleaned_query.replace(" the ", " ")  # normalize 'the'
+
+
+def normalize_topic(topic):
+    topic = topic.lower().strip()
+    return topic[4:] if topic.startswith("the ") else topic
+
+
+# --- Intent table ---
+# Earlier intents win: explicit phrasings ("where does X stand on Y") sit
+# above the bare "X on Y" form, which would otherwise swallow them. Between
+# "^"-anchored and "new_run" intents the table is searched as one
+# alternation, where the match earliest in the query wins and table order
+# breaks ties. "topic" names
+# where the topic slot comes from: a group, or "query" for the whole cleaned
+# query. topic_mode is "detect" (alias detection, None if nothing matches),
+# "detect_or_raw" (fall back to the group's text), "detect_or_fuzzy" (fall
+# back to the closest topic by spelling) or "raw" (the group's text as-is).
+SUMMARY_PHRASES = [
+    "what do candidates say", "how do candidates view",
+    "what are the candidates", "what is said about",
+    "what are the views on", "tell me about", "views on", "tell me candidates' thoughts",
+    "summary of", "what do they think", "what do they believe", "what are the candidates' plans",
+    "what is their position", "what do they say", "how do they feel about", "what are candidates' ideas"
+]
+
+INTENTS = [
+    {
+        "name": "stance",
+        "pattern": (
+            r"\b(?:who|which candidates)\b\s+(?P<stance>"
+            r"supports?|opposes?|opposed\s+to|in\s+favour\s+of|backs?|rejects?|wants?|favours?|"
+            r"are\s+against|are\s+for|is\s+against|is\s+for|stands\s+(?:against|for)|"
+            r"don't\s+support|do\s+not\s+support|disagree\s+with|doesn't\s+agree\s+with"
+            r")\s+(?P<topic>.*)"
+        ),
+        "topic": "topic",
+        "topic_mode": "detect",
+    },
+    {
+        "name": "low_mention",
+        "pattern": r"(?:which|who)\s+(?:candidates\s+)?(?:don'?t|do not|rarely|barely|seldom).*?(?:talk|mention|say).*?\b(?:about|on)?\b\s+(?P<topic>.+)",
+        "topic": "topic",
+        "topic_mode": "detect_or_raw",
+    },
+    {
+        # "which candidates mention housing fewer than 3 times"
+        "name": "low_mention",
+        "pattern": r"(?:which|who)\s+(?:candidates\s+)?(?:talks?\s+about|mentions?|says?\s+about)\s+(?P<topic>.+?)\s+(?:fewer|less)\s+than\s+(?P<threshold>\d+)(?:\s+times)?$",
+        "topic": "topic",
+        "topic_mode": "detect_or_raw",
+    },
+    {
+        "name": "mention_rank",
+        "pattern": r"(?:which|who)\s+(?:candidates?\s+)?(?:talks?|mentions?|says?|speaks?|writes?)\s+(?:the\s+)?(?P<order>most|least)\s+(?:about\s+|on\s+)?(?P<topic>.+)",
+        "topic": "topic",
+        "topic_mode": "detect_or_raw",
+    },
+    {
+        # "who mentions housing the most"
+        "name": "mention_rank",
+        "pattern": r"(?:which|who)\s+(?:candidates?\s+)?(?:talks?\s+about|mentions?|says?\s+about)\s+(?P<topic>.+?)\s+(?:the\s+)?(?P<order>most|least)$",
+        "topic": "topic",
+        "topic_mode": "detect_or_raw",
+    },
+    {
+        # "bottom 25% on housing"; clean_query has already dropped the "%"
+        "name": "mention_percentile",
+        "pattern": r"\b(?P<end>top|bottom)\s+(?P<percent>\d+)(?:\s*percent)?\s+(?:of\s+candidates\s+)?(?:on|for|about|in)\s+(?P<topic>.+)",
+        "topic": "topic",
+        "topic_mode": "detect_or_raw",
+    },
+    {
+        "name": "topic_summary",
+        "pattern": "|".join(re.escape(phrase) for phrase in SUMMARY_PHRASES),
+        # Broad phrases can come before the specific forms above ("tell me about who supports GST")
+        "new_run": True,
+        "topic": "query",
+        "topic_mode": "detect",
+    },
+    {
+        "name": "candidate_say_about",
+        "pattern": r"what does(?P<candidate>.*?)say about(?P<topic>.*)",
+        "topic": "topic",
+        "topic_mode": "raw",
+    },
+    {
+        "name": "candidate_topic",
+        "pattern": r"(?:what does|where does|tell me what)\s+(?P<candidate>[\w\s\-']+?)\s+(?:say|think|stand).*?\b(?:on|about)?\b\s+(?P<topic>[\w\s\-']+)",
+        "topic": "topic",
+        "topic_mode": "detect_or_fuzzy",
+    },
+    {
+        "name": "candidate_short_form",
+        "pattern": r"^(?P<candidate>[\w\s\-']+?)\s+on\s+(?P<topic>[\w\s\-']+)$",
+        "topic": "topic",
+        "topic_mode": "detect_or_fuzzy",
+    },
+    {
+        # Last, so "what does X say about healthcare coverage" stays a topic question
+        "name": "coverage",
+        "pattern": r"\bheat\s*map\b|\bcoverage\s+(?:matrix|table|heat\s*map)\b|^(?:topic\s+)?coverage$",
+    },
+]
+FALLBACK_INTENT = {"name": "fallback", "topic": "query", "topic_mode": "detect"}
+
+
+class Intent:
+    """A routed query: intent name, extracted slots and time spent routing."""
+
+    __slots__ = ("name", "query", "cleaned", "slots", "elapsed")
+
+    def __init__(self, name, query, cleaned, slots, elapsed):
+        self.name = name
+        self.query = query
+        self.cleaned = cleaned
+        self.slots = slots
+        self.elapsed = elapsed
+
+    @property
+    def topic(self):
+        return self.slots.get("topic")
+
+    @property
+    def candidate(self):
+        return self.slots.get("candidate")
+
+    @property
+    def stance(self):
+        return self.slots.get("stance")
+
+    def __repr__(self):
+        return f"Intent({self.name!r}, {self.slots!r})"
+
+
+GROUP_NAME = re.compile(r"\(\?P<(\w+)>")
+
+
+def _first_chars(items):
+    """(chars a match of parsed items can start with, whether it can be empty); chars is None if unknown."""
+    chars = set()
+    for op, av in items:
+        name = str(op)
+        if name == "LITERAL":
+            return chars | {chr(av)}, False
+        if name == "IN":
+            for kind, value in av:
+                if str(kind) == "LITERAL":
+                    chars.add(chr(value))
+                elif str(kind) == "RANGE" and value[1] - value[0] < 64:
+                    chars.update(chr(c) for c in range(value[0], value[1] + 1))
+                else:
+                    return None, False
+            return chars, False
+        if name in ("AT", "ASSERT", "ASSERT_NOT"):
+            continue  # zero-width
+        if name == "SUBPATTERN":
+            branches, repeat_min = [av[-1]], 1
+        elif name == "BRANCH":
+            branches, repeat_min = av[1], 1
+        elif name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"):
+            branches, repeat_min = [av[2]], av[0]
+        else:
+            return None, False
+        nullable = repeat_min == 0
+        for branch in branches:
+            first, empty = _first_chars(branch)
+            if first is None:
+                return None, False
+            chars |= first
+            nullable = nullable or empty
+        if not nullable:
+            return chars, False
+    return chars, True
+
+
+def first_chars(pattern):
+    """The characters every match of pattern starts with, or None if they can't be worked out."""
+    try:
+        from re import _parser as sre_parse
+    except ImportError:
+        import sre_parse
+    try:
+        parsed = sre_parse.parse(pattern)
+        if parsed.state.flags & re.IGNORECASE:
+            return None
+        chars, empty = _first_chars(parsed)
+    except Exception:
+        return None
+    return None if empty or not chars else chars
+
+
+def combine_intents(intents):
+    """[(pattern, {group index: (intent, [(slot, group index)])})], one per run of intents.
+
+    Each run is one alternation with a named group per intent, so a run is a
+    single search: the intent matching earliest in the query wins, then the
+    one earliest in the table. That equals trying the run's patterns in
+    order unless a later intent matches left of an earlier one, which an
+    intent anchored at the start ("^") always can; so each anchored intent
+    is a run of its own, and any marked "new_run" starts one. Group names are prefixed per intent, since the same
+    slot (e.g. "topic") appears in several.
+    """
+    runs, closed = [], True
+    for i, intent in enumerate(intents):
+        anchored = intent["pattern"].startswith("^")
+        if closed or anchored or intent.get("new_run"):
+            runs.append([])
+        runs[-1].append((i, intent))
+        # Nothing joins an anchored intent: it fails fast everywhere but the start on its own
+        closed = anchored
+
+    combined = []
+    for run in runs:
+        alternation = "|".join(
+            f"(?P<_i{i}>" + GROUP_NAME.sub(lambda m, i=i: f"(?P<_i{i}_{m.group(1)}>", intent["pattern"]) + ")"
+            for i, intent in run
+        )
+        # An alternation loses the literal-prefix scan each pattern gets alone;
+        # a lookahead on the characters any of them can start with restores it
+        firsts = [first_chars(intent["pattern"]) for _, intent in run]
+        if all(firsts):
+            chars = "".join(sorted(set().union(*firsts)))
+            alternation = f"(?=[{re.escape(chars)}])(?:{alternation})"
+        pattern = re.compile(alternation)
+        combined.append((pattern, {
+            pattern.groupindex[f"_i{i}"]: (intent, [(name, pattern.groupindex[f"_i{i}_{name}"]) for name in GROUP_NAME.findall(intent["pattern"])])
+            for i, intent in run
+        }))
+    return combined
+
+
+class Router:
+    """Matches a cleaned query against the intent table.
+
+    The table is compiled up front into a couple of alternations (see
+    combine_intents), one search each, and slots come straight from their
+    named groups; per-intent routing and handling times are kept in stats.
+    """
+
+    def __init__(self, intents=INTENTS, resolve_topic=None, fuzzy_topic=None, fallback=FALLBACK_INTENT):
+        self.runs = combine_intents(intents)
+        self.fallback = fallback
+        self.resolve_topic = resolve_topic
+        self.fuzzy_topic = fuzzy_topic
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def match(self, cleaned_query):
+        """(intent spec, raw groups) for the first matching intent, without slot resolution."""
+        for pattern, intents in self.runs:
+            m = pattern.search(cleaned_query)
+            if m is not None:
+                # The intent's own wrapper group closes last
+                spec, slots = intents[m.lastindex]
+                return spec, {name: m.group(index) for name, index in slots}
+        return self.fallback, {}
+
+    def _topic_slot(self, spec, groups, cleaned_query):
+        source = spec.get("topic")
+        if source is None:
+            return None
+        text = cleaned_query if source == "query" else (groups.get(source) or "").strip()
+        mode = spec.get("topic_mode", "detect")
+        if mode == "raw" or self.resolve_topic is None:
+            topic = text
+        else:
+            topic = self.resolve_topic(text)
+            if topic is None and mode == "detect_or_raw":
+                topic = text
+            elif topic is None and mode == "detect_or_fuzzy" and self.fuzzy_topic is not None:
+                topic = self.fuzzy_topic(text)
+        return normalize_topic(topic) if topic else topic
+
+    def route(self, query):
+        start = time.perf_counter()
+        cleaned_query = clean_query(query)
+        spec, groups = self.match(cleaned_query)
+        slots = {name: value.strip() for name, value in groups.items() if name != "topic" and value is not None}
+        slots["topic"] = self._topic_slot(spec, groups, cleaned_query)
+        elapsed = time.perf_counter() - start
+        # The "route" stage histogram is left to the caller, which batches it
+        # with the handler's stage: one metrics lock per query, not one per step
+        self.record(spec["name"], route_seconds=elapsed)
+        return Intent(spec["name"], query, cleaned_query, slots, elapsed)
+
+    def record(self, name, route_seconds=0.0, handle_seconds=0.0):
+        # Counters are bumped without a lock: the GIL keeps each list update whole,
+        # and a rare lost increment only nudges a mean
+        stats = self.stats.get(name)
+        if stats is None:
+            with self.lock:
+                stats = self.stats.setdefault(name, [0, 0.0, 0, 0.0])
+        if route_seconds:
+            stats[0] += 1
+            stats[1] += route_seconds
+        if handle_seconds:
+            stats[2] += 1
+            stats[3] += handle_seconds
+
+    def snapshot(self):
+        """Per-intent counts and mean routing/handling time in microseconds."""
+        with self.lock:
+            stats = {name: list(s) for name, s in self.stats.items()}
+        return {
+            name: {
+                "routed": routed,
+                "route_us": round(route_s / routed * 1e6, 1) if routed else 0.0,
+                "handled": handled,
+                "handle_ms": round(handle_s / handled * 1e3, 1) if handled else 0.0,
+            }
+            for name, (routed, route_s, handled, handle_s) in stats.items()
+        }
@@ -0,0 +1,120 @@
+import os
+import time
+import uuid
+import threading
+
+# --- Settings ---
+SHARED = os.getenv("SINGLE_FLIGHT_SHARED", "").lower() in ("1", "true", "yes")
+LOCK_TTL = float(os.getenv("SINGLE_FLIGHT_LOCK_TTL", "120"))
+RESULT_TTL = float(os.getenv("SINGLE_FLIGHT_RESULT_TTL", "30"))
+POLL_SECONDS = float(os.getenv("SINGLE_FLIGHT_POLL_SECONDS", "0.25"))
+
+
+def flight_key(route, topic=None, candidate=None, detail=None):
+    """Normalised key for one unit of work, e.g. "candidate_topic|housing|sue aldwell"."""
+    parts = [route, topic or "", candidate or ""]
+    if detail:
+        parts.append(" ".join(sorted(detail)) if isinstance(detail, (list, tuple, set)) else str(detail))
+    return "|".join(" ".join(str(part).lower().split()) for part in parts)
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Run each key's work once while it is in flight; concurrent callers share the result.
+
+    Within a process, followers wait on the leader's Event. With a shared
+    CacheStore, the leader also takes a lock entry there (a conditional
+    insert, so only one worker wins); leaders in other workers poll that entry
+    and pick up the published result, which is kept for `result_ttl` seconds.
+    A lock whose owner died is taken over once `lock_ttl` has passed.
+    """
+
+    def __init__(self, store=None, lock_ttl=LOCK_TTL, result_ttl=RESULT_TTL, poll=POLL_SECONDS):
+        self.store = store
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll = poll
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.stats = {"leaders": 0, "coalesced": 0, "shared_hits": 0}
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.stats["leaders"] += 1
+            else:
+                call.waiters += 1
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn() if self.store is None else self._do_shared(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+            if call.waiters:
+                print(f"🪢 Coalesced {call.waiters} request(s) onto '{key}'")
+
+    def _acquire(self, key):
+        """Take the shared lock; returns ("result", value) if another worker already finished."""
+        while True:
+            now = time.time()
+            entry = self.store.get_entry(key)
+            claim = {"owner": self.owner, "expires": now + self.lock_ttl}
+            if entry is None:
+                version = self.store.set(key, claim, expected_version=0)
+            else:
+                value, version = entry
+                if value.get("expires", 0) > now:
+                    if value.get("done"):
+                        return "result", value["result"]
+                    time.sleep(self.poll)
+                    continue
+                version = self.store.set(key, claim, expected_version=version)
+            if version is not None:
+                return "lock", None
+
+    def _do_shared(self, key, fn):
+        state, value = self._acquire(key)
+        if state == "result":
+            with self.lock:
+                self.stats["shared_hits"] += 1
+            return value
+        try:
+            result = fn()
+        except Exception:
+            self.store.delete(key)
+            raise
+        self.store.set(key, {"owner": self.owner, "done": True, "result": result, "expires": time.time() + self.result_ttl})
+        return result
+
+
+def _shared_store():
+    if not SHARED:
+        return None
+    from cache_store import SQLiteCacheStore
+    return SQLiteCacheStore("single_flight")
+
+
+single_flight = SingleFlight(store=_shared_store())
@@ -0,0 +1,44 @@
+import os
+import json
+
+STANCE_TABLES_PATH = "stance_tables.json"
+LEGACY_STANCE_FILES = {"gst": "stance_cache_gst.json"}
+STANCES = ("SUPPORT", "OPPOSE", "NEUTRAL")
+
+NEGATIVE_STANCE_WORDS = ("oppose", "against", "reject", "don't support", "do not support", "disagree", "doesn't agree")
+
+
+def index_stances(entries):
+    """Group a flat list of {name, stance, reason, url} by stance."""
+    table = {stance: [] for stance in STANCES}
+    for entry in entries:
+        stance = entry.get("stance", "NEUTRAL").upper()
+        if stance == "NO CLEAR STANCE":
+            stance = "NEUTRAL"
+        table.setdefault(stance, []).append(entry)
+    return table
+
+
+def load_stance_tables(path=STANCE_TABLES_PATH):
+    """{topic: {stance: [entries]}}, filling gaps from legacy per-topic files."""
+    tables = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            tables = json.load(f)
+    for topic, legacy_path in LEGACY_STANCE_FILES.items():
+        if topic not in tables and os.path.exists(legacy_path):
+            with open(legacy_path, "r") as f:
+                tables[topic] = index_stances(json.load(f))
+    return tables
+
+
+def stance_polarity(stance_keyword):
+    keyword = stance_keyword.lower()
+    return "OPPOSE" if any(word in keyword for word in NEGATIVE_STANCE_WORDS) else "SUPPORT"
+
+
+def stance_groups(table, stance_keyword):
+    """(primary, alternate) candidate lists for a "who supports/opposes" query."""
+    wanted = stance_polarity(stance_keyword)
+    other = "SUPPORT" if wanted == "OPPOSE" else "OPPOSE"
+    return table.get(wanted, []), table.get(other, [])
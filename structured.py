@@ -0,0 +1,130 @@
+import json
+from llm_pool import complete_chat
+
+
+class StructuredOutputError(ValueError):
+    """A reply, or one item of it, that doesn't fit the schema."""
+
+
+# --- Schemas ---
+def items_tool(name, description, item_schema):
+    """A function tool whose only argument is an "items" array of item_schema records."""
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {
+                "type": "object",
+                "properties": {"items": {"type": "array", "items": item_schema}},
+                "required": ["items"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def validate(value, schema, path="item"):
+    """value checked against a small JSON-schema subset (object/array/string/number/
+    integer/boolean, required, enum, additionalProperties); returns it with
+    enum strings normalised to the schema's spelling."""
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(value, dict):
+            raise StructuredOutputError(f"{path}: expected an object")
+        properties = schema.get("properties", {})
+        for field in schema.get("required", []):
+            if field not in value:
+                raise StructuredOutputError(f"{path}: missing {field!r}")
+        extra = set(value) - set(properties)
+        if extra and schema.get("additionalProperties") is False:
+            raise StructuredOutputError(f"{path}: unexpected {sorted(extra)}")
+        return {
+            field: validate(item, properties[field], f"{path}.{field}") if field in properties else item
+            for field, item in value.items()
+        }
+    if kind == "array":
+        if not isinstance(value, list):
+            raise StructuredOutputError(f"{path}: expected an array")
+        return [validate(item, schema.get("items", {}), f"{path}[{i}]") for i, item in enumerate(value)]
+    if kind == "string":
+        if not isinstance(value, str):
+            raise StructuredOutputError(f"{path}: expected a string")
+        value = value.strip()
+        if "enum" in schema:
+            spelled = {option.upper(): option for option in schema["enum"]}
+            if value.upper() not in spelled:
+                raise StructuredOutputError(f"{path}: {value!r} not one of {schema['enum']}")
+            value = spelled[value.upper()]
+        return value
+    if kind in ("number", "integer"):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or (kind == "integer" and not isinstance(value, int)):
+            raise StructuredOutputError(f"{path}: expected {'an integer' if kind == 'integer' else 'a number'}")
+        return value
+    if kind == "boolean" and not isinstance(value, bool):
+        raise StructuredOutputError(f"{path}: expected a boolean")
+    return value
+
+
+# --- Calls ---
+def reply_items(response, tool_name):
+    """The raw "items" list from a tool-call reply (or a bare JSON reply)."""
+    message = response.choices[0].message
+    for call in message.tool_calls or []:
+        if call.function.name == tool_name:
+            arguments = call.function.arguments
+            break
+    else:
+        arguments = message.content or ""
+    try:
+        payload = json.loads(arguments)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise StructuredOutputError(f"reply is not JSON ({e})")
+    items = payload.get("items") if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        raise StructuredOutputError("reply has no items array")
+    return items
+
+
+def read_items(response, tool_name, item_schema):
+    """(records, errors) for one reply; see complete_items."""
+    try:
+        items = reply_items(response, tool_name)
+    except StructuredOutputError as e:
+        return [], [str(e)]
+
+    records, errors = [], []
+    for i, item in enumerate(items):
+        try:
+            records.append(validate(item, item_schema, f"items[{i}]"))
+        except StructuredOutputError as e:
+            errors.append(str(e))
+    return records, errors
+
+
+def complete_items(client, tool, messages, accept=None, **kwargs):
+    """(records, errors) from one forced tool call.
+
+    Each item is validated on its own, so one malformed record costs only
+    itself: records holds the items that passed, errors a message per item
+    that didn't (or one for the whole reply if it couldn't be read at all).
+    Only replies with no errors (and, given accept(records), that it
+    approves) are cached, so a malformed one is asked again next time
+    rather than served forever.
+    """
+    name = tool["function"]["name"]
+    item_schema = tool["function"]["parameters"]["properties"]["items"]["items"]
+
+    def cacheable(reply):
+        records, errors = read_items(reply, name, item_schema)
+        return not errors and (accept is None or accept(records))
+
+    response = complete_chat(
+        client,
+        messages=messages,
+        tools=[tool],
+        tool_choice={"type": "function", "function": {"name": name}},
+        accept=cacheable,
+        **kwargs,
+    )
+    return read_items(response, name, item_schema)
@@ -0,0 +1,140 @@
+"""Sub-topic clusters for topics with too many chunks to summarise at once.
+
+Built offline (build_corpus.py --stages subtopics, or `python subtopics.py`
+against an existing topic_chunks.json): each large topic's chunks are
+embedded and split with k-means, and every cluster keeps a label, its
+distinctive terms, its centroid and the indices of its chunks.
+"""
+import os
+import sys
+import json
+import numpy as np
+
+SUBTOPICS_PATH = "subtopics.json"
+MIN_TOPIC_CHUNKS = 40
+CHUNKS_PER_CLUSTER = 15
+LABEL_TERMS = 3
+
+
+def cluster_labels(texts, assignments, n_clusters, top_n=LABEL_TERMS):
+    """Distinctive TF-IDF terms per cluster: cluster mean minus topic mean."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = TfidfVectorizer(stop_words="english", max_features=5000, token_pattern=r"(?u)\b[a-zA-Z][a-zA-Z]+\b")
+    tfidf = vectorizer.fit_transform(texts)
+    terms = vectorizer.get_feature_names_out()
+    overall = np.asarray(tfidf.mean(axis=0)).ravel()
+    labels = []
+    for cluster in range(n_clusters):
+        rows = np.flatnonzero(assignments == cluster)
+        weight = np.asarray(tfidf[rows].mean(axis=0)).ravel() - overall
+        labels.append([terms[i] for i in np.argsort(-weight)[:top_n]])
+    return labels
+
+
+def cluster_topic(texts, vectors, per_cluster=CHUNKS_PER_CLUSTER, seed=0):
+    """Split one topic's chunks into k-means clusters of roughly per_cluster chunks."""
+    from sklearn.cluster import KMeans
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    n_clusters = max(2, min(len(texts), round(len(texts) / per_cluster)))
+    kmeans = KMeans(n_clusters=n_clusters, n_init=10, random_state=seed).fit(vectors)
+    terms = cluster_labels(texts, kmeans.labels_, n_clusters)
+
+    clusters = []
+    for cluster in range(n_clusters):
+        members = np.flatnonzero(kmeans.labels_ == cluster)
+        if not len(members):
+            continue
+        centroid = kmeans.cluster_centers_[cluster]
+        centroid = centroid / max(np.linalg.norm(centroid), 1e-12)
+        clusters.append({
+            "label": " / ".join(terms[cluster]),
+            "terms": terms[cluster],
+            "centroid": [round(float(x), 6) for x in centroid],
+            "chunks": [int(i) for i in members],
+        })
+    return clusters
+
+
+def build_subtopics(topic_chunks, topic_vectors, min_chunks=MIN_TOPIC_CHUNKS, per_cluster=CHUNKS_PER_CLUSTER):
+    """{topic: [cluster]} for every topic with more than min_chunks chunks.
+
+    topic_vectors maps topic -> one embedding per chunk, in chunk order.
+    """
+    subtopics = {}
+    for topic, chunks in topic_chunks.items():
+        if len(chunks) <= min_chunks or topic not in topic_vectors:
+            continue
+        subtopics[topic] = cluster_topic([chunk["text"] for chunk in chunks], topic_vectors[topic], per_cluster)
+        print(f"🧩 {topic}: {len(chunks)} chunks -> {len(subtopics[topic])} sub-topics")
+    return subtopics
+
+
+class SubtopicIndex:
+    """Nearest sub-topic clusters for a query, by centroid similarity or label terms."""
+
+    def __init__(self, data):
+        self.clusters = data
+        self.centroids = {
+            topic: np.asarray([c["centroid"] for c in clusters], dtype=np.float32)
+            for topic, clusters in data.items()
+        }
+
+    def __contains__(self, topic):
+        return topic in self.clusters
+
+    def covers(self, topic, chunk_count):
+        """True if topic was clustered over exactly chunk_count chunks (i.e. isn't stale)."""
+        return topic in self.clusters and sum(len(c["chunks"]) for c in self.clusters[topic]) == chunk_count
+
+    def _take(self, topic, order, max_chunks):
+        picked, count = [], 0
+        for i in order:
+            cluster = self.clusters[topic][i]
+            if picked and count + len(cluster["chunks"]) > max_chunks:
+                break
+            picked.append(cluster)
+            count += len(cluster["chunks"])
+        return picked
+
+    def nearest(self, topic, query_vec, max_chunks=20):
+        """Closest clusters first, as many as fit in max_chunks (at least one)."""
+        query_vec = np.asarray(query_vec, dtype=np.float32).ravel()
+        query_vec = query_vec / max(np.linalg.norm(query_vec), 1e-12)
+        scores = self.centroids[topic] @ query_vec
+        return self._take(topic, np.argsort(-scores), max_chunks)
+
+    def by_terms(self, topic, keywords, max_chunks=20):
+        """Clusters whose label terms share a word with the query, best overlap first."""
+        keywords = {k.lower() for k in keywords}
+        overlaps = [len(keywords & set(c["terms"])) for c in self.clusters[topic]]
+        order = [i for i in np.argsort([-o for o in overlaps], kind="stable") if overlaps[i]]
+        return self._take(topic, order, max_chunks)
+
+
+def load_subtopics(path=SUBTOPICS_PATH):
+    if not os.path.exists(path):
+        return SubtopicIndex({})
+    with open(path, "r") as f:
+        return SubtopicIndex(json.load(f))
+
+
+if __name__ == "__main__":
+    from artefacts import get_client
+    from vector_index import embed_texts
+
+    source = sys.argv[1] if len(sys.argv) > 1 else "topic_chunks.json"
+    with open(source, "r") as f:
+        chunks_by_topic = json.load(f)
+    client = get_client()
+    vectors_by_topic = {
+        topic: np.concatenate([embed_texts(client, [c["text"] for c in chunks[i:i + 100]]) for i in range(0, len(chunks), 100)])
+        for topic, chunks in chunks_by_topic.items() if len(chunks) > MIN_TOPIC_CHUNKS
+    }
+    built = build_subtopics(chunks_by_topic, vectors_by_topic)
+    with open(f"{SUBTOPICS_PATH}.tmp", "w") as f:
+        json.dump(built, f)
+    os.replace(f"{SUBTOPICS_PATH}.tmp", SUBTOPICS_PATH)
+    print(f"✅ Clustered {len(built)} topics -> {SUBTOPICS_PATH}")
@@ -0,0 +1,153 @@
+import os
+import math
+
+# --- Budget settings ---
+# Context windows of the models we call; LLM_CONTEXT_TOKENS overrides for anything else
+MODEL_CONTEXT = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT = 8192
+CONTEXT_OVERRIDE = os.getenv("LLM_CONTEXT_TOKENS")
+# Headroom for tokenizer disagreement and chat-format framing
+SAFETY_MARGIN = float(os.getenv("LLM_TOKEN_SAFETY_MARGIN", "0.1"))
+MESSAGE_OVERHEAD = 4  # tokens the chat format adds around each message
+
+_tokenizer = None
+_encodings = {}
+
+
+# --- Token counting ---
+def heuristic_tokens(text):
+    """Local estimate: ~4 characters or ~0.75 words per token, whichever is larger."""
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), math.ceil(len(text.split()) * 4 / 3))
+
+
+def _tiktoken_counter(model):
+    encoding = _encodings.get(model)
+    if encoding is None:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        _encodings[model] = encoding
+    return lambda text: len(encoding.encode(text or "", disallowed_special=()))
+
+
+def set_tokenizer(count):
+    """Use count(text) -> int for every estimate; None goes back to the default."""
+    global _tokenizer
+    _tokenizer = count
+
+
+def get_token_counter(model="gpt-4"):
+    """count(text) -> tokens: the registered tokenizer, tiktoken if installed, else the heuristic."""
+    if _tokenizer is not None:
+        return _tokenizer
+    try:
+        return _tiktoken_counter(model)
+    except ImportError:
+        return heuristic_tokens
+
+
+def count_message_tokens(messages, count):
+    return sum(count(message["content"]) + MESSAGE_OVERHEAD for message in messages) + 3
+
+
+def truncate_to_tokens(text, max_tokens, count):
+    """text cut at a word boundary so that count(text) <= max_tokens."""
+    if count(text) <= max_tokens:
+        return text
+    while text and count(text) > max_tokens:
+        keep = max(1, int(len(text) * max_tokens / count(text) * 0.95))
+        text = text[:keep].rsplit(" ", 1)[0] if " " in text[:keep] else text[:keep]
+    return text
+
+
+def context_tokens(model):
+    if CONTEXT_OVERRIDE:
+        return int(CONTEXT_OVERRIDE)
+    return MODEL_CONTEXT.get(model, DEFAULT_CONTEXT)
+
+
+def input_budget(model, prompt_tokens, max_output_tokens):
+    """Tokens left for batch items once the fixed prompt and the reply are reserved."""
+    usable = int(context_tokens(model) * (1 - SAFETY_MARGIN))
+    return max(0, usable - prompt_tokens - max_output_tokens)
+
+
+# --- Packing ---
+def pack_batches(items, sizes, capacity, max_items=None):
+    """Group items into as few batches as fit capacity tokens and max_items each.
+
+    First-fit decreasing over sizes (one token count per item); every batch
+    keeps its items in their original order and batches are ordered by
+    their first item, so output reads in input order. An item larger than
+    capacity gets a batch of its own.
+    """
+    order = sorted(range(len(items)), key=lambda i: -sizes[i])
+    bins = []  # [used tokens, [indices]]
+    for i in order:
+        for entry in bins:
+            if entry[0] + sizes[i] <= capacity and (max_items is None or len(entry[1]) < max_items):
+                entry[0] += sizes[i]
+                entry[1].append(i)
+                break
+        else:
+            bins.append([sizes[i], [i]])
+
+    groups = sorted((sorted(indices) for _, indices in bins), key=lambda indices: indices[0])
+    return [[items[i] for i in indices] for indices in groups]
+
+
+def packing_report(batches, sizes_by_batch, capacity, max_items=None):
+    """Calls, items and how full the batches are, by input tokens and by item slots."""
+    calls = len(batches)
+    items = sum(len(batch) for batch in batches)
+    used = sum(sum(sizes) for sizes in sizes_by_batch)
+    report = {
+        "calls": calls,
+        "items": items,
+        "tokens": used,
+        "capacity": capacity,
+        "token_fill": round(used / (calls * capacity), 3) if calls and capacity else 0.0,
+    }
+    if max_items:
+        report["slot_fill"] = round(items / (calls * max_items), 3) if calls else 0.0
+    return report
+
+
+def plan_batches(items, render, prompt_messages, model="gpt-4", max_output_tokens=800,
+                 output_tokens_per_item=None, max_items=None, shrink=None, count=None):
+    """(batches, report) for items sent as render(item) blocks after prompt_messages.
+
+    The input side is bounded by the model's context minus the fixed prompt
+    and max_output_tokens; with output_tokens_per_item, a batch also holds
+    no more items than the reply can cover. shrink(item, max_tokens, count),
+    if given, cuts down any item too big for a batch on its own.
+    """
+    count = count or get_token_counter(model)
+    prompt_tokens = count_message_tokens(prompt_messages, count)
+    capacity = input_budget(model, prompt_tokens, max_output_tokens)
+    if output_tokens_per_item:
+        per_reply = max(1, max_output_tokens // output_tokens_per_item)
+        max_items = per_reply if max_items is None else min(max_items, per_reply)
+
+    items = list(items)
+    sizes = [count(render(item)) for item in items]
+    oversized = [i for i, size in enumerate(sizes) if size > capacity]
+    if shrink is not None:
+        for i in oversized:
+            items[i] = shrink(items[i], capacity, count)
+            sizes[i] = count(render(items[i]))
+    batches = pack_batches(list(range(len(items))), sizes, capacity, max_items)
+    report = packing_report(batches, [[sizes[i] for i in batch] for batch in batches], capacity, max_items)
+    report["oversized"] = len(oversized)
+    return [[items[i] for i in batch] for batch in batches], report
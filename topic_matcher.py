@@ -0,0 +1,144 @@
+import re
+from topics import aliases as default_aliases
+
+# Topic-name substring hits are weaker evidence than an alias hit
+NAME_MATCH_WEIGHT = 0.5
+
+
+def _is_word_char(ch):
+    # Same definition as re's \w for str patterns
+    return ch.isalnum() or ch == "_"
+
+
+def _boundary_inside(text, i):
+    """Whether re's \b matches between text[i - 1] and text[i]."""
+    return _is_word_char(text[i - 1]) != _is_word_char(text[i])
+
+
+def _alternation(aliases):
+    """One regex matching any alias, longest first, with shared prefixes factored out.
+
+    Factoring keeps re from retrying every alias at every position; each
+    optional tail is greedy, so a longer alias wins and a shorter one is
+    still tried if the longer fails its trailing \b.
+    """
+    trie = {}
+    for alias in aliases:
+        node = trie
+        for ch in alias:
+            node = node.setdefault(ch, {})
+        node[None] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items(), key=lambda item: item[0] or "") if ch is not None]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + body + ")?" if None in node else body
+
+    return build(trie)
+
+
+class TopicMatcher:
+    """Matches every alias of every topic in a single pass over the query.
+
+    All aliases are compiled once into one ``\b``-bounded alternation,
+    longest first, inside a lookahead so matches may overlap. Each hit
+    also reports the shorter aliases that are prefixes of it ending on a
+    word boundary, so overlapping aliases are all reported, as with the
+    per-alias regexes it replaces.
+    """
+
+    def __init__(self, aliases):
+        self.topics = list(aliases)
+        self.topic_order = {topic: i for i, topic in enumerate(self.topics)}
+        self.topics_by_alias = {}
+        for topic, alias_list in aliases.items():
+            for alias in alias_list:
+                if alias:
+                    self.topics_by_alias.setdefault(alias.lower(), set()).add(topic)
+        self.alias_count = sum(len(alias_list) for alias_list in aliases.values())
+
+        self.pattern = re.compile(r"\b(?=(" + _alternation(self.topics_by_alias) + r")\b)") if self.topics_by_alias else None
+        self.prefixes = {
+            alias: [alias[:i] for i in range(1, len(alias)) if alias[:i] in self.topics_by_alias and _boundary_inside(alias, i)]
+            for alias in self.topics_by_alias
+        }
+
+    def _alias_hits(self, text):
+        hits = []
+        if self.pattern is None:
+            return hits
+        for m in self.pattern.finditer(text):
+            start = m.start()
+            longest = m.group(1)
+            for alias in [longest] + self.prefixes[longest]:
+                for topic in self.topics_by_alias[alias]:
+                    hits.append((topic, start, start + len(alias)))
+        return hits
+
+    def _name_hits(self, text):
+        hits = []
+        for topic in self.topics:
+            start = text.find(topic.lower())
+            if start != -1:
+                hits.append((topic, start, start + len(topic)))
+        return hits
+
+    def alias_topics(self, text):
+        """Topics with at least one whole-word alias hit in text."""
+        return {topic for topic, _, _ in self._alias_hits(text.lower())}
+
+    def match(self, query):
+        """All matched topics, best first, each with its spans and a score.
+
+        Spans index into the lower-cased, stripped query. Topic names are only
+        tried as plain substrings when no alias matched, as before.
+        """
+        text = query.lower().strip()
+        hits = self._alias_hits(text)
+        weight = 1.0
+        if not hits:
+            hits = self._name_hits(text)
+            weight = NAME_MATCH_WEIGHT
+
+        spans = {}
+        for topic, start, end in hits:
+            spans.setdefault(topic, set()).add((start, end))
+
+        results = []
+        for topic, topic_spans in spans.items():
+            covered = set()
+            for start, end in topic_spans:
+                covered.update(range(start, end))
+            results.append({
+                "topic": topic,
+                "spans": [
+                    {"start": start, "end": end, "text": text[start:end]}
+                    for start, end in sorted(topic_spans)
+                ],
+                "score": round(weight * len(covered) / max(len(text), 1), 4),
+            })
+
+        results.sort(key=lambda r: (-r["score"], self.topic_order[r["topic"]]))
+        return results
+
+    def detect(self, query):
+        """First matching topic in alias-table order, or None."""
+        # Same answer as match(), without building spans and scores
+        text = query.lower().strip()
+        hits = self._alias_hits(text) or self._name_hits(text)
+        if not hits:
+            return None
+        return min((topic for topic, _, _ in hits), key=self.topic_order.__getitem__)
+
+
+_matchers = {}
+
+def get_topic_matcher(aliases=default_aliases):
+    # Keep a reference to the table so its id can't be reused
+    cached = _matchers.get(id(aliases))
+    if cached is None or cached[0] is not aliases:
+        cached = (aliases, TopicMatcher(aliases))
+        _matchers[id(aliases)] = cached
+    return cached[1]
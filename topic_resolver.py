@@ -0,0 +1,81 @@
+import re
+from collections import defaultdict
+from topics import aliases as default_aliases
+
+MIN_SCORE = 0.35
+# An alias shared by several topics shouldn't tie with a topic's own name
+ALIAS_WEIGHT = 0.98
+
+
+def trigrams(text):
+    """Character trigrams of each word, padded so short words still count."""
+    grams = set()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TopicResolver:
+    """Fuzzy topic lookup over topic keys and their aliases together.
+
+    Each key and alias is stored as a set of word trigrams behind an
+    inverted index, so a lookup only touches labels that share a trigram
+    with the text. A label scores by how much of it the text covers,
+    blended with the Dice overlap so that near-exact labels rank first;
+    a topic's score is its best label's.
+    """
+
+    def __init__(self, topics, aliases=default_aliases):
+        self.topics = list(topics)
+        self.labels = []  # (label text, topic, trigram count, weight)
+        self.postings = defaultdict(list)
+        for topic in self.topics:
+            for label in [topic] + [a for a in aliases.get(topic, []) if a.lower() != topic.lower()]:
+                grams = trigrams(label)
+                if not grams:
+                    continue
+                label_id = len(self.labels)
+                weight = 1.0 if label == topic else ALIAS_WEIGHT
+                self.labels.append((label, topic, len(grams), weight))
+                for gram in grams:
+                    self.postings[gram].append(label_id)
+
+    def top_k(self, text, k=5):
+        """[(topic, score)] best first, scores in 0..1."""
+        grams = trigrams(text)
+        if not grams:
+            return []
+        shared = defaultdict(int)
+        for gram in grams:
+            for label_id in self.postings.get(gram, ()):
+                shared[label_id] += 1
+
+        best = {}
+        for label_id, overlap in shared.items():
+            _, topic, size, weight = self.labels[label_id]
+            coverage = overlap / size
+            dice = 2 * overlap / (size + len(grams))
+            score = weight * (0.7 * coverage + 0.3 * dice)
+            if score > best.get(topic, 0.0):
+                best[topic] = score
+        ranked = sorted(best.items(), key=lambda item: -item[1])
+        return [(topic, round(score, 3)) for topic, score in ranked[:k]]
+
+    def resolve(self, text, min_score=MIN_SCORE):
+        """Best topic for text, or None if nothing scores at least min_score."""
+        ranked = self.top_k(text, k=1)
+        if not ranked or ranked[0][1] < min_score:
+            return None
+        return ranked[0][0]
+
+
+_resolvers = {}
+
+def get_topic_resolver(topic_chunks, aliases=default_aliases):
+    """Resolver over topic_chunks' keys, rebuilt only when the key set changes."""
+    key = (tuple(topic_chunks), id(aliases))
+    resolver = _resolvers.get(key)
+    if resolver is None:
+        resolver = _resolvers[key] = TopicResolver(topic_chunks, aliases)
+    return resolver
@@ -0,0 +1,122 @@
+import os
+import json
+import numpy as np
+from topics import aliases
+
+EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_COLUMNS = ("embedding", "embeddings", "ada_embedding")
+
+
+def _as_vector(value):
+    # CSV fallback stores vectors as their string repr
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """Cosine-similarity index over the corpus embeddings.
+
+    Vectors are held as one contiguous float32 matrix, L2-normalised once at
+    build time, so a search is a single matrix-vector product. Row names and
+    texts, and the keyword filters, come from a CorpusStore over the same rows,
+    so the text is held once however many indexes read it.
+    """
+
+    def __init__(self, vectors, store, topic_aliases=None, normalized=False):
+        if normalized:
+            # Already unit-length (e.g. a memory-mapped .npy); use it in place
+            self.matrix = vectors
+        else:
+            matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+            self.matrix = np.ascontiguousarray(_normalize_rows(matrix))
+        if len(store) != self.matrix.shape[0]:
+            raise ValueError(f"{self.matrix.shape[0]} vectors for {len(store)} corpus rows")
+        self.store = store
+
+        self.topic_masks = {
+            topic: self.keyword_mask(keywords)
+            for topic, keywords in (topic_aliases or {}).items()
+        }
+
+    @classmethod
+    def from_dataframe(cls, df, topic_aliases=aliases):
+        from corpus_store import CorpusStore
+
+        column = next((c for c in EMBEDDING_COLUMNS if c in df.columns), None)
+        if column is None:
+            return None
+
+        rows = df[df[column].notna()]
+        vectors = np.stack([_as_vector(v) for v in rows[column]])
+        return cls(vectors, CorpusStore.from_dataframe(rows), topic_aliases)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def _mask(self, rows):
+        mask = np.zeros(len(self), dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def keyword_mask(self, keywords):
+        return self._mask(self.store.rows_with_any(keywords))
+
+    def row_mask(self, candidate=None, topic=None):
+        mask = np.ones(len(self), dtype=bool)
+        if candidate is not None:
+            mask &= self._mask(self.store.rows_for(candidate))
+        if topic is not None:
+            topic_mask = self.topic_masks.get(topic)
+            if topic_mask is None:
+                topic_mask = self.keyword_mask([topic])
+            mask &= topic_mask
+        return mask
+
+    def search(self, query_vec, k=10, candidate=None, topic=None):
+        """Top-k rows by cosine similarity.
+
+        Accepts a single vector or a 2-D batch of vectors; a batch returns one
+        result list per query.
+        """
+        queries = np.asarray(query_vec, dtype=np.float32)
+        single = queries.ndim == 1
+        queries = _normalize_rows(np.atleast_2d(queries))
+
+        if candidate is None and topic is None:
+            rows = None
+            scores = queries @ self.matrix.T
+        else:
+            rows = np.flatnonzero(self.row_mask(candidate, topic))
+            scores = queries @ self.matrix[rows].T
+
+        k = min(k, scores.shape[1])
+        results = []
+        for row_scores in scores:
+            if k == 0:
+                results.append([])
+                continue
+            top = np.argpartition(-row_scores, k - 1)[:k]
+            top = top[np.argsort(-row_scores[top])]
+            row_ids = rows[top] if rows is not None else top
+            results.append([
+                {
+                    "row": int(row_id),
+                    "name": self.store.name(row_id),
+                    "text": self.store.text(row_id),
+                    "score": float(score),
+                }
+                for row_id, score in zip(row_ids, row_scores[top])
+            ])
+        return results[0] if single else results
+
+
+def embed_texts(client, texts, model=EMBEDDING_MODEL):
+    response = client.embeddings.create(model=model, input=list(texts))
+    return np.asarray([item.embedding for item in response.data], dtype=np.float32)
@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from prompts import SUGGESTED_PROMPTS
+
+# --- Settings ---
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "").lower() in ("1", "true", "yes")
+# JSON list or one prompt per line; replaces the suggested prompts when set
+WARMUP_PROMPTS_PATH = os.getenv("WARMUP_PROMPTS_PATH")
+WARMUP_TOP_QUERIES = int(os.getenv("WARMUP_TOP_QUERIES", "20"))
+WARMUP_TARGET_MS = float(os.getenv("WARMUP_TARGET_MS", "50"))
+WARMUP_JOB_TIMEOUT = float(os.getenv("WARMUP_JOB_TIMEOUT", "900"))
+WARMUP_REPORT_PATH = os.getenv("WARMUP_REPORT_PATH", "warmup_report.json")
+# Held by the one process that warms up on start, so gunicorn workers don't all do it
+WARMUP_LOCK_PATH = os.getenv("WARMUP_LOCK_PATH", "warmup.lock")
+
+# Response types that mean the prompt isn't answered yet, or failed
+JOB_TYPES = {"topic_summary_job", "topic_summary_job_joined"}
+FAILED_TYPES = {"exception", "gpt_error"}
+
+last_report = None
+_lock_file = None
+
+
+# --- Prompt list ---
+def load_prompt_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    try:
+        prompts = json.loads(text)
+    except json.JSONDecodeError:
+        prompts = text.splitlines()
+    return [p.strip() for p in prompts if isinstance(p, str) and p.strip()]
+
+
+def top_logged_queries(n, entries=None):
+    """The n most frequent logged queries, as first typed, most frequent first."""
+    if n <= 0:
+        return []
+    if entries is None:
+        from query_log import iter_log_entries
+        entries = iter_log_entries()
+    counts, spelling = {}, {}
+    for entry in entries:
+        query = entry.get("query")
+        if not isinstance(query, str) or not query.strip() or entry.get("type") in FAILED_TYPES:
+            continue
+        key = query.strip().lower()
+        counts[key] = counts.get(key, 0) + 1
+        spelling.setdefault(key, query.strip())
+    return [spelling[key] for key in sorted(counts, key=lambda k: -counts[k])[:n]]
+
+
+def warmup_prompts(path=WARMUP_PROMPTS_PATH, top=WARMUP_TOP_QUERIES, entries=None):
+    """Suggested (or configured) prompts, then the top logged queries; one per cleaned form."""
+    from router import clean_query
+
+    prompts = load_prompt_file(path) if path else list(SUGGESTED_PROMPTS)
+    prompts += top_logged_queries(top, entries)
+    seen, unique = set(), []
+    for prompt in prompts:
+        key = clean_query(prompt).strip()
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(prompt)
+    return unique
+
+
+# --- Checks ---
+def response_problem(status, payload):
+    """Why a /chat reply doesn't count as an answer, or None if it does."""
+    if status != 200:
+        return f"HTTP {status}"
+    if not isinstance(payload, dict):
+        return "reply is not JSON"
+    response_type = payload.get("type")
+    if response_type in FAILED_TYPES:
+        return f"{response_type}: {str(payload.get('response'))[:120]}"
+    if response_type in JOB_TYPES:
+        return "still summarising in the background"
+    response = payload.get("response")
+    if not response:
+        return "empty response"
+    if isinstance(response, str) and response.startswith(("⚠️", "❌", "An error")):
+        return response[:120]
+    if isinstance(response, dict):
+        records = response.get("candidates") if "candidates" in response else response.get("primary")
+        if not records:
+            return response.get("message") or "no candidates in response"
+        # The client renders a list of {name, summary} records; anything else (e.g. markdown) breaks it
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            return "candidates is not a list of records"
+    return None
+
+
+def wait_for_job(job_id, timeout=WARMUP_JOB_TIMEOUT, poll=1.0):
+    """The finished job, or None if it's still running after timeout seconds."""
+    from jobs import job_queue, ACTIVE
+
+    deadline = time.monotonic() + timeout
+    while True:
+        job = job_queue.get(job_id)
+        if job is None or job["status"] not in ACTIVE:
+            return job
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(poll)
+
+
+def ask(client, query):
+    """(status, payload, seconds) for one in-process POST /chat."""
+    start = time.perf_counter()
+    reply = client.post("/chat", json={"query": query})
+    return reply.status_code, reply.get_json(silent=True), time.perf_counter() - start
+
+
+def warm_prompt(client, query, target_ms=WARMUP_TARGET_MS, job_timeout=WARMUP_JOB_TIMEOUT):
+    """Answer query once to fill the caches, then time the answer a user would get."""
+    start = time.perf_counter()
+    status, payload, _ = ask(client, query)
+    payload = payload or {}
+    result = {"query": query, "type": payload.get("type")}
+
+    response = payload.get("response")
+    job = response.get("job") if isinstance(response, dict) else None
+    if result["type"] in JOB_TYPES and job:
+        # Large topics are summarised by a background job that fills the topic cache
+        finished = wait_for_job(job["job_id"], timeout=job_timeout)
+        if finished is None or finished["status"] != "done":
+            result["ok"] = False
+            result["error"] = f"background summary {finished['status'] if finished else 'timed out'}"
+            return result
+    result["warm_ms"] = round((time.perf_counter() - start) * 1e3, 1)
+
+    status, payload, served = ask(client, query)
+    result["type"] = (payload or {}).get("type")
+    result["served_ms"] = round(served * 1e3, 2)
+    problem = response_problem(status, payload)
+    if problem is None and served * 1e3 > target_ms:
+        problem = f"slow: {served * 1e3:.1f} ms > {target_ms:g} ms"
+    result["ok"] = problem is None
+    if problem:
+        result["error"] = problem
+    return result
+
+
+# --- Runs ---
+def run_warmup(flask_app, prompts=None, target_ms=WARMUP_TARGET_MS, report_path=WARMUP_REPORT_PATH):
+    """Warm and check every prompt; writes and returns the report."""
+    global last_report
+    prompts = warmup_prompts() if prompts is None else prompts
+    client = flask_app.test_client()
+    started = time.perf_counter()
+    print(f"🔥 Warming {len(prompts)} prompts (target {target_ms:g} ms)")
+
+    results = []
+    for query in prompts:
+        try:
+            result = warm_prompt(client, query, target_ms)
+        except Exception as e:
+            result = {"query": query, "ok": False, "error": f"{type(e).__name__}: {e}"}
+        results.append(result)
+        if result["ok"]:
+            print(f"   ✅ {query!r}: {result['type']} in {result['served_ms']} ms")
+        else:
+            print(f"   ⚠️ {query!r}: {result['error']}")
+
+    failed = [r for r in results if not r["ok"]]
+    report = {
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "seconds": round(time.perf_counter() - started, 1),
+        "target_ms": target_ms,
+        "prompts": len(results),
+        "ok": len(results) - len(failed),
+        "failed": [{"query": r["query"], "error": r["error"]} for r in failed],
+        "results": results,
+    }
+    last_report = report
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"{'✅' if not failed else '⚠️'} Warm-up: {report['ok']}/{len(results)} prompts ready in {report['seconds']}s")
+    return report
+
+
+def report_counts():
+    """{ok, failed} from the last warm-up in this process, for the metrics gauge."""
+    if last_report is None:
+        return {}
+    return {"ok": last_report["ok"], "failed": len(last_report["failed"])}
+
+
+def claim_warmup(path=WARMUP_LOCK_PATH):
+    """True the first time it's asked in the first process to ask; False after.
+
+    Every gunicorn worker imports the app and would otherwise warm up in
+    parallel; an exclusive lock on a file next to the caches, held while the
+    winning process lives, lets exactly one do it. Without fcntl (e.g. on
+    Windows) every process warms up once.
+    """
+    global _lock_file
+    if _lock_file is not None:
+        return False
+    try:
+        import fcntl
+    except ImportError:
+        _lock_file = True
+        return True
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    # Kept open: the lock goes when this process does
+    _lock_file = lock_file
+    return True
+
+
+def start_background_warmup(flask_app, **kwargs):
+    """Run the warm-up on a daemon thread so the server can take requests meanwhile.
+
+    Returns None, and does nothing, if a warm-up was already started here or
+    in another process holding the lock.
+    """
+    if not claim_warmup():
+        print(f"🔥 Warm-up already started (lock: {WARMUP_LOCK_PATH})")
+        return None
+    thread = threading.Thread(target=run_warmup, args=(flask_app,), kwargs=kwargs, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute and check answers for the suggested and most-asked prompts")
+    parser.add_argument("--prompts", default=WARMUP_PROMPTS_PATH, help="JSON list or one prompt per line (default: the suggested prompts)")
+    parser.add_argument("--top", type=int, default=WARMUP_TOP_QUERIES, help="Also warm the N most frequent logged queries")
+    parser.add_argument("--target-ms", type=float, default=WARMUP_TARGET_MS, help="Slowest acceptable warm answer")
+    parser.add_argument("--report", default=WARMUP_REPORT_PATH)
+    args = parser.parse_args(argv)
+
+    from app import app
+    report = run_warmup(app, warmup_prompts(args.prompts, args.top), args.target_ms, args.report)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())